@@ -0,0 +1,242 @@
+"""Хранилище артефактов запуска: партиционированные Parquet-файлы и манифест.
+
+Вместо множества CSV вида ``{run_id}_{subset}_*.csv`` в текущей директории
+каждый запуск пишет таблицы в собственный каталог::
+
+    runs/<run_id>/
+    ├── manifest.json
+    ├── classification_results/subset=clean/part-00000.parquet
+    ├── confusion_matrix/subset=clean/part-00000.parquet
+    └── ...
+
+Манифест обновляется после каждой записи, поэтому артефакты доступны уже во
+время запуска. Чтение поддерживает проекцию колонок и фильтр по сабсетам.
+Старые CSV при желании выгружаются параллельно (``export_csv``).
+"""
+
+import json
+import os
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_ROOT = "runs"
+# Расширение партиций по формату: CSV-партиции сжимаются gzip (pandas определяет сжатие по имени)
+PARTITION_SUFFIXES = {"parquet": "parquet", "csv": "csv.gz"}
+PARQUET_COMPRESSION = "zstd"
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # type: ignore # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+class RunArtifactStore:
+    """Каталог артефактов одного запуска.
+
+    Args:
+        run_id (str): Идентификатор запуска (имя каталога).
+        root (str): Корень хранилища, по умолчанию ``./runs``.
+        export_csv (bool): Дополнительно сохранять таблицы в прежние CSV-файлы
+            в текущей директории.
+        metadata (Optional[Dict[str, Any]]): Произвольные сведения о запуске
+            (скрипт, конфиг), попадают в манифест.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        root: str = DEFAULT_ROOT,
+        export_csv: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.run_id = run_id
+        self.run_dir = Path(root) / run_id
+        self.export_csv = export_csv
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+
+        manifest_path = self.run_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        else:
+            if _parquet_available():
+                file_format = "parquet"
+            else:
+                warnings.warn(
+                    "Пакет 'pyarrow' не установлен, артефакты сохраняются в CSV-партициях. "
+                    "Установите 'pyarrow' для Parquet: pip install pyarrow",
+                    stacklevel=2,
+                )
+                file_format = "csv"
+            self.manifest = {
+                "run_id": run_id,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "format": file_format,
+                "metadata": metadata or {},
+                "tables": {},
+            }
+            self._save_manifest()
+
+    @classmethod
+    def open(cls, run_dir: Path) -> "RunArtifactStore":
+        """Открывает существующий каталог запуска для чтения или дозаписи."""
+        run_dir = Path(run_dir)
+        return cls(run_dir.name, root=str(run_dir.parent))
+
+    @property
+    def file_format(self) -> str:
+        return self.manifest["format"]
+
+    def _save_manifest(self) -> None:
+        # Атомарная замена: читатель никогда не увидит недописанный манифест
+        tmp_path = self.run_dir / f"{MANIFEST_NAME}.tmp"
+        tmp_path.write_text(
+            json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        os.replace(tmp_path, self.run_dir / MANIFEST_NAME)
+
+    def tables(self) -> List[str]:
+        return list(self.manifest["tables"])
+
+    def subsets(self, table: str) -> List[str]:
+        partitions = self.manifest["tables"].get(table, {}).get("partitions", [])
+        return list(dict.fromkeys(p["subset"] for p in partitions))
+
+    def write_table(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        subset: str,
+        csv_name: Optional[str] = None,
+        index_label: Optional[str] = None,
+    ) -> Path:
+        """Дописывает партицию таблицы ``table`` для сабсета ``subset``.
+
+        Args:
+            table (str): Имя таблицы, например ``"classification_results"``.
+            df (pd.DataFrame): Данные партиции.
+            subset (str): Имя сабсета (``"overall"``/``"ALL"`` для сводных).
+            csv_name (Optional[str]): Имя прежнего CSV для выгрузки при
+                ``export_csv``.
+            index_label (Optional[str]): Если задано, индекс DataFrame
+                сохраняется колонкой с этим именем (например, метки классов).
+
+        Returns:
+            Path: Путь к записанной партиции.
+        """
+        if self.export_csv and csv_name:
+            df.to_csv(csv_name, index=index_label is not None)
+
+        data = df.reset_index(names=index_label) if index_label else df.reset_index(drop=True)
+        table_meta = self.manifest["tables"].setdefault(
+            table, {"index_label": index_label, "partitions": []}
+        )
+        part_dir = self.run_dir / table / f"subset={subset}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part_number = sum(1 for p in table_meta["partitions"] if p["subset"] == subset)
+        part_path = part_dir / f"part-{part_number:05d}.{PARTITION_SUFFIXES[self.file_format]}"
+
+        if self.file_format == "parquet":
+            # Категориальные колонки записываются словарём и восстанавливаются при чтении
+            data.to_parquet(part_path, index=False, compression=PARQUET_COMPRESSION)
+        else:
+            data.to_csv(part_path, index=False)
+
+        table_meta["partitions"].append(
+            {
+                "subset": subset,
+                "path": part_path.relative_to(self.run_dir).as_posix(),
+                "rows": len(data),
+                "columns": [str(c) for c in data.columns],
+            }
+        )
+        self._save_manifest()
+        return part_path
+
+    def read_table(
+        self,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        subsets: Optional[Sequence[str]] = None,
+        restore_index: bool = False,
+    ) -> pd.DataFrame:
+        """Читает таблицу, загружая только нужные колонки и партиции.
+
+        Args:
+            table (str): Имя таблицы.
+            columns (Optional[Sequence[str]]): Проекция колонок (``None`` — все).
+            subsets (Optional[Sequence[str]]): Фильтр по сабсетам.
+            restore_index (bool): Вернуть индекс, сохранённый через ``index_label``.
+
+        Returns:
+            pd.DataFrame: Данные с колонкой ``subset``; пустой DataFrame, если
+            таблицы нет.
+        """
+        table_meta = self.manifest["tables"].get(table)
+        if not table_meta:
+            return pd.DataFrame()
+
+        index_label = table_meta.get("index_label")
+        wanted = list(columns) if columns is not None else None
+        if wanted is not None and index_label and restore_index and index_label not in wanted:
+            wanted = [index_label, *wanted]
+
+        frames = []
+        for partition in table_meta["partitions"]:
+            if subsets is not None and partition["subset"] not in subsets:
+                continue
+            available = [c for c in (wanted or partition["columns"]) if c in partition["columns"]]
+            part_path = self.run_dir / partition["path"]
+            if part_path.suffix == ".parquet":
+                frame = pd.read_parquet(part_path, columns=available)
+            else:
+                # Метка класса 'None' не должна превращаться в NaN
+                frame = pd.read_csv(
+                    part_path, usecols=available, keep_default_na=False, na_values=[""]
+                )
+            frame["subset"] = partition["subset"]
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        if restore_index and index_label and index_label in df.columns:
+            df = df.set_index(index_label)
+            df.index.name = None
+        return df
+
+
+def find_latest_run(root: str, prefix: str) -> Optional[Path]:
+    """Находит самый новый каталог запуска, имя которого начинается с ``prefix``.
+
+    Имена запусков содержат timestamp, поэтому сортировка по имени совпадает
+    с хронологической.
+    """
+    root_path = Path(root)
+    if not root_path.exists():
+        return None
+    candidates = sorted(
+        p for p in root_path.glob(f"{prefix}*") if (p / MANIFEST_NAME).exists()
+    )
+    return candidates[-1] if candidates else None
+
+
+def store_from_config(
+    run_id: str, config: Dict[str, Any], script: str
+) -> RunArtifactStore:
+    """Создаёт хранилище по секции ``artifacts`` конфига (``root``, ``export_csv``)."""
+    artifacts_cfg = config.get("artifacts", {})
+    return RunArtifactStore(
+        run_id,
+        root=artifacts_cfg.get("root", DEFAULT_ROOT),
+        export_csv=bool(artifacts_cfg.get("export_csv", False)),
+        metadata={"script": script, "config": config},
+    )
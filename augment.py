@@ -0,0 +1,366 @@
+"""Производные сабсеты датасета, вычисляемые из ``clean`` на лету.
+
+Сабсеты ``blur``, ``noise``, ``bright``, ``gray``, ``rotated`` и ``spatter``
+не нужно хранить отдельными файлами: ``subset_dir`` подставляет вместо
+отсутствующей директории сабсета директорию ``clean``, а изображения из неё
+при чтении проходят через векторизованное NumPy-преобразование.
+
+Параметры преобразования выбираются генератором, зерно которого зависит от
+``seed`` конфига, имени сабсета и пути изображения внутри сабсета, поэтому
+результат одинаков в любом порядке обхода и байт-в-байт совпадает между
+запусками.
+
+Вычисление выключено по умолчанию (``augmentation.enabled``). Пути
+производного сабсета (``AugmentedPath``) лежат в виртуальной директории с
+суффиксом ``+derived`` (``.../images/blur+derived/0.jpg``), а ``subset_label``
+даёт то же имя для метрик и реестра результатов: вычисленный сабсет не
+смешивается с материализованным.
+"""
+
+import io
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from dataset_io import DatasetPath, path_source_key
+
+SOURCE_SUBSET = "clean"
+DEFAULT_SEED = 0
+JPEG_QUALITY = 95
+DERIVED_SUFFIX = "+derived"
+
+
+def _to_uint8(image: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+
+def _box_blur_axis(image: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Скользящее среднее по оси через кумулятивную сумму (O(1) на пиксель)."""
+    pad = [(0, 0)] * image.ndim
+    pad[axis] = (radius + 1, radius)
+    cumsum = np.cumsum(np.pad(image, pad, mode="edge"), axis=axis, dtype=np.float32)
+    size = 2 * radius + 1
+    # Срезы — представления без копирования, в отличие от np.take
+    upper = [slice(None)] * image.ndim
+    lower = [slice(None)] * image.ndim
+    upper[axis] = slice(size, None)
+    lower[axis] = slice(None, -size)
+    return (cumsum[tuple(upper)] - cumsum[tuple(lower)]) / np.float32(size)
+
+
+def blur(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Размытие сепарабельным box-фильтром радиуса 2–5."""
+    radius = int(rng.integers(2, 6))
+    return _to_uint8(_box_blur_axis(_box_blur_axis(image, radius, 0), radius, 1))
+
+
+def noise(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Гауссов шум яркости (общий для каналов, как у сканера) с амплитудой 12–25."""
+    sigma = np.float32(rng.uniform(12.0, 25.0))
+    grain = rng.standard_normal(image.shape[:2], dtype=np.float32) * sigma
+    return _to_uint8(image + grain[..., None])
+
+
+def bright(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Пересвет: растяжение контраста и сдвиг яркости вверх."""
+    gain = np.float32(rng.uniform(1.2, 1.5))
+    offset = np.float32(rng.uniform(30.0, 60.0))
+    return _to_uint8(image.astype(np.float32) * gain + offset)
+
+
+def gray(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Перевод в оттенки серого (яркость по BT.601) с сохранением трёх каналов."""
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    luminance = _to_uint8(image.astype(np.float32) @ weights)
+    return np.repeat(luminance[..., None], 3, axis=2)
+
+
+def rotated(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Поворот на 3–10° в случайную сторону вокруг центра, поля белые."""
+    angle = np.deg2rad(rng.uniform(3.0, 10.0) * rng.choice([-1.0, 1.0]))
+    height, width = image.shape[:2]
+    cy, cx = (height - 1) / 2.0, (width - 1) / 2.0
+    ys = (np.arange(height, dtype=np.float32) - cy)[:, None]
+    xs = (np.arange(width, dtype=np.float32) - cx)[None, :]
+    cos, sin = np.float32(np.cos(angle)), np.float32(np.sin(angle))
+    # Обратное отображение: для каждого пикселя результата — ближайший пиксель источника
+    src_x = np.rint(cos * xs + sin * ys + cx).astype(np.int32)
+    src_y = np.rint(-sin * xs + cos * ys + cy).astype(np.int32)
+    inside = (src_x >= 0) & (src_x < width) & (src_y >= 0) & (src_y < height)
+    # Один take по плоскому индексу быстрее пары булевых выборок
+    flat_index = np.clip(src_y, 0, height - 1) * width + np.clip(src_x, 0, width - 1)
+    result = np.take(image.reshape(-1, image.shape[2]), flat_index, axis=0)
+    result[~inside] = 255
+    return result
+
+
+def spatter(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Брызги чернил: тёмные пятна случайного радиуса и прозрачности."""
+    height, width = image.shape[:2]
+    result = image.astype(np.float32)
+    count = int(rng.integers(20, 60))
+    base = min(height, width)
+    centers_y = rng.uniform(0, height, count)
+    centers_x = rng.uniform(0, width, count)
+    radii = rng.uniform(0.004, 0.02, count) * base
+    alphas = rng.uniform(0.5, 0.9, count).astype(np.float32)
+    color = np.float32(rng.uniform(0.0, 60.0))
+    for cy, cx, radius, alpha in zip(centers_y, centers_x, radii, alphas, strict=True):
+        # Пятно считается только в своём ограничивающем прямоугольнике
+        top, bottom = max(int(cy - radius), 0), min(int(cy + radius) + 1, height)
+        left, right = max(int(cx - radius), 0), min(int(cx + radius) + 1, width)
+        ys, xs = np.ogrid[top:bottom, left:right]
+        mask = (ys - cy) ** 2 + (xs - cx) ** 2 <= radius**2
+        patch = result[top:bottom, left:right]
+        patch[mask] = patch[mask] * (1 - alpha) + color * alpha
+    return _to_uint8(result)
+
+
+TRANSFORMS: Dict[str, Callable[[np.ndarray, np.random.Generator], np.ndarray]] = {
+    "blur": blur,
+    "noise": noise,
+    "bright": bright,
+    "gray": gray,
+    "rotated": rotated,
+    "spatter": spatter,
+}
+
+
+def augment_array(
+    image: np.ndarray, subset: str, key: str, seed: int = DEFAULT_SEED
+) -> np.ndarray:
+    """Применяет преобразование сабсета к RGB-изображению ``uint8`` (H×W×3).
+
+    Args:
+        image (np.ndarray): Исходное изображение из ``clean``.
+        subset (str): Имя производного сабсета (ключ ``TRANSFORMS``).
+        key (str): Стабильный идентификатор изображения (путь внутри сабсета).
+        seed (int): Общее зерно запуска.
+
+    Returns:
+        np.ndarray: Преобразованное изображение той же формы.
+    """
+    # crc32, а не hash(): встроенный хеш строк рандомизируется между процессами
+    rng = np.random.default_rng([seed, zlib.crc32(subset.encode()), zlib.crc32(key.encode())])
+    return TRANSFORMS[subset](image, rng)
+
+
+class AugmentedPath:
+    """Путь производного сабсета поверх пути в ``clean``.
+
+    Навигация и проверки делегируются исходному пути, а строковое
+    представление, ``parts`` и ``relative_to`` — виртуальному пути
+    производного сабсета (``images/<subset>+derived/...``).
+
+    Args:
+        source (DatasetPath): Путь в сабсете ``clean``.
+        virtual (DatasetPath): Соответствующий виртуальный путь производного сабсета.
+        subset (str): Имя производного сабсета.
+        key (str): Путь внутри сабсета в posix-формате (для зерна).
+        seed (int): Общее зерно запуска.
+    """
+
+    def __init__(
+        self,
+        source: DatasetPath,
+        virtual: DatasetPath,
+        subset: str,
+        key: str = "",
+        seed: int = DEFAULT_SEED,
+    ) -> None:
+        self.source = source
+        self.virtual = virtual
+        self.subset = subset
+        self.key = key
+        self.seed = seed
+
+    # --- Навигация ---
+    def __truediv__(self, other: Union[str, PurePosixPath]) -> "AugmentedPath":
+        key = PurePosixPath(self.key, str(other)).as_posix() if self.key else str(other)
+        return AugmentedPath(self.source / other, self.virtual / other, self.subset, key, self.seed)
+
+    @property
+    def name(self) -> str:
+        return self.virtual.name
+
+    @property
+    def stem(self) -> str:
+        return self.virtual.stem
+
+    @property
+    def suffix(self) -> str:
+        return self.virtual.suffix
+
+    @property
+    def parent(self) -> DatasetPath:
+        return self.virtual.parent
+
+    @property
+    def parts(self) -> tuple:
+        return self.virtual.parts
+
+    def relative_to(self, other: Any) -> Any:
+        return self.virtual.relative_to(other)
+
+    # --- Проверки ---
+    def exists(self) -> bool:
+        return self.source.exists()
+
+    def is_file(self) -> bool:
+        return self.source.is_file()
+
+    def is_dir(self) -> bool:
+        return self.source.is_dir()
+
+    # --- Обход ---
+    def iterdir(self) -> Iterator["AugmentedPath"]:
+        for child in self.source.iterdir():
+            yield self / child.name
+
+    def glob(self, pattern: str) -> Iterator["AugmentedPath"]:
+        """Сопоставляет шаблон с прямыми потомками (без ``**``)."""
+        for child in self.source.glob(pattern):
+            yield self / child.name
+
+    # --- Чтение ---
+    def load_array(self) -> np.ndarray:
+        """Преобразованное изображение как ``uint8``-массив H×W×3."""
+        from PIL import Image  # type: ignore
+
+        with Image.open(io.BytesIO(self.source.read_bytes())) as opened:
+            image = np.asarray(opened.convert("RGB"))
+        return augment_array(image, self.subset, self.key, self.seed)
+
+    def load_image(self) -> Any:
+        """Преобразованное изображение как ``PIL.Image`` (для ``predict_on_image``)."""
+        from PIL import Image  # type: ignore
+
+        return Image.fromarray(self.load_array())
+
+    def source_key(self) -> str:
+        """Идентичность преобразованного изображения без декодирования.
+
+        Исходный файл, сабсет и зерно однозначно задают результат ``load_array``.
+        """
+        if isinstance(self.source, Path):
+            source = path_source_key(self.source)
+        else:
+            source = self.source.source_key()
+        return f"{source}|{self.subset}|{self.seed}"
+
+    def read_bytes(self) -> bytes:
+        """Кодирует преобразованное изображение в формат исходного файла."""
+        image = self.load_image()
+        buffer = io.BytesIO()
+        if self.suffix.lower() in (".jpg", ".jpeg"):
+            image.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+        else:
+            image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    # --- Сравнение и представление ---
+    def __str__(self) -> str:
+        return str(self.virtual)
+
+    def __repr__(self) -> str:
+        return f"AugmentedPath({str(self)!r}, source={str(self.source)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, AugmentedPath)
+            and other.source == self.source
+            and other.subset == self.subset
+            and other.seed == self.seed
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.source, self.subset, self.seed))
+
+    def __lt__(self, other: "AugmentedPath") -> bool:
+        return str(self) < str(other)
+
+
+class AugmentationConfig:
+    """Настройки производных сабсетов запуска.
+
+    Args:
+        enabled (bool): Вычислять отсутствующие сабсеты из ``clean``.
+        seed (int): Общее зерно преобразований.
+        prefer_materialized (bool): Если директория сабсета есть на диске,
+            читать её, а не вычислять сабсет.
+    """
+
+    def __init__(
+        self, enabled: bool = False, seed: int = DEFAULT_SEED, prefer_materialized: bool = True
+    ) -> None:
+        self.enabled = enabled
+        self.seed = seed
+        self.prefer_materialized = prefer_materialized
+
+
+_CONFIG = AugmentationConfig()
+
+
+def get_augmentation() -> AugmentationConfig:
+    """Возвращает настройки производных сабсетов текущего запуска."""
+    return _CONFIG
+
+
+def configure_augmentation(augment_config: Optional[Dict[str, Any]]) -> AugmentationConfig:
+    """Задаёт настройки по секции ``augmentation`` конфига.
+
+    Поддерживаемые ключи: ``enabled`` (по умолчанию false), ``seed``,
+    ``prefer_materialized`` (по умолчанию true).
+    """
+    global _CONFIG
+    augment_config = augment_config or {}
+    _CONFIG = AugmentationConfig(
+        enabled=bool(augment_config.get("enabled", False)),
+        seed=int(augment_config.get("seed", DEFAULT_SEED)),
+        prefer_materialized=bool(augment_config.get("prefer_materialized", True)),
+    )
+    return _CONFIG
+
+
+def subset_dir(images_dir: DatasetPath, subset: str) -> DatasetPath:
+    """Директория сабсета: материализованная или вычисляемая из ``clean``.
+
+    Args:
+        images_dir (DatasetPath): Директория ``images`` с поддиректориями сабсетов.
+        subset (str): Имя сабсета.
+
+    Returns:
+        DatasetPath: ``images_dir / subset``, если сабсет
+        есть на диске (или не может быть вычислен), иначе ``AugmentedPath``
+        поверх ``images_dir / "clean"`` с виртуальной директорией
+        ``images_dir / "<subset>+derived"``.
+    """
+    materialized = images_dir / subset
+    config = get_augmentation()
+    if subset not in TRANSFORMS or not config.enabled:
+        return materialized
+    if config.prefer_materialized and materialized.exists():
+        return materialized
+    source = images_dir / SOURCE_SUBSET
+    if not source.exists():
+        return materialized
+    derived = images_dir / f"{subset}{DERIVED_SUFFIX}"
+    return AugmentedPath(source, derived, subset, seed=config.seed)
+
+
+def subset_label(subset: str, paths: Iterable[Any]) -> str:
+    """Имя сабсета для метрик, таблиц и реестра результатов.
+
+    Args:
+        subset (str): Имя сабсета из конфига.
+        paths (Iterable[Any]): Директории или изображения сабсета.
+
+    Returns:
+        str: ``subset`` с суффиксом ``+derived``, если хотя бы один путь
+        вычисляется из ``clean``, иначе ``subset``.
+    """
+    if any(isinstance(path, AugmentedPath) for path in paths):
+        return f"{subset}{DERIVED_SUFFIX}"
+    return subset
@@ -0,0 +1,170 @@
+"""Микробатчинг запросов к локальной модели.
+
+Когда одну модель одновременно вызывают несколько потоков, асинхронных
+задач или демон инференса, каждый ``predict_on_image`` — отдельный проход
+модели. ``MicroBatcher`` ставит запросы в очередь, фоновый поток собирает
+их в пакет (до ``max_batch`` запросов или пока первый запрос ждёт не
+дольше ``max_wait_ms``), выполняет пакет одним вызовом и разрешает
+future каждого вызывающего.
+
+Синхронный вызов: ``batcher(item)`` или ``batcher.submit(item).result()``;
+из asyncio: ``await batcher.submit_async(item)``.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_WAIT_MS = 10.0
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+@dataclass
+class BatcherStats:
+    """Ожидание в очереди и фактический размер пакетов за запуск."""
+
+    batches: int = 0
+    requests: int = 0
+    failed_batches: int = 0
+    queue_wait_seconds: float = 0.0
+    max_queue_wait_seconds: float = 0.0
+    batch_sizes: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, waits: Sequence[float]) -> None:
+        self.batches += 1
+        self.requests += len(waits)
+        self.queue_wait_seconds += sum(waits)
+        self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, *waits)
+        self.batch_sizes[len(waits)] = self.batch_sizes.get(len(waits), 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": (
+                round(1000 * self.queue_wait_seconds / self.requests, 1) if self.requests else 0.0
+            ),
+            "max_queue_wait_ms": round(1000 * self.max_queue_wait_seconds, 1),
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class MicroBatcher(Generic[Item, Result]):
+    """Очередь, собирающая запросы в пакеты для одного обработчика.
+
+    ``run_batch`` получает список запросов и возвращает список результатов
+    той же длины; элемент-исключение завершает с ошибкой только свой
+    запрос, исключение из самого ``run_batch`` или список другой длины —
+    весь пакет. Запрос, future которого отменён до начала пакета, не
+    выполняется.
+
+    Args:
+        run_batch (Callable[[List[Item]], List[Result]]): Обработчик пакета.
+        max_batch (int): Максимальный размер пакета.
+        max_wait_ms (float): Сколько первый запрос пакета ждёт попутчиков.
+        name (str): Имя фонового потока.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Item]], List[Result]],
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        name: str = "micro-batcher",
+    ) -> None:
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.stats = BatcherStats()
+        self._queue: "queue.Queue[Optional[Tuple[Item, Future, float]]]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Item) -> "Future[Result]":
+        """Ставит запрос в очередь и возвращает его future."""
+        if self._closed:
+            raise RuntimeError("Батчер закрыт")
+        future: "Future[Result]" = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item: Item) -> Result:
+        """Синхронный вызов: ждёт результат своего запроса."""
+        return self.submit(item).result()
+
+    async def submit_async(self, item: Item) -> Result:
+        """Вызов из asyncio: не блокирует цикл событий, пока пакет считается."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self) -> Optional[List[Tuple[Item, Future, float]]]:
+        """Ждёт первый запрос и добирает пакет до ``max_batch`` или истечения ожидания."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    pending = self._queue.get(timeout=timeout)
+                else:
+                    pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # Закрытие: дорабатываем собранный пакет, поток завершится на следующем круге
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Запросы, отменённые вызывающим до начала пакета, не выполняются
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            self.stats.add([started - enqueued for _, _, enqueued in batch])
+            try:
+                self._run(batch)
+            except Exception as err:
+                # Поток не должен падать: иначе все следующие запросы зависнут в очереди
+                self.stats.failed_batches += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(err)
+
+    def _run(self, batch: List[Tuple[Item, Future, float]]) -> None:
+        """Выполняет пакет и разрешает future его запросов."""
+        results = self.run_batch([item for item, _, _ in batch])
+        if len(results) != len(batch):
+            raise RuntimeError(
+                f"run_batch вернул {len(results)} результатов на пакет из {len(batch)} запросов"
+            )
+        for (_, future, _), result in zip(batch, results, strict=True):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self) -> None:
+        """Обрабатывает уже поставленные запросы и останавливает фоновый поток."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
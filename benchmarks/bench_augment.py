@@ -0,0 +1,80 @@
+"""Производные сабсеты: обход путей, преобразования и чтение против материализованных файлов."""
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from augment import TRANSFORMS, augment_array, subset_dir
+from check_classifiication import get_image_paths
+from synthetic import DOCUMENT_CLASSES
+
+# Размер страницы A4 при ~90 dpi — порядок размеров изображений датасета
+PAGE_SHAPE = (1050, 740, 3)
+
+
+def _page() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    page = np.full(PAGE_SHAPE, 235, dtype=np.uint8)
+    rows = rng.integers(0, PAGE_SHAPE[0], 20_000)
+    cols = rng.integers(0, PAGE_SHAPE[1], 20_000)
+    page[rows, cols] = 20
+    return page
+
+
+@pytest.fixture(scope="module")
+def page_files(tmp_path_factory: Any) -> Path:
+    from PIL import Image
+
+    page = _page()
+    images_dir = tmp_path_factory.mktemp("augment") / "images"
+    (images_dir / "clean").mkdir(parents=True)
+    Image.fromarray(page).save(images_dir / "clean" / "0.jpg", quality=95)
+    for subset in TRANSFORMS:
+        (images_dir / subset).mkdir()
+        Image.fromarray(augment_array(page, subset, "0.jpg")).save(
+            images_dir / subset / "0.jpg", quality=95
+        )
+    return images_dir
+
+
+def bench_get_image_paths_derived(
+    benchmark: Any, classification_dataset: Path, scale: int, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import augment
+
+    # В синтетическом датасете есть только clean — blur вычисляется
+    monkeypatch.setattr(augment.get_augmentation(), "enabled", True)
+    paths = benchmark(get_image_paths, classification_dataset, list(DOCUMENT_CLASSES), "blur")
+    assert len(paths) >= scale // len(DOCUMENT_CLASSES)
+
+
+@pytest.mark.parametrize("subset", list(TRANSFORMS))
+def bench_augment_transform(benchmark: Any, subset: str) -> None:
+    page = _page()
+    result = benchmark(augment_array, page, subset, "0.jpg")
+    assert result.shape == page.shape
+
+
+@pytest.mark.parametrize("subset", list(TRANSFORMS))
+def bench_read_materialized(benchmark: Any, page_files: Path, subset: str) -> None:
+    from PIL import Image
+
+    def run() -> np.ndarray:
+        with Image.open(page_files / subset / "0.jpg") as image:
+            return np.asarray(image.convert("RGB"))
+
+    assert benchmark(run).shape == PAGE_SHAPE
+
+
+@pytest.mark.parametrize("subset", list(TRANSFORMS))
+def bench_read_derived(
+    benchmark: Any, page_files: Path, subset: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import augment
+
+    monkeypatch.setattr(augment.get_augmentation(), "enabled", True)
+    monkeypatch.setattr(augment.get_augmentation(), "prefer_materialized", False)
+    path = subset_dir(page_files, subset) / "0.jpg"
+    assert benchmark(path.load_array).shape == PAGE_SHAPE
@@ -0,0 +1,39 @@
+"""Микробатчинг: пропускная способность конкурентных вызовов с пакетами и без.
+
+Обработчик пакета имитирует проход модели: фиксированная стоимость вызова
+плюс небольшая добавка на каждый элемент пакета. Масштаб / 100 — число
+запросов от 16 конкурентных потоков.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+import pytest
+
+from batcher import MicroBatcher
+
+CALL_SECONDS = 0.002
+ITEM_SECONDS = 0.0002
+CALLERS = 16
+
+
+def _run_batch(items: List[int]) -> List[int]:
+    time.sleep(CALL_SECONDS + ITEM_SECONDS * len(items))
+    return items
+
+
+@pytest.mark.parametrize("max_batch", [1, 8])
+def bench_batcher_throughput(benchmark: Any, scale: int, max_batch: int) -> None:
+    batcher = MicroBatcher(_run_batch, max_batch=max_batch, max_wait_ms=2)
+    requests = list(range(max(1, scale // 100)))
+
+    def run() -> List[int]:
+        with ThreadPoolExecutor(CALLERS) as pool:
+            return list(pool.map(batcher, requests))
+
+    try:
+        assert benchmark(run) == requests
+        benchmark.extra_info.update(batcher.stats.as_dict())
+    finally:
+        batcher.close()
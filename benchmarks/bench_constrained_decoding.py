@@ -0,0 +1,59 @@
+"""Ограниченное схемой декодирование: построение и переиспользование масок токенов."""
+
+import random
+from typing import Any
+
+from constrained_decoding import SchemaGuide, TokenVocabulary
+from synthetic import ENTITY_FIELDS
+
+
+def _vocabulary(size: int, seed: int = 0) -> TokenVocabulary:
+    """Синтетический словарь: одиночные символы, JSON-фрагменты и случайные слова.
+
+    Как и в byte-level BPE, каждый символ есть в словаре отдельным токеном,
+    иначе часть литералов схемы была бы невыразима.
+    """
+    rng = random.Random(seed)
+    alphabet = "абвгдежзиклмнопрстуфхцчшщэюяabcdefghijklmnopqrstuvwxyz0123456789 "
+    tokens = sorted(set(alphabet + '{}[]":,-._')) + ['{"', '": "', '", "', '"}', "null", "true"]
+    tokens += [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 6)))
+        for _ in range(size - len(tokens) - 1)
+    ]
+    return TokenVocabulary(tokens + [""], eos_ids=[len(tokens)])
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in ENTITY_FIELDS},
+}
+
+
+def _walk(guide: SchemaGuide, rng: random.Random, max_steps: int = 400) -> int:
+    state, steps = guide.initial_state, 0
+    while not guide.automaton.is_final(state) and steps < max_steps:
+        token_id = int(rng.choice(guide.allowed_tokens(state)))
+        state = guide.advance_token(state, token_id)
+        steps += 1
+    return steps
+
+
+def bench_schema_guide_cold(benchmark: Any, scale: int) -> None:
+    vocabulary = _vocabulary(scale)
+
+    def run() -> int:
+        # Новый guide — маски строятся с нуля для каждого состояния
+        return _walk(SchemaGuide(SCHEMA, vocabulary), random.Random(0))
+
+    assert benchmark(run) > 0
+
+
+def bench_schema_guide_cached(benchmark: Any, scale: int) -> None:
+    vocabulary = _vocabulary(scale)
+    guide = SchemaGuide(SCHEMA, vocabulary)
+    _walk(guide, random.Random(0))
+
+    def run() -> int:
+        return _walk(guide, random.Random(0))
+
+    assert benchmark(run) > 0
@@ -0,0 +1,48 @@
+"""CPU-режим: пропускная способность fp32 против квантованных вариантов.
+
+Маленькая модель из MLP-блоков повторяет то, что доминирует в декодере
+Qwen2.5-VL на CPU — матричные умножения линейных слоёв. Масштаб задаёт
+число токенов, прогоняемых за один раунд.
+"""
+
+from typing import Any
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from cpu_backend import bf16_supported, configure_threads, quantize_model  # noqa: E402
+
+HIDDEN = 256
+LAYERS = 4
+SEQUENCE = 128
+
+
+def _tiny_model() -> Any:
+    torch.manual_seed(0)
+    blocks = []
+    for _ in range(LAYERS):
+        blocks += [
+            torch.nn.Linear(HIDDEN, 4 * HIDDEN),
+            torch.nn.GELU(),
+            torch.nn.Linear(4 * HIDDEN, HIDDEN),
+        ]
+    return torch.nn.Sequential(*blocks)
+
+
+@pytest.mark.parametrize("mode", ["none", "int8", "bf16"])
+def bench_cpu_throughput(benchmark: Any, scale: int, mode: str) -> None:
+    if mode == "bf16" and not bf16_supported():
+        pytest.skip("процессор не поддерживает bf16")
+    configure_threads()
+    model = quantize_model(_tiny_model(), mode)
+    dtype = torch.bfloat16 if mode == "bf16" else torch.float32
+    batch = torch.randn(max(1, scale // SEQUENCE), SEQUENCE, HIDDEN).to(dtype)
+
+    def run() -> Any:
+        with torch.inference_mode():
+            return model(batch)
+
+    output = benchmark(run)
+    assert output.shape == batch.shape
+    benchmark.extra_info["tokens_per_round"] = batch.shape[0] * SEQUENCE
@@ -0,0 +1,32 @@
+"""Обход датасета: ``get_image_paths`` из check_classifiication."""
+
+from pathlib import Path
+from typing import Any
+
+from check_classifiication import get_image_paths
+from synthetic import DOCUMENT_CLASSES
+
+
+def bench_get_image_paths(benchmark: Any, classification_dataset: Path, scale: int) -> None:
+    paths = benchmark(get_image_paths, classification_dataset, list(DOCUMENT_CLASSES), "clean")
+    assert len(paths) >= scale // len(DOCUMENT_CLASSES)
+
+
+def bench_get_image_paths_sampled(benchmark: Any, classification_dataset: Path) -> None:
+    paths = benchmark(
+        get_image_paths, classification_dataset, list(DOCUMENT_CLASSES), "clean", 10
+    )
+    assert paths
+
+
+def bench_get_image_paths_packed(
+    benchmark: Any, classification_dataset: Path, scale: int, tmp_path_factory: Any
+) -> None:
+    from dataset_io import open_dataset
+    from pack_dataset import pack_dataset
+
+    packed_dir = tmp_path_factory.mktemp(f"packed_{scale}")
+    pack_dataset(classification_dataset, packed_dir)
+    packed = open_dataset(packed_dir)
+    paths = benchmark(get_image_paths, packed, list(DOCUMENT_CLASSES), "clean")
+    assert len(paths) >= scale // len(DOCUMENT_CLASSES)
@@ -0,0 +1,11 @@
+"""Подсчёт метрик извлечения сущностей: ``evaluate`` из check_entity_extractor."""
+
+from pathlib import Path
+from typing import Any, Dict
+
+from check_entity_extractor import evaluate
+
+
+def bench_evaluate(benchmark: Any, entity_predictions: Dict[str, Path]) -> None:
+    metrics = benchmark(evaluate, entity_predictions["gt"], entity_predictions["pred"])
+    assert 0.0 <= metrics["exact_accuracy"] <= 1.0
@@ -0,0 +1,46 @@
+"""Детальные результаты извлечения сущностей: словарное кодирование против строк.
+
+Три сабсета по ``scale`` строк с промптом ~5 КБ. В ``extra_info`` — память
+таблицы до и после кодирования (``memory_usage(deep=True)``).
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+
+from check_entity_extractor import concat_encoded, encode_result_frame, evaluate
+from results_db import hash_text
+
+PROMPT = "Извлеки из изображения паспорта поля в формате JSON. " * 100
+SUBSETS = ("clean", "blur", "noise")
+
+
+@pytest.fixture(scope="module")
+def subset_frames(entity_predictions: Dict[str, Path]) -> List[pd.DataFrame]:
+    frames = []
+    for subset in SUBSETS:
+        df = evaluate(entity_predictions["gt"], entity_predictions["pred"])["full_df"]
+        df["subset"] = subset
+        frames.append(df)
+    return frames
+
+
+def _megabytes(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / 1024**2, 2)
+
+
+def bench_concat_plain(benchmark: Any, subset_frames: List[pd.DataFrame]) -> None:
+    frames = [df.assign(prompt=PROMPT) for df in subset_frames]
+    result = benchmark(pd.concat, frames, ignore_index=True)
+    benchmark.extra_info["memory_mb"] = _megabytes(result)
+
+
+def bench_concat_encoded(benchmark: Any, subset_frames: List[pd.DataFrame]) -> None:
+    frames = [encode_result_frame(df.assign(prompt_hash=hash_text(PROMPT))) for df in subset_frames]
+    result = benchmark(concat_encoded, frames)
+    assert isinstance(result["field"].dtype, pd.CategoricalDtype)
+    plain = pd.concat(subset_frames, ignore_index=True)
+    benchmark.extra_info["memory_mb"] = _megabytes(result)
+    benchmark.extra_info["memory_mb_without_prompt_column"] = _megabytes(plain)
@@ -0,0 +1,42 @@
+"""Метрики порядка страниц: по документу (``bench_utils``) и сразу по всем (``ordering_metrics``)."""
+
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from bench_utils.metrics import calculate_ordering_metrics
+from ordering_metrics import compute_ordering_metrics
+from synthetic import make_ordering_pairs
+
+
+def bench_ordering_metrics_per_document(benchmark: Any, scale: int) -> None:
+    pairs = make_ordering_pairs(scale)
+
+    def run() -> Dict[str, float]:
+        # Прежний цикл run_evaluation + усреднение calculate_and_save_metrics
+        all_metrics: Dict[str, List[float]] = {
+            "kendall_tau": [],
+            "accuracy": [],
+            "spearman_rho": [],
+        }
+        for true_order, predicted_order in pairs:
+            for key, value in calculate_ordering_metrics(true_order, predicted_order).items():
+                all_metrics[key].append(value)
+        return {key: sum(values) / len(values) for key, values in all_metrics.items()}
+
+    means = benchmark(run)
+    assert 0.0 <= means["accuracy"] <= 1.0
+
+
+def bench_ordering_metrics_vectorized(benchmark: Any, scale: int) -> None:
+    pairs = make_ordering_pairs(scale)
+    true_orders = [true_order for true_order, _ in pairs]
+    predicted_orders = [predicted_order for _, predicted_order in pairs]
+
+    def run() -> Tuple[Dict[str, float], pd.DataFrame, pd.DataFrame]:
+        # Как в check_page_sorting после сабсета: метрики, средние и разбивки ошибок
+        ordering = compute_ordering_metrics(true_orders, predicted_orders)
+        return ordering.summary(), ordering.position_frame(), ordering.swap_frame()
+
+    means, _, _ = benchmark(run)
+    assert 0.0 <= means["accuracy"] <= 1.0
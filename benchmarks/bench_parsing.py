@@ -0,0 +1,63 @@
+"""Разбор ответов модели: классификация и сортировка страниц."""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import check_classifiication
+from check_page_sorting import extract_json_from_model_output, process_model_response
+from json_stream import OrderedPagesRecognizer
+from synthetic import DOCUMENT_CLASSES, StubModel, make_page_sorting_responses
+
+
+def bench_classification_get_prediction(benchmark: Any, scale: int) -> None:
+    responses = [str(i % (len(DOCUMENT_CLASSES) + 1)) for i in range(97)] + ['"2"', "мусор"]
+    model = StubModel(responses)
+    paths = [Path(f"dataset/passport/images/clean/{i}.jpg") for i in range(scale)]
+
+    def run() -> List[str]:
+        return [
+            check_classifiication.get_prediction(model, path, "prompt", DOCUMENT_CLASSES)
+            for path in paths
+        ]
+
+    predictions = benchmark(run)
+    assert len(predictions) == scale
+
+
+def bench_process_model_response(benchmark: Any, scale: int) -> None:
+    responses = make_page_sorting_responses(scale)
+
+    def run() -> List[List[int]]:
+        return [process_model_response(response) for response in responses]
+
+    results = benchmark(run)
+    assert all(results)
+
+
+def bench_extract_json_from_model_output(benchmark: Any, scale: int) -> None:
+    responses = [r for r in make_page_sorting_responses(scale) if "ordered_pages" in r]
+
+    def run() -> List[Optional[Dict[str, Any]]]:
+        return [extract_json_from_model_output(response) for response in responses]
+
+    results = benchmark(run)
+    assert all(results)
+
+
+def bench_ordered_pages_recognizer(benchmark: Any, scale: int) -> None:
+    responses = [r for r in make_page_sorting_responses(scale) if "ordered_pages" in r]
+    # Поток по ~4 символа — примерно как при декодировании по токенам
+    chunked = [[r[i : i + 4] for i in range(0, len(r), 4)] for r in responses]
+
+    def run() -> List[Optional[List[int]]]:
+        results = []
+        for chunks in chunked:
+            recognizer = OrderedPagesRecognizer(expected_pages=4)
+            for chunk in chunks:
+                if recognizer.feed(chunk):
+                    break
+            results.append(recognizer.result)
+        return results
+
+    results = benchmark(run)
+    assert all(results)
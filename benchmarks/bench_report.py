@@ -0,0 +1,30 @@
+"""Сборка markdown-отчёта: ``build_report`` из report_classifiication.
+
+Сравниваются оба источника артефактов: CSV старого формата и хранилище
+``artifact_store`` с чтением только нужных колонок.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pytest
+
+from report_classifiication import build_report
+from synthetic import make_report_run
+
+
+@pytest.fixture(scope="session", params=["csv", "store"])
+def report_run(request: Any, tmp_path_factory: Any, scale: int) -> Tuple[Path, Dict[str, object]]:
+    workdir = tmp_path_factory.mktemp(f"report_{request.param}_{scale}")
+    return workdir, make_report_run(workdir, scale, storage=request.param)
+
+
+def bench_build_report(
+    benchmark: Any, report_run: Tuple[Path, Dict[str, object]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    workdir, run = report_run
+    # CSV старого формата build_report ищет в текущей директории
+    monkeypatch.chdir(workdir)
+    output_path = workdir / "report.md"
+    benchmark(build_report, run["config_path"], output_path)
+    assert output_path.exists()
@@ -0,0 +1,52 @@
+"""Общие фикстуры бенчмарков: масштабы и синтетические датасеты.
+
+Масштаб выбирается опцией ``--bench-scales`` (по умолчанию ``1k,10k``;
+``100k`` включается явно, так как создание файлов занимает заметное время).
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+# Скрипты проекта лежат в корне репозитория, а не в пакете
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import (  # noqa: E402
+    SCALES,
+    make_classification_dataset,
+    make_entity_predictions,
+)
+
+
+def pytest_addoption(parser: Any) -> None:
+    parser.addoption(
+        "--bench-scales",
+        default="1k,10k",
+        help="Масштабы через запятую из: " + ", ".join(SCALES),
+    )
+
+
+def pytest_generate_tests(metafunc: Any) -> None:
+    if "scale" in metafunc.fixturenames:
+        names: List[str] = [
+            s.strip() for s in metafunc.config.getoption("--bench-scales").split(",")
+        ]
+        unknown = [s for s in names if s not in SCALES]
+        if unknown:
+            raise pytest.UsageError(f"Неизвестные масштабы: {unknown}")
+        metafunc.parametrize("scale", [SCALES[s] for s in names], ids=names, scope="session")
+
+
+@pytest.fixture(scope="session")
+def classification_dataset(tmp_path_factory: Any, scale: int) -> Path:
+    return make_classification_dataset(tmp_path_factory.mktemp(f"cls_{scale}"), scale)
+
+
+@pytest.fixture(scope="session")
+def entity_predictions(tmp_path_factory: Any, scale: int) -> Dict[str, Path]:
+    root = make_entity_predictions(tmp_path_factory.mktemp(f"ent_{scale}"), scale)
+    return {"gt": root / "gt", "pred": root / "pred"}
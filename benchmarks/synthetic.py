@@ -0,0 +1,238 @@
+"""Генераторы синтетических данных и заглушка модели для бенчмарков.
+
+Все генераторы детерминированы (фиксированный seed), поэтому результаты
+разных коммитов сравнимы между собой.
+"""
+
+import json
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Масштабы, на которых отслеживается поведение: число «элементов» датасета
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+DOCUMENT_CLASSES = {
+    "invoice": "Счет-фактура",
+    "tin_new": "ИНН нового образца",
+    "tin_old": "ИНН старого образца",
+    "passport": "Паспорт",
+    "snils": "СНИЛС",
+    "interest_free_loan_agreement": "Договор беспроцентного займа",
+}
+
+ENTITY_FIELDS = [
+    "series",
+    "number",
+    "surname",
+    "name",
+    "patronymic",
+    "birth_date",
+    "birth_place",
+    "issue_date",
+    "issued_by",
+    "department_code",
+]
+
+
+def make_classification_dataset(
+    root: Path, n_items: int, subset: str = "clean", nested_every: int = 10
+) -> Path:
+    """Создаёт раскладку ``<class>/images/<subset>`` с пустыми файлами.
+
+    ``get_image_paths`` смотрит только на структуру директорий, поэтому
+    содержимое файлов не нужно. Каждый ``nested_every``-й элемент кладётся
+    в подпапку документа, чтобы покрыть обе ветки обхода.
+    """
+    classes = list(DOCUMENT_CLASSES)
+    per_class = max(1, n_items // len(classes))
+    for class_name in classes:
+        subset_dir = root / class_name / "images" / subset
+        subset_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(per_class):
+            if nested_every and i % nested_every == 0:
+                doc_dir = subset_dir / f"doc_{i}"
+                doc_dir.mkdir(exist_ok=True)
+                (doc_dir / "0.jpg").touch()
+            else:
+                (subset_dir / f"{i}.jpg").touch()
+    return root
+
+
+def make_page_sorting_responses(n_items: int, seed: int = 0) -> List[str]:
+    """Ответы модели для разбора ``process_model_response`` в разных форматах."""
+    rng = random.Random(seed)
+    responses = []
+    for i in range(n_items):
+        pages = rng.sample(range(1, 5), 4)
+        kind = i % 4
+        if kind == 0:
+            responses.append(f'```json\n{{"ordered_pages": {pages}}}\n```')
+        elif kind == 1:
+            responses.append(f'Вот ответ: {{"ordered_pages": {pages}}} — готово.')
+        elif kind == 2:
+            responses.append(f"Порядок страниц: {pages}")
+        else:
+            responses.append(" ".join(str(p) for p in pages))
+    return responses
+
+
+def make_ordering_pairs(n_items: int, n_pages: int = 4, seed: int = 0) -> List[List[List[int]]]:
+    """Пары (истинный, предсказанный) порядок страниц."""
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n_items):
+        true_order = rng.sample(range(1, n_pages + 1), n_pages)
+        predicted = list(true_order)
+        if rng.random() < 0.5:
+            i, j = rng.sample(range(n_pages), 2)
+            predicted[i], predicted[j] = predicted[j], predicted[i]
+        pairs.append([true_order, predicted])
+    return pairs
+
+
+def make_entity_predictions(root: Path, n_items: int, seed: int = 0) -> Path:
+    """Создаёт ``gt``/``pred`` JSON-файлы для ``evaluate``.
+
+    ``n_items`` — число строк (документ × поле), документов в ``len(ENTITY_FIELDS)`` раз меньше.
+    """
+    rng = random.Random(seed)
+    gt_dir, pred_dir = root / "gt", root / "pred"
+    gt_dir.mkdir(parents=True, exist_ok=True)
+    pred_dir.mkdir(parents=True, exist_ok=True)
+    for doc_id in range(max(1, n_items // len(ENTITY_FIELDS))):
+        gt = {
+            key: "".join(rng.choice("АБВГДЕЖЗИК0123456789 ") for _ in range(rng.randint(0, 24)))
+            for key in ENTITY_FIELDS
+        }
+        pred = {
+            key: value if rng.random() < 0.7 else value[::-1] for key, value in gt.items()
+        }
+        (gt_dir / f"{doc_id}.json").write_text(json.dumps(gt, ensure_ascii=False), encoding="utf-8")
+        (pred_dir / f"{doc_id}.json").write_text(
+            json.dumps(pred, ensure_ascii=False), encoding="utf-8"
+        )
+    return root
+
+
+def make_report_run(
+    workdir: Path,
+    n_items: int,
+    subsets: Optional[List[str]] = None,
+    storage: str = "csv",
+) -> Dict[str, object]:
+    """Создаёт конфиг и артефакты запуска классификации для ``build_report``.
+
+    Число классов растёт с масштабом (``n_items // 100``), поэтому растут и
+    таблицы per-class отчётов, и матрицы ошибок.
+
+    ``storage``: ``"csv"`` — CSV старого формата в ``workdir``,
+    ``"store"`` — хранилище ``artifact_store`` в ``workdir / "runs"``.
+    """
+    import pandas as pd
+
+    from artifact_store import RunArtifactStore
+
+    subsets = subsets or ["clean", "blur", "noise"]
+    n_classes = max(2, n_items // 100)
+    document_classes = {f"class_{i}": f"Класс {i}" for i in range(n_classes)}
+    prompt_path = workdir / "prompt.txt"
+    prompt_path.write_text("Определи тип документа: {classes}", encoding="utf-8")
+
+    config = {
+        "task": {
+            "dataset_path": "./dataset",
+            "prompt_path": str(prompt_path),
+            "subsets": subsets,
+        },
+        "model": {"model_name": "Stub-Model", "device_map": "cpu"},
+        "document_classes": document_classes,
+        "artifacts": {"root": str(workdir / "runs")},
+    }
+    config_path = workdir / "config.json"
+    config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+
+    run_id = "Stub-Model_prompt_20250101_000000"
+    # В режиме "csv" хранилище не создаётся, иначе build_report выберет его
+    store = RunArtifactStore(run_id, root=str(workdir / "runs")) if storage == "store" else None
+    metrics = {"accuracy": 0.9, "f1": 0.88, "precision": 0.87, "recall": 0.86}
+
+    def write(table: str, df: "pd.DataFrame", subset: str, csv_name: str, index: bool) -> None:
+        if store is not None:
+            store.write_table(table, df, subset, index_label="label" if index else None)
+        else:
+            df.to_csv(workdir / csv_name, index=index)
+
+    write(
+        "final_classification_results",
+        pd.DataFrame([metrics]),
+        "ALL",
+        f"{run_id}_final_classification_results.csv",
+        index=False,
+    )
+
+    rng = random.Random(0)
+    labels = list(document_classes)
+    for subset in subsets + ["overall"]:
+        write(
+            "classification_results",
+            pd.DataFrame([metrics]),
+            subset,
+            f"{run_id}_{subset}_classification_results.csv",
+            index=False,
+        )
+        report = pd.DataFrame(
+            {
+                "precision": [rng.random() for _ in labels],
+                "recall": [rng.random() for _ in labels],
+                "f1-score": [rng.random() for _ in labels],
+                "support": [rng.randint(1, 100) for _ in labels],
+            },
+            index=labels,
+        )
+        write("class_report", report, subset, f"{run_id}_{subset}_class_report.csv", index=True)
+        cm = pd.DataFrame(
+            [[rng.randint(0, 5) for _ in labels] for _ in labels], index=labels, columns=labels
+        )
+        write("confusion_matrix", cm, subset, f"{run_id}_{subset}_confusion_matrix.csv", index=True)
+    return {"config_path": config_path, "run_id": run_id}
+
+
+class StubModel:
+    """Заглушка модели: мгновенно возвращает заранее заданные ответы по кругу.
+
+    Повторяет интерфейс ``predict_on_image`` / ``predict_on_images`` обёрток
+    из ``model_interface``, чтобы бенчмарки измеряли только код вокруг модели.
+
+    Args:
+        responses (List[str]): Ответы, выдаваемые по кругу.
+        oom_when (Optional[Callable[[List[object]], bool]]): Если задан и
+            возвращает True для изображений запроса, бросается
+            ``SimulatedOutOfMemoryError`` — так проверяется ``ExecutionGuard``.
+    """
+
+    def __init__(
+        self,
+        responses: List[str],
+        oom_when: Optional[Callable[[List[object]], bool]] = None,
+    ) -> None:
+        self._responses = responses
+        self._oom_when = oom_when
+        self._cursor = 0
+        self.calls = 0
+
+    def _next(self, images: List[object]) -> str:
+        self.calls += 1
+        if self._oom_when is not None and self._oom_when(images):
+            from execution_guard import SimulatedOutOfMemoryError
+
+            raise SimulatedOutOfMemoryError()
+        response = self._responses[self._cursor % len(self._responses)]
+        self._cursor += 1
+        return response
+
+    def predict_on_image(self, image: object, prompt: str) -> str:
+        return self._next([image])
+
+    def predict_on_images(self, images: List[object], prompt: str) -> str:
+        return self._next(list(images))
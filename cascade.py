@@ -0,0 +1,228 @@
+"""Каскад моделей классификации с эскалацией по уверенности.
+
+Большинство изображений классификации малая модель (Qwen2.5-VL-3B)
+размечает так же, как большая (7B). Каскад сначала спрашивает малую
+модель и оценивает уверенность по вероятностям токенов номера класса;
+только изображения с уверенностью ниже порога уходят следующей модели.
+
+Уверенность — произведение вероятностей (softmax по словарю) цифровых
+токенов, из которых модель составила номер класса. Ответ без цифр даёт
+уверенность 0 и всегда эскалируется. Для обёрток без доступа к HF-модели
+уверенность не вычисляется (``None``), и такие ответы тоже эскалируются.
+
+Секция конфига::
+
+    "cascade": {
+        "enabled": true,
+        "max_new_tokens": 8,
+        "tiers": [
+            {"model_name": "Qwen2.5-VL-3B-Instruct", "threshold": 0.9},
+            {"model_name": "Qwen2.5-VL-7B-Instruct"}
+        ]
+    }
+
+Каждый уровень — переопределения поверх секции ``model``; ``threshold``
+последнего уровня не используется.
+"""
+
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from qwen_runtime import prepare_inputs, supports_direct_generation
+from tracing import model_call
+
+DEFAULT_THRESHOLD = 0.9
+# Номер класса — одна-две цифры, плюс возможные кавычки и пробелы вокруг
+DEFAULT_MAX_NEW_TOKENS = 8
+
+
+@dataclass
+class CascadeTier:
+    """Уровень каскада: модель и порог уверенности для принятия ответа."""
+
+    name: str
+    model: Any
+    threshold: float = DEFAULT_THRESHOLD
+
+
+@dataclass
+class TierAnswer:
+    """Ответ одного уровня на изображение."""
+
+    tier: str
+    text: str
+    confidence: Optional[float]
+    seconds: float
+
+
+@dataclass
+class CascadeResult:
+    """Итог каскада: принятый ответ и ответы всех пройденных уровней."""
+
+    text: str
+    tier: str
+    confidence: Optional[float]
+    answers: List[TierAnswer] = field(default_factory=list)
+
+
+def class_confidence(
+    model: Any, images: Sequence[Any], prompt: str, max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS
+) -> Tuple[str, Optional[float]]:
+    """Ответ модели и уверенность по вероятностям цифровых токенов номера класса.
+
+    Args:
+        model (Any): Обёртка модели.
+        images (Sequence[Any]): Изображения запроса.
+        prompt (str): Промпт классификации.
+        max_new_tokens (int): Лимит токенов ответа.
+
+    Returns:
+        Tuple[str, Optional[float]]: Текст ответа и уверенность в ``[0, 1]``;
+        ``None``, если обёртка не даёт доступа к HF-модели.
+    """
+    if not supports_direct_generation(model):
+        return model.predict_on_images(images=list(images), prompt=prompt), None
+
+    import torch  # type: ignore
+
+    inputs = prepare_inputs(model, images, prompt)
+    with model_call(model, "model.generate"), torch.inference_mode():
+        output = model.model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            output_scores=True,
+            return_dict_in_generate=True,
+        )
+
+    tokenizer = model.processor.tokenizer
+    new_ids = output.sequences[0, inputs["input_ids"].shape[1] :].tolist()
+    confidence, digits = 1.0, 0
+    for token_id, scores in zip(new_ids, output.scores, strict=True):
+        if not tokenizer.decode([token_id]).strip().isdigit():
+            continue
+        confidence *= float(torch.softmax(scores[0].float(), dim=-1)[token_id])
+        digits += 1
+    text = tokenizer.decode(new_ids, skip_special_tokens=True)
+    return text, confidence if digits else 0.0
+
+
+class ModelCascade:
+    """Последовательность моделей от дешёвой к дорогой.
+
+    Args:
+        tiers (List[CascadeTier]): Уровни каскада по возрастанию стоимости.
+        max_new_tokens (int): Лимит токенов ответа.
+        run (Optional[Callable]): Обёртка вызова модели ``run(fn, images)``,
+            например ``ExecutionGuard.run``; по умолчанию прямой вызов.
+    """
+
+    def __init__(
+        self,
+        tiers: List[CascadeTier],
+        max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+        run: Optional[Callable[[Callable[[List[Any]], Any], Sequence[Any]], Any]] = None,
+    ) -> None:
+        if not tiers:
+            raise ValueError("В каскаде нет ни одного уровня")
+        self.tiers = tiers
+        self.max_new_tokens = max_new_tokens
+        self._run = run or (lambda fn, images: fn(list(images)))
+
+    def classify(self, image: Any, prompt: str) -> CascadeResult:
+        """Проводит изображение по уровням, пока уверенность не превысит порог."""
+        answers: List[TierAnswer] = []
+        for position, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            text, confidence = self._run(
+                partial(
+                    class_confidence, tier.model, prompt=prompt, max_new_tokens=self.max_new_tokens
+                ),
+                [image],
+            )
+            answers.append(TierAnswer(tier.name, text, confidence, time.perf_counter() - start))
+            is_last = position == len(self.tiers) - 1
+            if is_last or (confidence is not None and confidence >= tier.threshold):
+                return CascadeResult(text, tier.name, confidence, answers)
+        raise AssertionError("unreachable")
+
+
+def tier_configs(
+    model_config: Dict[str, Any], cascade_config: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Полные конфиги моделей уровней: переопределения поверх секции ``model``."""
+    configs = []
+    for tier in cascade_config.get("tiers", []):
+        overrides = {key: value for key, value in tier.items() if key != "threshold"}
+        configs.append({**model_config, **overrides})
+    return configs
+
+
+def build_cascade(
+    models: List[Any],
+    model_configs: List[Dict[str, Any]],
+    cascade_config: Dict[str, Any],
+    run: Optional[Callable[[Callable[[List[Any]], Any], Sequence[Any]], Any]] = None,
+) -> ModelCascade:
+    """Собирает каскад из уже созданных моделей уровней."""
+    tiers = [
+        CascadeTier(
+            name=config["model_name"],
+            model=model,
+            threshold=float(tier.get("threshold", DEFAULT_THRESHOLD)),
+        )
+        for model, config, tier in zip(models, model_configs, cascade_config["tiers"], strict=True)
+    ]
+    for tier in tiers[:-1]:
+        if not supports_direct_generation(tier.model):
+            print(f"⚠️  cascade: у {tier.name} нет доступа к HF-модели, все ответы эскалируются")
+    return ModelCascade(
+        tiers,
+        max_new_tokens=int(cascade_config.get("max_new_tokens", DEFAULT_MAX_NEW_TOKENS)),
+        run=run,
+    )
+
+
+def tier_report(records: pd.DataFrame, tier_names: Sequence[str]) -> pd.DataFrame:
+    """Стоимость и точность каждого уровня каскада.
+
+    Args:
+        records (pd.DataFrame): Строка на ответ уровня: ``item``, ``tier``,
+            ``y_true``, ``y_pred``, ``confidence``, ``seconds``, ``accepted``.
+        tier_names (Sequence[str]): Имена уровней по порядку.
+
+    Returns:
+        pd.DataFrame: По уровню: ``calls`` (сколько изображений дошло до
+        уровня), ``call_share``, ``accepted`` и ``accepted_share`` (сколько
+        ответов принято на этом уровне), ``accuracy`` (точность уровня на всех
+        дошедших до него изображениях), ``accepted_accuracy``, ``seconds``,
+        ``seconds_per_call``.
+    """
+    items = records["item"].nunique()
+    rows = []
+    for name in tier_names:
+        tier = records[records["tier"] == name]
+        accepted = tier[tier["accepted"]]
+        correct = tier["y_true"] == tier["y_pred"]
+        rows.append(
+            {
+                "tier": name,
+                "calls": len(tier),
+                "call_share": round(len(tier) / items, 4) if items else 0.0,
+                "accepted": len(accepted),
+                "accepted_share": round(len(accepted) / items, 4) if items else 0.0,
+                "accuracy": round(float(correct.mean()), 4) if len(tier) else 0.0,
+                "accepted_accuracy": (
+                    round(float((accepted["y_true"] == accepted["y_pred"]).mean()), 4)
+                    if len(accepted)
+                    else 0.0
+                ),
+                "seconds": round(float(tier["seconds"].sum()), 3),
+                "seconds_per_call": round(float(tier["seconds"].mean()), 3) if len(tier) else 0.0,
+            }
+        )
+    return pd.DataFrame(rows)
@@ -1,11 +1,11 @@
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 from bench_utils.metrics import calculate_classification_metrics
 from bench_utils.model_utils import initialize_model, load_prompt, prepare_prompt
-from bench_utils.utils import load_config, save_results_to_csv
+from bench_utils.utils import load_config
 from print_utils import (  # type: ignore
     print_error,
     print_header,
@@ -16,13 +16,29 @@ from print_utils import (  # type: ignore
 from sklearn.metrics import classification_report, confusion_matrix  # type: ignore
 from tqdm import tqdm
 
+from artifact_store import RunArtifactStore, store_from_config
+from augment import configure_augmentation, subset_dir, subset_label
+from cascade import CascadeResult, ModelCascade, build_cascade, tier_configs, tier_report
+from cpu_backend import enable_cpu_backend
+from dataset_io import DatasetPath, load_image_for_model, open_dataset
+from execution_guard import (
+    OOMExhaustedError,
+    configure_execution_guard,
+    get_execution_guard,
+)
+from pixel_cache import enable_pixel_cache, pixel_cache_report
+from prefix_cache import enable_prefix_cache, prefix_cache_report
+from results_db import results_db_from_config
+from telemetry import configure_telemetry, finish_telemetry
+from tracing import configure_tracing, finish_tracing, get_tracer, trace_model
+
 
 def get_image_paths(
-    dataset_path: Path,
+    dataset_path: DatasetPath,
     class_names: List[str],
     subset_name: str,
     sample_size: Optional[int] = None,
-) -> List[Path]:
+) -> List[DatasetPath]:
     """Собирает пути к изображениям для указанного подмножества данных.
 
     Функция обходит директории классов и подмножеств, собирая пути к файлам.
@@ -30,23 +46,25 @@ def get_image_paths(
     непосредственно в папке сабсета, так и в дополнительных подпапках.
 
     Args:
-        dataset_path (Path): Корневой путь к датасету.
+        dataset_path (DatasetPath): Корневой путь к датасету (директория или
+            путь внутри zip-архива, см. ``dataset_io.open_dataset``).
         class_names (List[str]): Список имен классов для обработки.
         subset_name (str): Имя подмножества (например, 'clean', 'blur').
         sample_size (Optional[int]): Количество файлов для выборки из каждой
             директории класса. Если None, обрабатываются все файлы.
 
     Returns:
-        List[Path]: Список объектов Path, ведущих к выбранным изображениям.
+        List[DatasetPath]: Список путей, ведущих к выбранным изображениям.
     """
     selected_files = []
     print_section(f"Обработка сабсета: {subset_name}")
     for class_name in class_names:
-        class_dir = dataset_path / class_name / "images" / subset_name
+        # Отсутствующий сабсет вычисляется из clean на лету (augment.py)
+        class_dir = subset_dir(dataset_path / class_name / "images", subset_name)
         if not class_dir.exists():
             continue
 
-        paths = list(class_dir.iterdir())
+        paths: List[DatasetPath] = list(class_dir.iterdir())
         if sample_size is not None:
             paths = paths[:sample_size]
 
@@ -61,44 +79,101 @@ def get_image_paths(
 
 
 def get_prediction(
-    model: Any, image_path: Path, prompt: str, document_classes: Dict[str, str]
+    model: Any, image_path: DatasetPath, prompt: str, document_classes: Dict[str, str]
 ) -> str:
     """Получает предсказание модели для одного изображения.
 
     Args:
         model (Any): Инициализированный объект модели для классификации.
-        image_path (Path): Путь к файлу изображения.
+        image_path (DatasetPath): Путь к файлу изображения.
         prompt (str): Промпт, который будет подан модели вместе с изображением.
         document_classes (Dict[str, str]): Словарь классов документов.
 
     Returns:
         str: Предсказанный ключ класса (например, 'invoice') или 'None'
              в случае ошибки или некорректного ответа модели.
+
+    Raises:
+        OOMExhaustedError: Модели не хватает памяти даже на минимальном
+            разрешении. Такой элемент нельзя засчитывать как ответ 'None'.
     """
+    tracer = get_tracer()
     try:
-        # Передаем путь к изображению напрямую в модель
-        result = model.predict_on_image(image=str(image_path), prompt=prompt)
-        prediction = result.strip().strip('"')
-
-        if prediction.isdigit():
-            class_index = int(prediction)
-            if 0 <= class_index < len(document_classes):
-                pred_class_name = list(document_classes.values())[class_index]
-                # Создаем обратное отображение для быстрого поиска ключа класса
-                class_names_to_keys = {v: k for k, v in document_classes.items()}
-                return class_names_to_keys.get(pred_class_name, "None")
+        with tracer.span("image_load"):
+            # Файл с диска передаём путём, член архива — уже декодированным изображением
+            image = load_image_for_model(image_path)
+        with tracer.span("predict"):
+            result = get_execution_guard().run(
+                lambda images: model.predict_on_image(image=images[0], prompt=prompt),
+                [image],
+            )
+
+        with tracer.span("parse_response"):
+            return parse_class_prediction(result, document_classes)
+
+    except OOMExhaustedError:
+        raise
+    except Exception as e:
+        print_error(f"Ошибка при классификации файла {image_path.name}: {e}")
         return "None"
 
+
+def parse_class_prediction(result: str, document_classes: Dict[str, str]) -> str:
+    """Переводит ответ модели (номер класса) в ключ класса или 'None'."""
+    prediction = result.strip().strip('"')
+
+    if prediction.isdigit():
+        class_index = int(prediction)
+        if 0 <= class_index < len(document_classes):
+            pred_class_name = list(document_classes.values())[class_index]
+            # Создаем обратное отображение для быстрого поиска ключа класса
+            class_names_to_keys = {v: k for k, v in document_classes.items()}
+            return class_names_to_keys.get(pred_class_name, "None")
+    return "None"
+
+
+def get_cascade_prediction(
+    cascade: ModelCascade,
+    image_path: DatasetPath,
+    prompt: str,
+    document_classes: Dict[str, str],
+) -> Tuple[str, Optional[CascadeResult]]:
+    """Получает предсказание каскада моделей для одного изображения.
+
+    Args:
+        cascade (ModelCascade): Каскад моделей (``cascade.py``).
+        image_path (DatasetPath): Путь к файлу изображения.
+        prompt (str): Промпт классификации.
+        document_classes (Dict[str, str]): Словарь классов документов.
+
+    Returns:
+        Tuple[str, Optional[CascadeResult]]: Ключ класса (или 'None') и ответы
+        уровней каскада (``None`` при ошибке).
+
+    Raises:
+        OOMExhaustedError: Как в ``get_prediction``.
+    """
+    tracer = get_tracer()
+    try:
+        with tracer.span("image_load"):
+            image = load_image_for_model(image_path)
+        with tracer.span("predict"):
+            result = cascade.classify(image, prompt)
+        with tracer.span("parse_response"):
+            return parse_class_prediction(result.text, document_classes), result
+
+    except OOMExhaustedError:
+        raise
     except Exception as e:
         print_error(f"Ошибка при классификации файла {image_path.name}: {e}")
-        return "None"
+        return "None", None
 
 
 def calculate_and_save_metrics(
     y_true: List[str],
     y_pred: List[str],
     subset_name: str,
-    run_id: str,
+    store: RunArtifactStore,
     document_classes: Dict[str, str],
 ) -> Dict[str, float]:
     """Вычисляет и сохраняет метрики, возвращает словарь с основными метриками.
@@ -107,7 +182,7 @@ def calculate_and_save_metrics(
         y_true (List[str]): Список истинных меток классов.
         y_pred (List[str]): Список предсказанных меток классов.
         subset_name (str): Имя обрабатываемого подмножества.
-        run_id (str): Уникальный идентификатор запуска для именования файлов.
+        store (RunArtifactStore): Хранилище артефактов запуска.
         document_classes (Dict[str, str]): Словарь классов документов.
 
     Returns:
@@ -115,8 +190,11 @@ def calculate_and_save_metrics(
     """
     metrics = calculate_classification_metrics(y_true, y_pred, document_classes)
     if metrics:
-        save_results_to_csv(
-            metrics, f"{run_id}_{subset_name}_classification_results.csv", subset_name
+        store.write_table(
+            "classification_results",
+            pd.DataFrame([metrics]),
+            subset_name,
+            csv_name=f"{store.run_id}_{subset_name}_classification_results.csv",
         )
     return metrics
 
@@ -125,16 +203,16 @@ def calculate_and_save_confusion_matrix(
     y_true: List[str],
     y_pred: List[str],
     subset_name: str,
-    run_id: str,
+    store: RunArtifactStore,
     document_classes: Dict[str, str],
 ) -> None:
-    """Вычисляет матрицу ошибок и сохраняет её в CSV файл.
+    """Вычисляет матрицу ошибок и сохраняет её в хранилище артефактов.
 
     Args:
         y_true (List[str]): Список истинных меток классов.
         y_pred (List[str]): Список предсказанных меток классов.
         subset_name (str): Имя сабсета, для которого вычисляется матрица.
-        run_id (str): Идентификатор запуска, используется в имени выходного файла.
+        store (RunArtifactStore): Хранилище артефактов запуска.
         document_classes (Dict[str, str]): Словарь классов документов.
     """
 
@@ -156,16 +234,21 @@ def calculate_and_save_confusion_matrix(
     print_section(f"Confusion Matrix для сабсета {subset_name}")
     print(cm_df)
 
-    cm_filename = f"{run_id}_{subset_name}_confusion_matrix.csv"
-    cm_df.to_csv(cm_filename)
-    print_success(f"Матрица сохранена в {cm_filename}")
+    cm_path = store.write_table(
+        "confusion_matrix",
+        cm_df,
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_confusion_matrix.csv",
+        index_label="label",
+    )
+    print_success(f"Матрица сохранена в {cm_path}")
 
 
 def calculate_and_save_class_report(
     y_true: List[str],
     y_pred: List[str],
     subset_name: str,
-    run_id: str,
+    store: RunArtifactStore,
     document_classes: Dict[str, str],
 ) -> None:
     """Сохраняет подробный classification_report (precision/recall/F1 per class).
@@ -174,7 +257,7 @@ def calculate_and_save_class_report(
         y_true: истинные метки.
         y_pred: предсказанные метки.
         subset_name: имя сабсета или 'overall'.
-        run_id: идентификатор запуска.
+        store: хранилище артефактов запуска.
         document_classes: словарь классов.
     """
 
@@ -191,11 +274,64 @@ def calculate_and_save_class_report(
 
     report_df = pd.DataFrame(report).transpose().round(4)
 
-    out_path = f"{run_id}_{subset_name}_class_report.csv"
-    report_df.to_csv(out_path)
+    out_path = store.write_table(
+        "class_report",
+        report_df,
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_class_report.csv",
+        index_label="label",
+    )
     print_success(f"Отчёт по классам сохранён в {out_path}")
 
 
+def calculate_and_save_cascade_report(
+    records: pd.DataFrame, subset_name: str, store: RunArtifactStore, cascade: ModelCascade
+) -> None:
+    """Сохраняет ответы уровней каскада и сводку стоимости и точности по уровням.
+
+    Args:
+        records (pd.DataFrame): Ответы уровней (см. ``cascade.tier_report``).
+        subset_name (str): Имя сабсета.
+        store (RunArtifactStore): Хранилище артефактов запуска.
+        cascade (ModelCascade): Каскад, по уровням которого строится сводка.
+    """
+    store.write_table("cascade_answers", records, subset_name)
+    report_df = tier_report(records, [tier.name for tier in cascade.tiers])
+    print_section(f"Каскад моделей для сабсета {subset_name}")
+    print(report_df.to_string(index=False))
+    store.write_table(
+        "cascade_tiers",
+        report_df,
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_cascade_tiers.csv",
+    )
+
+
+def load_classification_model(
+    config: Dict[str, Any], model_config: Dict[str, Any], tracer: Any
+) -> Any:
+    """Создаёт модель со всеми включёнными в конфиге надстройками.
+
+    Args:
+        config (Dict[str, Any]): Полный конфиг (секции ``pixel_cache``, ``prefix_cache``).
+        model_config (Dict[str, Any]): Секция ``model`` (или её вариант).
+        tracer (Any): Трассировщик запуска.
+
+    Returns:
+        Any: Обёртка модели.
+    """
+    return trace_model(
+        enable_prefix_cache(
+            enable_pixel_cache(
+                enable_cpu_backend(initialize_model(model_config), model_config),
+                config.get("pixel_cache"),
+            ),
+            config.get("prefix_cache"),
+        ),
+        tracer,
+    )
+
+
 def run_evaluation(config: Dict[str, Any]) -> None:
     """Основной цикл оценки модели.
 
@@ -221,11 +357,38 @@ def run_evaluation(config: Dict[str, Any]) -> None:
         print_info(f"Sample size: {task_config['sample_size']}")
     print_info(f"Модель: {model_config['model_name']}")
 
-    dataset_path = Path(task_config["dataset_path"])
+    dataset_path = open_dataset(task_config["dataset_path"])
     prompt_path = Path(task_config["prompt_path"])
     sample_size = task_config.get("sample_size")
 
-    model = initialize_model(model_config)
+    tracer = configure_tracing(config.get("tracing"))
+    telemetry = configure_telemetry(config.get("telemetry"))
+    telemetry.set_label("model_load")
+    guard = configure_execution_guard(config.get("execution_guard"))
+    configure_augmentation(config.get("augmentation"))
+    cascade_config = config.get("cascade") or {}
+    cascade = None
+    if cascade_config.get("enabled", False):
+        # Каскад: каждый уровень — своя модель, уверенность считается по прямому generate
+        cascade_model_configs = tier_configs(model_config, cascade_config)
+        cascade_models = [
+            trace_model(
+                enable_pixel_cache(
+                    enable_cpu_backend(initialize_model(tier_config), tier_config),
+                    config.get("pixel_cache"),
+                ),
+                tracer,
+            )
+            for tier_config in cascade_model_configs
+        ]
+        cascade = build_cascade(cascade_models, cascade_model_configs, cascade_config, guard.run)
+        model = cascade_models[0]
+        print_info(
+            "Каскад: "
+            + " → ".join(f"{tier.name} (порог {tier.threshold})" for tier in cascade.tiers)
+        )
+    else:
+        model = load_classification_model(config, model_config, tracer)
 
     template = load_prompt(prompt_path)
     classes_str = ", ".join(
@@ -238,17 +401,38 @@ def run_evaluation(config: Dict[str, Any]) -> None:
     prompt_name = prompt_path.stem
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     run_id = f"{model_name_clean}_{prompt_name}_{timestamp}"
+    store = store_from_config(run_id, config, "check_classifiication")
+    results_db = results_db_from_config(config)
+    if results_db is not None:
+        results_db.register_run(
+            run_id,
+            "classification",
+            model_config["model_name"],
+            prompt_text=template,
+            prompt_name=prompt_name,
+            config=config,
+            subsets=task_config["subsets"],
+            artifacts=str(store.run_dir),
+        )
     all_metrics = []
+    processed_subsets: List[str] = []
 
     for subset in task_config["subsets"]:
-        image_paths = get_image_paths(
-            dataset_path, list(document_classes.keys()), subset, sample_size
-        )
+        telemetry.set_label(subset)
+        with tracer.span("path_discovery", subset=subset):
+            image_paths = get_image_paths(
+                dataset_path, list(document_classes.keys()), subset, sample_size
+            )
 
         if not image_paths:
             continue
+        # Вычисленный из clean сабсет пишется в таблицы и реестр как <subset>+derived
+        subset = subset_label(subset, image_paths)
+        processed_subsets.append(subset)
 
-        y_true, y_pred = [], []
+        y_true, y_pred, item_paths = [], [], []
+        cascade_rows: List[Dict[str, Any]] = []
+        skipped_oom = 0
         for path in tqdm(image_paths, desc=f"Обработка {subset}"):
             try:
                 # Имя класса всегда является первым сегментом после корневой директории датасета.
@@ -257,27 +441,80 @@ def run_evaluation(config: Dict[str, Any]) -> None:
                 # На случай, если path не является прямым потомком dataset_path
                 class_name = path.parts[-5] if len(path.parts) >= 5 else "Unknown"
 
-            y_true.append(class_name)
-            y_pred.append(get_prediction(model, path, prompt, document_classes))
+            try:
+                if cascade is not None:
+                    prediction, cascade_result = get_cascade_prediction(
+                        cascade, path, prompt, document_classes
+                    )
+                    for answer in cascade_result.answers if cascade_result else []:
+                        cascade_rows.append(
+                            {
+                                "item": str(path),
+                                "tier": answer.tier,
+                                "y_true": class_name,
+                                "y_pred": parse_class_prediction(answer.text, document_classes),
+                                "confidence": answer.confidence,
+                                "seconds": answer.seconds,
+                                "accepted": answer.tier == cascade_result.tier,
+                            }
+                        )
+                else:
+                    prediction = get_prediction(model, path, prompt, document_classes)
+            except OOMExhaustedError as e:
+                # Не засчитываем элемент как ошибку модели — иначе метрики искажаются
+                print_error(f"Пропуск {path.name}: {e}")
+                skipped_oom += 1
+                continue
 
-        subset_metrics = calculate_and_save_metrics(
-            y_true, y_pred, subset, run_id, document_classes
-        )
-        # --- Confusion matrix ---
-        calculate_and_save_confusion_matrix(
-            y_true, y_pred, subset, run_id, document_classes
-        )
-        # --- Class-wise detailed metrics ---
-        calculate_and_save_class_report(
-            y_true, y_pred, subset, run_id, document_classes
-        )
+            y_true.append(class_name)
+            y_pred.append(prediction)
+            item_paths.append(str(path))
+
+        if skipped_oom:
+            print_error(f"Сабсет {subset}: пропущено из-за OOM: {skipped_oom}")
+
+        with tracer.span("metrics_csv", subset=subset):
+            store.write_table(
+                "predictions",
+                pd.DataFrame({"path": item_paths, "y_true": y_true, "y_pred": y_pred}),
+                subset,
+            )
+            subset_metrics = calculate_and_save_metrics(
+                y_true, y_pred, subset, store, document_classes
+            )
+            # --- Confusion matrix ---
+            calculate_and_save_confusion_matrix(
+                y_true, y_pred, subset, store, document_classes
+            )
+            # --- Class-wise detailed metrics ---
+            calculate_and_save_class_report(
+                y_true, y_pred, subset, store, document_classes
+            )
+            if cascade_rows:
+                assert cascade is not None
+                calculate_and_save_cascade_report(
+                    pd.DataFrame(cascade_rows), subset, store, cascade
+                )
         if subset_metrics:
             all_metrics.append(subset_metrics)
+        if results_db is not None:
+            results_db.add_predictions(
+                run_id,
+                subset,
+                (
+                    (p, t, pr, t == pr, None)
+                    for p, t, pr in zip(item_paths, y_true, y_pred, strict=True)
+                ),
+            )
+            results_db.add_metrics(run_id, subset, subset_metrics or {})
+
+    if results_db is not None:
+        results_db.set_subsets(run_id, processed_subsets)
 
     # --- Общий отчёт по классам на всём датасете ---
     if y_true and y_pred:
         calculate_and_save_class_report(
-            y_true, y_pred, "overall", run_id, document_classes
+            y_true, y_pred, "overall", store, document_classes
         )
 
     if all_metrics:
@@ -289,9 +526,27 @@ def run_evaluation(config: Dict[str, Any]) -> None:
         print_info(f"Средняя точность (Precision): {avg_metrics['precision']:.4f}")
         print_info(f"Средний отзыв (Recall): {avg_metrics['recall']:.4f}")
 
-        out_file = f"{run_id}_final_classification_results.csv"
-        final_df.to_csv(out_file, index=False)
+        out_file = store.write_table(
+            "final_classification_results",
+            final_df,
+            "ALL",
+            csv_name=f"{run_id}_final_classification_results.csv",
+        )
         print_success(f"Итоговые метрики сохранены в {out_file}")
+        if results_db is not None:
+            results_db.add_metrics(run_id, "ALL", avg_metrics.to_dict())
+
+    if guard.oom_count:
+        print_info(f"OOM за запуск: {guard.report()}")
+    prefix_report = prefix_cache_report(model)
+    if prefix_report:
+        print_info(f"Кеш префикса промпта: {prefix_report}")
+    pixel_report = pixel_cache_report()
+    if pixel_report:
+        print_info(f"Кеш изображений: {pixel_report}")
+
+    finish_telemetry(store)
+    finish_tracing(run_id)
 
 
 def main() -> None:
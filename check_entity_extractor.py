@@ -5,21 +5,32 @@ import os
 import uuid
 from asyncio import create_task
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import click
 import Levenshtein
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionContentPartParam
 from pydantic import BaseModel, create_model
 from sklearn.metrics import f1_score, precision_score, recall_score
 from tqdm.asyncio import tqdm
 
+from artifact_store import DEFAULT_ROOT, RunArtifactStore
+from augment import subset_dir
+from batcher import MicroBatcher
+from dataset_io import DatasetPath, load_image_for_model, open_dataset
+from execution_guard import ExecutionGuard
+from metric_plots import DEFAULT_DPI, PlotRenderer, render_field_plots
+from results_db import DEFAULT_DB_PATH, ResultsDB, hash_text
+from telemetry import DEFAULT_INTERVAL_S, configure_telemetry, finish_telemetry, get_telemetry
+
 load_dotenv()
 
+# Повторяющиеся строковые колонки детальных результатов хранятся словарём (category)
+ENCODED_COLUMNS = ("field", "subset", "prompt_hash", "gt", "pred")
+
 client = AsyncOpenAI(
     base_url=os.getenv("RUNPOD_URL"),
     api_key="token-test",
@@ -41,13 +52,14 @@ def word_error_rate(gt: str, pred: str) -> float:
 def evaluate(gt_path, pred_path, fuzzy_threshold=90):
     rows = []
 
-    gt_path = Path(gt_path)
+    # gt_path может указывать внутрь zip-архива (см. dataset_io.open_dataset)
+    gt_path = Path(gt_path) if isinstance(gt_path, str) else gt_path
     pred_path = Path(pred_path)
 
     files = sorted(gt_path.glob("*.json"))
 
     for i, gt_file in enumerate(files):
-        with open(gt_file, "r", encoding="utf-8") as f:
+        with gt_file.open("r", encoding="utf-8") as f:
             gt = json.load(f)
         with open(pred_path / gt_file.name, "r", encoding="utf-8") as f:
             pred = json.load(f)
@@ -116,56 +128,56 @@ def evaluate(gt_path, pred_path, fuzzy_threshold=90):
     }
 
 
-def plot_metrics(per_field_df):
-    sns.set(style="whitegrid")
+def encode_result_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Переводит повторяющиеся строковые колонки в категориальные (словарное кодирование)."""
+    columns = [column for column in ENCODED_COLUMNS if column in df.columns]
+    return df.astype({column: "category" for column in columns})
 
-    plt.figure(figsize=(10, 5))
-    sns.barplot(
-        x="cer",
-        y="field",
-        data=per_field_df.sort_values("cer", ascending=False),
-        palette="Reds_r",
-    )
-    plt.title("CER по полям")
-    plt.xlabel("CER")
-    plt.ylabel("Поле")
-    plt.tight_layout()
-    plt.savefig("cer_per_field.png", dpi=300, bbox_inches="tight")
-
-    # Fuzzy Accuracy по полям
-    plt.figure(figsize=(10, 5))
-    sns.barplot(
-        x="fuzzy_match",
-        y="field",
-        data=per_field_df.sort_values("fuzzy_match", ascending=True),
-        palette="Blues",
-    )
-    plt.title("Fuzzy Accuracy по полям")
-    plt.xlabel("Fuzzy Accuracy")
-    plt.ylabel("Поле")
-    plt.tight_layout()
-
-    plt.savefig(
-        "fuzzy_accurcy_per_field.png", dpi=300, bbox_inches="tight"
-    )  # ← сохранение графика
-
-    # Exact Match Accuracy по полям
-    plt.figure(figsize=(10, 5))
-    sns.barplot(
-        x="exact_match",
-        y="field",
-        data=per_field_df.sort_values("exact_match", ascending=True),
-        palette="Greens",
-    )
-    plt.title("Exact Match Accuracy по полям")
-    plt.xlabel("Точность (Exact Match)")
-    plt.ylabel("Поле")
-    plt.tight_layout()
-    plt.savefig(
-        "exact_match_accurcy_per_field.png", dpi=300, bbox_inches="tight"
-    )  # ← сохранение графика
 
-    plt.figure(figsize=(12, 6))
+def concat_encoded(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """``pd.concat`` без потери категорий.
+
+    У категориальных колонок разных сабсетов разные словари, и ``pd.concat``
+    превратил бы их обратно в ``object``; словари сначала объединяются.
+    """
+    frames = [frame.copy(deep=False) for frame in frames]
+    columns = {
+        column
+        for frame in frames
+        for column in frame.columns
+        if isinstance(frame[column].dtype, pd.CategoricalDtype)
+    }
+    for column in columns:
+        categories = pd.api.types.union_categoricals(
+            [frame[column] for frame in frames if column in frame.columns], ignore_order=True
+        ).categories
+        for frame in frames:
+            if column in frame.columns:
+                frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def decode_result_frame(df: pd.DataFrame, prompts: pd.DataFrame) -> pd.DataFrame:
+    """Возвращает текст промпта и строковые колонки (для выгрузки в CSV).
+
+    Args:
+        df (pd.DataFrame): Закодированная таблица с колонкой ``prompt_hash``.
+        prompts (pd.DataFrame): Таблица ``prompts`` (``prompt_hash``, ``prompt``).
+    """
+    categorical = [
+        column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)
+    ]
+    decoded = df.astype({column: object for column in categorical})
+    prompt_text = prompts.set_index("prompt_hash")["prompt"]
+    decoded["prompt"] = decoded.pop("prompt_hash").map(prompt_text)
+    return decoded
+
+
+def plot_metrics(
+    per_field_df: pd.DataFrame, output_dir: Union[str, Path] = ".", dpi: int = DEFAULT_DPI
+) -> List[Path]:
+    # Синхронный вариант; в запуске графики рисует PlotRenderer в отдельном процессе
+    return render_field_plots(per_field_df, Path(output_dir), "ALL", dpi)
 
 
 def print_top_errors(per_field_df, top_n=5):
@@ -215,39 +227,131 @@ def read_prompt_from_file(filepath):
 
 
 def image_to_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        # Encode the image as base64
-        encoded_string = base64.b64encode(image_file.read())
-        return encoded_string.decode("utf-8")
-
-
-async def run_request_to_runpod(json_schema, base64_image, prompt, model_name):
-    content = [
+    # read_bytes работает для файлов на диске, членов zip-архива и производных сабсетов
+    encoded_string = base64.b64encode(image_path.read_bytes())
+    return encoded_string.decode("utf-8")
+
+
+async def run_request_to_runpod(
+    json_schema: Dict[str, Any],
+    base64_image: str,
+    prompt: str,
+    model_name: str,
+    openai_client: Optional[AsyncOpenAI] = None,
+) -> Any:
+    # openai_client — другой эндпоинт с тем же запросом (load_test.py); по умолчанию RUNPOD_URL
+    content: List[ChatCompletionContentPartParam] = [
         {"type": "text", "text": prompt},
         {
             "type": "image_url",
             "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
         },
     ]
-    completion = await client.chat.completions.create(
+    completion = await (openai_client or client).chat.completions.create(
         model=model_name,
         messages=[{"role": "user", "content": content}],
         extra_body={"guided_json": json_schema},
     )
-    return json.loads(completion.choices[0].message.content)
+    # Пустой ответ разбирается как невалидный JSON (JSONDecodeError), как и обрезанный
+    return json.loads(completion.choices[0].message.content or "")
+
+
+class RunPodBackend:
+    """Извлечение через OpenAI-совместимый эндпоинт RunPod (изображение в base64)."""
+
+    concurrency = 3
+
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+
+    async def __call__(self, image: Any, schema: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+        return await run_request_to_runpod(schema, image_to_base64(image), prompt, self.model_name)
+
 
+class LocalBackend:
+    """Извлечение локальной моделью Qwen2.5-VL в этом же процессе, пакетами.
 
-def read_json_file(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
+    Изображение передаётся модели путём к файлу или декодированным
+    ``PIL.Image`` (``load_image_for_model``) — без base64 и HTTP. Запросы
+    конкурентных задач собирает ``batcher.MicroBatcher``: пакет до
+    ``batch_size`` уходит в модель одним ``generate`` с паддингом слева,
+    ответ каждой строки ограничивается её JSON-схемой, как ``guided_json``
+    на сервере. При OOM ``ExecutionGuard.map_batches`` делит пакет пополам
+    и запоминает уменьшенный размер до конца запуска.
+
+    Args:
+        model (Any): Обёртка модели (``initialize_model``).
+        batch_size (int): Максимальный размер пакета.
+        max_new_tokens (int): Лимит новых токенов ответа.
+        max_wait_ms (float): Сколько запрос ждёт попутчиков в пакет.
+    """
+
+    def __init__(
+        self, model: Any, batch_size: int = 4, max_new_tokens: int = 512, max_wait_ms: float = 10.0
+    ) -> None:
+        from qwen_runtime import supports_direct_generation
+
+        if not supports_direct_generation(model):
+            raise click.ClickException(
+                "Локальному бэкенду нужна обёртка с доступом к model/processor"
+            )
+        self.model = model
+        self.max_new_tokens = max_new_tokens
+        self.batcher = MicroBatcher(self._run_batch, max_batch=batch_size, max_wait_ms=max_wait_ms)
+        self.guard = ExecutionGuard(batch_size=self.batcher.max_batch)
+        # Вдвое больше задач, чем мест в пакете: пока модель считает пакет, следующий уже собирается
+        self.concurrency = 2 * self.batcher.max_batch
+
+    async def __call__(self, image: Any, schema: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+        return await self.batcher.submit_async((load_image_for_model(image), schema, prompt))
+
+    def _run_batch(self, batch: List[Tuple[Any, Dict[str, Any], str]]) -> List[Any]:
+        from qwen_runtime import predict_json_batch
+
+        def run(chunk: List[Tuple[Any, Dict[str, Any], str]]) -> List[Any]:
+            # Раскладка «текст, затем изображение» — как в запросе к RunPod
+            return predict_json_batch(
+                self.model,
+                [([image], prompt) for image, _, prompt in chunk],
+                [schema for _, schema, _ in chunk],
+                max_new_tokens=self.max_new_tokens,
+                text_first=True,
+            )
+
+        return self.guard.map_batches(run, batch)
+
+
+def load_local_model(model_name: str, device_map: str, cache_dir: str) -> Any:
+    """Создаёт ``Qwen2_5_VLModel`` через ``initialize_model``, как остальные скрипты."""
+    from bench_utils.model_utils import initialize_model  # type: ignore
+
+    from cpu_backend import enable_cpu_backend
+
+    model_config = {
+        "model_name": model_name,
+        "model_family": "Qwen2.5-VL",
+        "device_map": device_map,
+        "cache_dir": cache_dir,
+        "package": "model_qwen2_5_vl",
+        "module": "models",
+        "model_class": "Qwen2_5_VLModel",
+        "system_prompt": "",
+    }
+    return enable_cpu_backend(initialize_model(model_config), model_config)
+
+
+def read_json_file(file_path: Union[str, DatasetPath]) -> Any:
+    file_path = Path(file_path) if isinstance(file_path, str) else file_path
+    with file_path.open("r", encoding="utf-8") as f:
         data = json.load(f)
     return data
 
 
-async def process_image(i, dataset_path, prompt, model_name):
+async def process_image(i: int, dataset_path: DatasetPath, prompt: str, model_name: str) -> None:
 
     image = dataset_path / "images" / f"{i}.jpg"
     base64_image = image_to_base64(image)
-    json_data = read_json_file(str(dataset_path / "jsons" / f"{i}.json"))
+    json_data = read_json_file(dataset_path / "jsons" / f"{i}.json")
     GeneratedModel = generate_pydantic_model(json_data, "StructureModel")
     schema = GeneratedModel.model_json_schema()
 
@@ -261,31 +365,79 @@ async def process_image(i, dataset_path, prompt, model_name):
         json.dump(gt, f, ensure_ascii=False, indent=4)
 
 
-async def check_entity_extractor(dataset_path, prompt_path, model_name, subsets):
+async def check_entity_extractor(
+    dataset_path: DatasetPath,
+    prompt_path: Union[str, Path],
+    model_name: str,
+    subsets: List[str],
+    artifacts_root: str = DEFAULT_ROOT,
+    export_csv: bool = False,
+    results_db_path: Optional[str] = DEFAULT_DB_PATH,
+    backend: Optional[Union["RunPodBackend", "LocalBackend"]] = None,
+    plot_dpi: int = DEFAULT_DPI,
+) -> None:
+    backend = backend or RunPodBackend(model_name)
     run_id = uuid.uuid4()
-    subsets = [dataset_path / "images" / subset for subset in subsets]
-    print(subsets)
+    store = RunArtifactStore(
+        str(run_id),
+        root=artifacts_root,
+        export_csv=export_csv,
+        metadata={"script": "check_entity_extractor", "model_name": model_name},
+    )
+    # Отсутствующие сабсеты вычисляются из clean на лету (augment.py)
+    subset_paths = [subset_dir(dataset_path / "images", subset) for subset in subsets]
+    print(subset_paths)
     prompt = read_prompt_from_file(prompt_path)
+    # Текст промпта хранится один раз в таблице prompts, в строках результатов — только хеш
+    prompt_hash = hash_text(prompt)
+    prompts_df = pd.DataFrame([{"prompt_hash": prompt_hash, "prompt": prompt}])
+    store.write_table("prompts", prompts_df, "ALL")
+
+    results_db = ResultsDB(results_db_path) if results_db_path else None
+    if results_db is not None:
+        results_db.register_run(
+            str(run_id),
+            "entity_extraction",
+            model_name,
+            prompt_text=prompt,
+            prompt_name=Path(prompt_path).stem,
+            config={
+                "dataset_path": str(dataset_path),
+                "model_name": model_name,
+                "subsets": subsets,
+            },
+            # Имя директории производного сабсета уже содержит пометку +derived
+            subsets=[subset.name for subset in subset_paths],
+            artifacts=str(store.run_dir),
+        )
 
     all_dfs = []
     all_field_metrics = []
+    # Графики сабсета рисуются в фоновом процессе, пока идёт инференс следующего
+    plots = PlotRenderer(store.run_dir / "plots", dpi=plot_dpi)
 
-    for subset in subsets:
+    for subset in subset_paths:
         subset_name = subset.name
+        get_telemetry().set_label(subset_name)
         print(f"\n📂 Обработка сабсета: {subset_name}")
 
         pred_dir = Path("output") / dataset_path.name / subset_name / "pred"
         pred_dir.mkdir(exist_ok=True, parents=True)
 
-        image_files = sorted(list(subset.glob("*.jpg")))
-        semaphore = asyncio.Semaphore(3)
+        image_files = sorted(subset.glob("*.jpg"), key=str)
+        semaphore = asyncio.Semaphore(backend.concurrency)
 
-        async def sem_task(i, *, _semaphore=semaphore, _image_files=image_files, _pred_dir=pred_dir):
+        async def sem_task(
+            i: int,
+            *,
+            _semaphore: asyncio.Semaphore = semaphore,
+            _image_files: List[DatasetPath] = image_files,
+            _pred_dir: Path = pred_dir,
+        ) -> None:
             async with _semaphore:
                 try:
                     image = _image_files[i]
                     image_id = image.stem
-                    base64_image = image_to_base64(image)
                     json_data = read_json_file(
                         dataset_path / "jsons" / f"{image_id}.json"
                     )
@@ -294,9 +446,7 @@ async def check_entity_extractor(dataset_path, prompt_path, model_name, subsets)
                     )
                     schema = GeneratedModel.model_json_schema()
 
-                    gt = await run_request_to_runpod(
-                        schema, base64_image, prompt, model_name
-                    )
+                    gt = await backend(image, schema, prompt)
 
                     with open(
                         _pred_dir / f"{image_id}.json", "w", encoding="utf-8"
@@ -322,45 +472,94 @@ async def check_entity_extractor(dataset_path, prompt_path, model_name, subsets)
 
         # Добавляем информацию о сабсете
         metrics["full_df"]["subset"] = subset_name
-        metrics["full_df"]["prompt"] = prompt
+        metrics["full_df"]["prompt_hash"] = prompt_hash
         metrics["per_field_metrics"]["subset"] = subset_name
-        metrics["per_field_metrics"]["prompt"] = prompt
-
+        metrics["per_field_metrics"]["prompt_hash"] = prompt_hash
+
+        if results_db is not None:
+            full_df = metrics["full_df"]
+            results_db.add_predictions(
+                str(run_id),
+                subset_name,
+                zip(
+                    full_df["doc_id"].astype(str) + ":" + full_df["field"],
+                    full_df["gt"],
+                    full_df["pred"],
+                    full_df["exact_match"].astype(bool),
+                    full_df["cer"].astype(float),
+                    strict=True,
+                ),
+            )
+            results_db.add_metrics(str(run_id), subset_name, metrics)
+        metrics["full_df"] = encode_result_frame(metrics["full_df"])
+        metrics["per_field_metrics"] = encode_result_frame(metrics["per_field_metrics"])
         all_dfs.append(metrics["full_df"])
         all_field_metrics.append(metrics["per_field_metrics"])
+        plots.submit(metrics["per_field_metrics"], subset_name)
 
         # Сохраняем отдельно
-        metrics["full_df"].to_csv(
-            f"{run_id}_{subset_name}_detailed_result.csv", index=False
+        store.write_table(
+            "detailed_result",
+            metrics["full_df"],
+            subset_name,
+            csv_name=f"{run_id}_{subset_name}_detailed_result.csv.gz",
         )
-        metrics["per_field_metrics"].to_csv(
-            f"{run_id}_{subset_name}_per_field_metrics.csv", index=False
+        store.write_table(
+            "per_field_metrics",
+            metrics["per_field_metrics"],
+            subset_name,
+            csv_name=f"{run_id}_{subset_name}_per_field_metrics.csv.gz",
         )
 
     # Объединение всех результатов
-    final_df = pd.concat(all_dfs, ignore_index=True)
-    final_field_metrics = pd.concat(all_field_metrics, ignore_index=True)
+    final_df = concat_encoded(all_dfs)
+    final_field_metrics = concat_encoded(all_field_metrics)
 
-    # Пересчитываем общие метрики по всем сабсетам
+    # Пересчитываем общие метрики по всем сабсетам; y_true/y_pred уже посчитаны в evaluate
+    # (сравнение gt == pred у категорий с разными словарями невозможно)
     overall_metrics = {
-        "exact_accuracy": (final_df["gt"] == final_df["pred"]).mean(),
+        "exact_accuracy": final_df["exact_match"].mean(),
         "avg_cer": final_df["cer"].mean(),
         "avg_wer": final_df["wer"].mean(),
-        "precision": precision_score(
-            final_df["gt"] != "", final_df["gt"] == final_df["pred"]
-        ),
-        "recall": recall_score(
-            final_df["gt"] != "", final_df["gt"] == final_df["pred"]
-        ),
-        "f1": f1_score(final_df["gt"] != "", final_df["gt"] == final_df["pred"]),
+        "precision": precision_score(final_df["y_true"], final_df["y_pred"]),
+        "recall": recall_score(final_df["y_true"], final_df["y_pred"]),
+        "f1": f1_score(final_df["y_true"], final_df["y_pred"]),
     }
 
     print("\n📈 Общие метрики по всем сабсетам:")
     for k, v in overall_metrics.items():
         print(f"{k}: {v:.4f}")
 
-    final_df.to_csv(f"{run_id}_ALL_detailed_result.csv", index=False)
-    final_field_metrics.to_csv(f"{run_id}_ALL_per_field_metrics.csv", index=False)
+    # Сводные таблицы по всем сабсетам — это объединение партиций, в хранилище
+    # пишем только общие метрики, а полные CSV — лишь при экспорте
+    store.write_table("overall_metrics", pd.DataFrame([overall_metrics]), "ALL")
+    if results_db is not None:
+        results_db.add_metrics(str(run_id), "ALL", overall_metrics)
+    if store.export_csv:
+        decode_result_frame(final_df, prompts_df).to_csv(
+            f"{run_id}_ALL_detailed_result.csv.gz", index=False
+        )
+        decode_result_frame(final_field_metrics, prompts_df).to_csv(
+            f"{run_id}_ALL_per_field_metrics.csv.gz", index=False
+        )
+    plots.submit(
+        final_field_metrics.groupby("field", observed=True)[["exact_match", "cer", "wer"]]
+        .mean()
+        .reset_index(),
+        "ALL",
+    )
+    saved_plots = plots.close()
+    if saved_plots:
+        print(f"🖼️  Графики: {len(saved_plots)} файлов в {store.run_dir / 'plots'}")
+
+    batcher = getattr(backend, "batcher", None)
+    if batcher is not None and batcher.stats.batches:
+        print(f"📦 Батчинг: {batcher.stats.as_dict()}")
+    guard = getattr(backend, "guard", None)
+    if guard is not None and guard.oom_count:
+        print(f"OOM за запуск: {guard.report()}")
+    finish_telemetry(store)
+    print(f"Артефакты запуска: {store.run_dir}")
 
 
 @click.command()
@@ -373,13 +572,115 @@ async def check_entity_extractor(dataset_path, prompt_path, model_name, subsets)
     default=None,
     help="Список сабсетов через запятую, например: --subsets blur,noise,clean,bright,gray,rotated,spatter",
 )
-def main(dataset_path, prompt_path, model_name, subsets):
+@click.option(
+    "--artifacts-root",
+    type=str,
+    default=DEFAULT_ROOT,
+    show_default=True,
+    help="Каталог хранилища артефактов (runs/<run_id>/...).",
+)
+@click.option(
+    "--export-csv/--no-export-csv",
+    default=False,
+    help="Дополнительно сохранять результаты в CSV в текущей директории.",
+)
+@click.option(
+    "--results-db",
+    "results_db_path",
+    type=str,
+    default=DEFAULT_DB_PATH,
+    show_default=True,
+    help="Реестр результатов (SQLite); пустая строка отключает регистрацию.",
+)
+@click.option(
+    "--backend",
+    "backend_name",
+    type=click.Choice(["runpod", "local"]),
+    default="runpod",
+    show_default=True,
+    help="runpod — OpenAI-совместимый эндпоинт (RUNPOD_URL), local — модель в этом процессе.",
+)
+@click.option("--batch-size", type=int, default=4, show_default=True, help="Размер пакета (local).")
+@click.option(
+    "--device-map", type=str, default="cuda:0", show_default=True, help="Устройство модели (local)."
+)
+@click.option(
+    "--cache-dir", type=str, default="./model_cache", show_default=True, help="Кеш весов (local)."
+)
+@click.option(
+    "--max-new-tokens", type=int, default=512, show_default=True, help="Лимит ответа (local)."
+)
+@click.option(
+    "--max-wait-ms",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Сколько запрос ждёт попутчиков в пакет (local).",
+)
+@click.option(
+    "--plot-dpi",
+    type=int,
+    default=DEFAULT_DPI,
+    show_default=True,
+    help="Разрешение графиков метрик по полям; 0 отключает графики.",
+)
+@click.option(
+    "--telemetry-interval",
+    type=float,
+    default=DEFAULT_INTERVAL_S,
+    show_default=True,
+    help="Интервал замеров RSS/CPU/GPU в секундах; 0 отключает телеметрию.",
+)
+def main(
+    dataset_path: Path,
+    prompt_path: Path,
+    model_name: str,
+    subsets: Optional[str],
+    artifacts_root: str,
+    export_csv: bool,
+    results_db_path: str,
+    backend_name: str,
+    batch_size: int,
+    device_map: str,
+    cache_dir: str,
+    max_new_tokens: int,
+    max_wait_ms: float,
+    plot_dpi: int,
+    telemetry_interval: float,
+) -> None:
+    telemetry = configure_telemetry(
+        {"enabled": telemetry_interval > 0, "interval_s": telemetry_interval}
+    )
+    telemetry.set_label("model_load")
+    dataset_path = open_dataset(dataset_path)
     if not subsets:
-        subsets = [d.name for d in (dataset_path / "images").iterdir() if d.is_dir()]
+        subset_names = [d.name for d in (dataset_path / "images").iterdir() if d.is_dir()]
     else:
-        subsets = [s.strip() for s in subsets.split(",")]
-
-    asyncio.run(check_entity_extractor(dataset_path, prompt_path, model_name, subsets))
+        subset_names = [s.strip() for s in subsets.split(",")]
+
+    if backend_name == "local":
+        backend = LocalBackend(
+            load_local_model(model_name, device_map, cache_dir),
+            batch_size,
+            max_new_tokens,
+            max_wait_ms,
+        )
+    else:
+        backend = RunPodBackend(model_name)
+
+    asyncio.run(
+        check_entity_extractor(
+            dataset_path,
+            prompt_path,
+            model_name,
+            subset_names,
+            artifacts_root,
+            export_csv,
+            results_db_path,
+            backend,
+            plot_dpi,
+        )
+    )
 
 
 if __name__ == "__main__":
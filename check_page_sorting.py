@@ -1,10 +1,10 @@
 import json
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from bench_utils.metrics import calculate_ordering_metrics
 from bench_utils.model_utils import initialize_model, load_prompt, prepare_prompt
 from bench_utils.utils import (
     get_document_type_from_config,
@@ -13,21 +13,45 @@ from bench_utils.utils import (
 )
 from tqdm import tqdm
 
+from artifact_store import RunArtifactStore, store_from_config
+from augment import configure_augmentation, subset_dir, subset_label
+from cpu_backend import enable_cpu_backend
+from dataset_io import DatasetPath, load_image_for_model, open_dataset
+from execution_guard import (
+    OOMExhaustedError,
+    configure_execution_guard,
+    get_execution_guard,
+)
+from json_stream import JsonStoppingCriteria, OrderedPagesRecognizer
+from ordering_metrics import OrderingMetrics, compute_ordering_metrics
+from pixel_cache import enable_pixel_cache, pixel_cache_report
+from qwen_runtime import (
+    DEFAULT_MAX_NEW_TOKENS,
+    generate,
+    get_generation_stats,
+    prepare_inputs,
+    supports_direct_generation,
+)
+from results_db import results_db_from_config
+from telemetry import configure_telemetry, finish_telemetry
+from tracing import configure_tracing, finish_tracing, get_tracer, trace_model
+
 
 def get_image_paths_for_document(
-    dataset_path: Path, document_id: str, subset_name: str
-) -> List[Path]:
+    dataset_path: DatasetPath, document_id: str, subset_name: str
+) -> List[DatasetPath]:
     """Получает пути к изображениям страниц для конкретного документа.
 
     Args:
-        dataset_path (Path): Корневой путь к датасету.
+        dataset_path (DatasetPath): Корневой путь к датасету (директория или
+            путь внутри zip-архива).
         document_id (str): Идентификатор документа.
         subset_name (str): Имя подмножества (например, 'clean', 'blur').
 
     Returns:
-        List[Path]: Список путей к изображениям страниц документа в порядке номеров.
+        List[DatasetPath]: Список путей к изображениям страниц документа в порядке номеров.
     """
-    document_dir = dataset_path / "images" / subset_name / document_id
+    document_dir = subset_dir(dataset_path / "images", subset_name) / document_id
     if not document_dir.exists():
         return []
 
@@ -43,12 +67,12 @@ def get_image_paths_for_document(
 
 
 def get_document_ids(
-    dataset_path: Path, subset_name: str, sample_size: Optional[int] = None
+    dataset_path: DatasetPath, subset_name: str, sample_size: Optional[int] = None
 ) -> List[str]:
     """Получает список ID документов в указанном подмножестве.
 
     Args:
-        dataset_path (Path): Корневой путь к датасету.
+        dataset_path (DatasetPath): Корневой путь к датасету.
         subset_name (str): Имя подмножества.
         sample_size (Optional[int]): Количество документов для выборки.
                                    Если None, обрабатываются все документы.
@@ -56,11 +80,12 @@ def get_document_ids(
     Returns:
         List[str]: Список ID документов.
     """
-    subset_dir = dataset_path / "images" / subset_name
-    if not subset_dir.exists():
+    # Отсутствующий сабсет вычисляется из clean на лету (augment.py)
+    images_dir = subset_dir(dataset_path / "images", subset_name)
+    if not images_dir.exists():
         return []
 
-    document_ids = [d.name for d in subset_dir.iterdir() if d.is_dir()]
+    document_ids = [d.name for d in images_dir.iterdir() if d.is_dir()]
 
     if sample_size is not None:
         document_ids = document_ids[:sample_size]
@@ -69,12 +94,12 @@ def get_document_ids(
 
 
 def load_ground_truth_dynamic(
-    dataset_path: Path, document_id: str, document_type_key: str
+    dataset_path: DatasetPath, document_id: str, document_type_key: str
 ) -> List[int]:
     """Загружает правильный порядок страниц из JSON файла для любого типа документа.
 
     Args:
-        dataset_path (Path): Корневой путь к датасету.
+        dataset_path (DatasetPath): Корневой путь к датасету.
         document_id (str): Идентификатор документа.
         document_type_key (str): Ключ типа документа в JSON файле.
 
@@ -184,13 +209,64 @@ def process_model_response(model_response: str) -> List[int]:
     return []
 
 
-def get_prediction(model: Any, image_paths: List[Path], prompt: str) -> List[int]:
+def generate_ordered_pages(
+    model: Any, pages: List[Any], prompt: str, max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS
+) -> Tuple[Optional[List[int]], str]:
+    """Генерирует ответ и останавливается, как только закрыт валидный JSON.
+
+    Декодирование прекращается на закрывающей скобке объекта
+    ``{"ordered_pages": [...]}`` с числом страниц, равным ``len(pages)``.
+
+    Returns:
+        Tuple[Optional[List[int]], str]: Разобранный порядок страниц (``None``,
+        если объект так и не появился) и сырой текст ответа.
+    """
+    recognizer = OrderedPagesRecognizer(expected_pages=len(pages))
+    inputs = prepare_inputs(model, pages, prompt)
+    criteria = JsonStoppingCriteria(
+        model.processor.tokenizer, recognizer, inputs["input_ids"].shape[1]
+    )
+    result = generate(
+        model,
+        pages,
+        prompt,
+        max_new_tokens=max_new_tokens,
+        stopping_criteria=[criteria],
+        inputs=inputs,
+    )
+    return recognizer.result, result.text
+
+
+def get_prediction(
+    model: Any,
+    image_paths: List[DatasetPath],
+    prompt: str,
+    early_stop: bool = True,
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+) -> List[int]:
+    tracer = get_tracer()
     try:
-        image_paths_str = [str(path) for path in image_paths]
-        model_response = model.predict_on_images(
-            images=image_paths_str, prompt=prompt
-        )
-        return process_model_response(model_response)
+        with tracer.span("image_load", pages=len(image_paths)):
+            images = [load_image_for_model(path) for path in image_paths]
+        with tracer.span("predict"):
+            # Все страницы обязательны: при OOM снижается только разрешение
+            if early_stop and supports_direct_generation(model):
+                ordered_pages, model_response = get_execution_guard().run(
+                    lambda pages: generate_ordered_pages(model, pages, prompt, max_new_tokens),
+                    images,
+                )
+                if ordered_pages:
+                    return ordered_pages
+            else:
+                model_response = get_execution_guard().run(
+                    lambda pages: model.predict_on_images(images=pages, prompt=prompt),
+                    images,
+                )
+        # Цепочка регулярных выражений нужна только для ответов без валидного JSON
+        with tracer.span("process_model_response"):
+            return process_model_response(model_response)
+    except OOMExhaustedError:
+        raise
     except Exception as e:
         print(f"Ошибка при предсказании для документа: {e}")
         return []
@@ -206,23 +282,37 @@ def save_prediction(output_dir: Path, document_id: str, prediction: List[int]) -
 
 
 def calculate_and_save_metrics(
-    all_metrics: Dict[str, List[float]], subset_name: str, run_id: str
+    ordering: Optional[OrderingMetrics], subset_name: str, store: RunArtifactStore
 ) -> Dict[str, float]:
-    if not all_metrics or not any(all_metrics.values()):
+    if ordering is None or not ordering.accuracy.size:
         print("Нет данных для вычисления метрик.")
         return {}
 
-    mean_metrics = {
-        key: round(sum(values) / len(values), 4) if values else 0.0
-        for key, values in all_metrics.items()
-    }
+    mean_metrics = ordering.summary()
 
     print(f"\n📊 Метрики для сабсета {subset_name}:")
     for key, value in mean_metrics.items():
         print(f"  {key}: {value:.4f}")
 
     results_df = pd.DataFrame([mean_metrics])
-    results_df.to_csv(f"{run_id}_{subset_name}_page_sorting_results.csv", index=False)
+    store.write_table(
+        "page_sorting_results",
+        results_df,
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_page_sorting_results.csv",
+    )
+    store.write_table(
+        "page_sorting_position_errors",
+        ordering.position_frame(),
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_page_sorting_position_errors.csv",
+    )
+    store.write_table(
+        "page_sorting_swaps",
+        ordering.swap_frame(),
+        subset_name,
+        csv_name=f"{store.run_id}_{subset_name}_page_sorting_swaps.csv",
+    )
 
     return mean_metrics
 
@@ -231,16 +321,44 @@ def run_evaluation(config: Dict[str, Any]) -> None:
     task_config = config["task"]
     model_config = config["model"]
 
-    dataset_path = Path(task_config["dataset_path"])
+    dataset_path = open_dataset(task_config["dataset_path"])
     prompt_path = Path(task_config["prompt_path"])
     sample_size = task_config.get("sample_size")
     output_base_dir = Path(task_config["output_dir"])
 
-    model = initialize_model(model_config)
+    generation_config = config.get("generation", {})
+    early_stop = bool(generation_config.get("early_stop_json", True))
+    max_new_tokens = int(generation_config.get("max_new_tokens", DEFAULT_MAX_NEW_TOKENS))
+
+    tracer = configure_tracing(config.get("tracing"))
+    telemetry = configure_telemetry(config.get("telemetry"))
+    telemetry.set_label("model_load")
+    guard = configure_execution_guard(config.get("execution_guard"))
+    configure_augmentation(config.get("augmentation"))
+    model = trace_model(
+        enable_pixel_cache(
+            enable_cpu_backend(initialize_model(model_config), model_config),
+            config.get("pixel_cache"),
+        ),
+        tracer,
+    )
 
     template = load_prompt(prompt_path)
     prompt = prepare_prompt(template)
     run_id = get_run_id(model_config["model_name"])
+    store = store_from_config(run_id, config, "check_page_sorting")
+    results_db = results_db_from_config(config)
+    if results_db is not None:
+        results_db.register_run(
+            run_id,
+            "page_sorting",
+            model_config["model_name"],
+            prompt_text=template,
+            prompt_name=prompt_path.stem,
+            config=config,
+            subsets=task_config["subsets"],
+            artifacts=str(store.run_dir),
+        )
 
     document_type_name = get_document_type_from_config(config, dataset_path)
     print(f"Обрабатываем документы типа: {document_type_name}")
@@ -256,56 +374,98 @@ def run_evaluation(config: Dict[str, Any]) -> None:
         return
 
     all_subset_metrics = []
+    processed_subsets: List[str] = []
 
     for subset in task_config["subsets"]:
+        telemetry.set_label(subset)
         print(f"\n📂 Обработка сабсета: {subset}")
 
-        document_ids = get_document_ids(dataset_path, subset, sample_size)
+        with tracer.span("path_discovery", subset=subset):
+            document_ids = get_document_ids(dataset_path, subset, sample_size)
         if not document_ids:
             print(f"Нет документов в сабсете {subset}")
             continue
 
         print(f"Найдено документов для обработки: {len(document_ids)}")
+        # Вычисленный из clean сабсет пишется в результаты и реестр как <subset>+derived
+        label = subset_label(subset, [subset_dir(dataset_path / "images", subset)])
+        processed_subsets.append(label)
 
-        output_dir = output_base_dir / dataset_path.name / subset
+        output_dir = output_base_dir / dataset_path.name / label
 
-        all_metrics = {
-            "kendall_tau": [],
-            "accuracy": [],
-            "spearman_rho": [],
-        }
+        # Метрики считаются после сабсета сразу по всем документам (ordering_metrics.py)
+        evaluated_ids: List[str] = []
+        true_orders: List[List[int]] = []
+        predicted_orders: List[List[int]] = []
 
         for doc_id in tqdm(document_ids, desc=f"Обработка {subset}"):
-            image_paths = get_image_paths_for_document(dataset_path, doc_id, subset)
+            with tracer.span("path_discovery", document=doc_id):
+                image_paths = get_image_paths_for_document(dataset_path, doc_id, subset)
             if len(image_paths) != 4:
                 print(
                     f"Документ {doc_id}: ожидается 4 страницы, найдено {len(image_paths)}"
                 )
                 continue
 
-            true_order = load_ground_truth_dynamic(
-                dataset_path, doc_id, document_type_key
-            )
+            with tracer.span("ground_truth"):
+                true_order = load_ground_truth_dynamic(
+                    dataset_path, doc_id, document_type_key
+                )
             if not true_order:
                 print(f"Не удалось загрузить правильный порядок для документа {doc_id}")
                 continue
 
-            predicted_order = get_prediction(model, image_paths, prompt)
+            try:
+                predicted_order = get_prediction(
+                    model, image_paths, prompt, early_stop, max_new_tokens
+                )
+            except OOMExhaustedError as e:
+                print(f"Документ {doc_id} пропущен из-за OOM: {e}")
+                continue
             if not predicted_order:
                 print(f"Не удалось получить предсказание для документа {doc_id}")
                 continue
 
-            save_prediction(output_dir, doc_id, predicted_order)
+            with tracer.span("save_prediction"):
+                save_prediction(output_dir, doc_id, predicted_order)
 
-            metrics = calculate_ordering_metrics(true_order, predicted_order)
-            for key, value in metrics.items():
-                all_metrics[key].append(value)
+            evaluated_ids.append(str(doc_id))
+            true_orders.append(list(true_order))
+            predicted_orders.append(list(predicted_order))
 
-            print(f"Документ {doc_id}: {metrics}")
+        ordering = None
+        if true_orders:
+            with tracer.span("ordering_metrics", subset=subset):
+                ordering = compute_ordering_metrics(true_orders, predicted_orders)
+            print(f"Ошибки по позициям: {ordering.position_error_rate.round(4).tolist()}")
 
-        subset_metrics = calculate_and_save_metrics(all_metrics, subset, run_id)
+        with tracer.span("metrics_csv", subset=subset):
+            subset_metrics = calculate_and_save_metrics(ordering, label, store)
         if subset_metrics:
             all_subset_metrics.append(subset_metrics)
+        if results_db is not None and ordering is not None:
+            prediction_rows = [
+                (
+                    doc_id,
+                    json.dumps(true_order),
+                    json.dumps(predicted_order),
+                    bool(correct),
+                    None if np.isnan(tau) else float(tau),
+                )
+                for doc_id, true_order, predicted_order, correct, tau in zip(
+                    evaluated_ids,
+                    true_orders,
+                    predicted_orders,
+                    ordering.accuracy,
+                    ordering.kendall_tau,
+                    strict=True,
+                )
+            ]
+            results_db.add_predictions(run_id, label, prediction_rows)
+            results_db.add_metrics(run_id, label, subset_metrics)
+
+    if results_db is not None:
+        results_db.set_subsets(run_id, processed_subsets)
 
     if all_subset_metrics:
         final_df = pd.DataFrame(all_subset_metrics)
@@ -315,8 +475,28 @@ def run_evaluation(config: Dict[str, Any]) -> None:
         print(f"  Средняя точность (Accuracy): {overall_metrics['accuracy']:.4f}")
         print(f"  Средний Kendall Tau: {overall_metrics['kendall_tau']:.4f}")
         print(f"  Средний Spearman Rho: {overall_metrics['spearman_rho']:.4f}")
+        print(f"  Доля предсказаний верной длины: {overall_metrics['valid_share']:.4f}")
 
-        final_df.to_csv(f"{run_id}_final_page_sorting_results.csv", index=False)
+        store.write_table(
+            "final_page_sorting_results",
+            final_df,
+            "ALL",
+            csv_name=f"{run_id}_final_page_sorting_results.csv",
+        )
+        if results_db is not None:
+            results_db.add_metrics(run_id, "ALL", overall_metrics.to_dict())
+
+    if guard.oom_count:
+        print(f"OOM за запуск: {guard.report()}")
+    generation_stats = get_generation_stats()
+    if generation_stats.calls:
+        print(f"Генерация с ранней остановкой: {generation_stats.as_dict()}")
+    pixel_report = pixel_cache_report()
+    if pixel_report:
+        print(f"Кеш изображений: {pixel_report}")
+
+    finish_telemetry(store)
+    finish_tracing(run_id)
 
 
 def main() -> None:
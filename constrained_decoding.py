@@ -0,0 +1,505 @@
+"""Декодирование, ограниченное JSON-схемой, для локальной модели.
+
+Схема (например, ``generate_pydantic_model(...).model_json_schema()``)
+компилируется в последовательность сегментов: литералов (``{"number": ``) и
+слотов значений (строка, число, enum, массив примитивов). Автомат по этим
+сегментам принимает текст посимвольно; ``SchemaGuide`` строит по нему маску
+допустимых токенов для каждого состояния и кеширует её, поэтому словарь
+просматривается один раз на состояние, а не на каждом шаге.
+
+Ответ всегда имеет компактную раскладку ``{"a": 1, "b": "x"}`` со всеми
+свойствами в порядке схемы, а после закрывающей скобки разрешён только EOS.
+Поддерживаются вложенные объекты, ``$ref``, ``enum``/``const``, ``anyOf`` из
+примитивов и массивы примитивов; для прочих конструкций ``compile_schema``
+выбрасывает ``UnsupportedSchemaError``.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+PRIMITIVE_KINDS = frozenset({"string", "number", "integer", "boolean", "null"})
+# Литералы примитивов без кавычек
+KEYWORD_LITERALS = {"boolean": ("true", "false"), "null": ("null",)}
+# Так декодируется токен, содержащий только часть многобайтового UTF-8 символа
+REPLACEMENT_CHAR = "�"
+
+
+class UnsupportedSchemaError(ValueError):
+    """Конструкция схемы не поддерживается ограниченным декодированием."""
+
+
+@dataclass(frozen=True)
+class ValueSlot:
+    """Место для значения: объединение примитивных типов, enum или массив."""
+
+    kinds: FrozenSet[str]
+    enum: Optional[Tuple[str, ...]] = None
+    array: bool = False
+
+
+Segment = Union[str, ValueSlot]
+State = Tuple[int, Hashable]
+
+
+# -------------------------------------------------------------
+# Компиляция схемы
+# -------------------------------------------------------------
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    ref = schema.get("$ref")
+    if ref is None:
+        return schema
+    if not ref.startswith("#/"):
+        raise UnsupportedSchemaError(f"Внешние ссылки не поддерживаются: {ref}")
+    node: Any = root
+    for part in ref[2:].split("/"):
+        node = node[part]
+    return _resolve(node, root)
+
+
+def _primitive_kinds(schema: Dict[str, Any], root: Dict[str, Any]) -> Optional[FrozenSet[str]]:
+    """Множество примитивных типов схемы или None, если это не примитив."""
+    schema = _resolve(schema, root)
+    if not schema or set(schema) <= {"title", "description", "default"}:
+        return PRIMITIVE_KINDS  # Any: любой примитив
+    alternatives = schema.get("anyOf") or schema.get("oneOf")
+    if alternatives:
+        kinds: set = set()
+        for alternative in alternatives:
+            alt_kinds = _primitive_kinds(alternative, root)
+            if alt_kinds is None:
+                return None
+            kinds |= alt_kinds
+        return frozenset(kinds)
+    schema_type = schema.get("type")
+    types = schema_type if isinstance(schema_type, list) else [schema_type]
+    if all(t in PRIMITIVE_KINDS for t in types):
+        return frozenset(types)
+    return None
+
+
+def _compile_value(schema: Dict[str, Any], root: Dict[str, Any], out: List[Segment]) -> None:
+    schema = _resolve(schema, root)
+    if "const" in schema:
+        out.append(json.dumps(schema["const"], ensure_ascii=False))
+        return
+    if "enum" in schema:
+        options = tuple(json.dumps(v, ensure_ascii=False) for v in schema["enum"])
+        out.append(ValueSlot(kinds=frozenset(), enum=options))
+        return
+
+    kinds = _primitive_kinds(schema, root)
+    if kinds is not None:
+        out.append(ValueSlot(kinds=kinds))
+        return
+
+    if schema.get("type") == "array":
+        item_kinds = _primitive_kinds(schema.get("items", {}), root)
+        if item_kinds is None:
+            raise UnsupportedSchemaError("Поддерживаются только массивы примитивов")
+        out.append(ValueSlot(kinds=item_kinds, array=True))
+        return
+
+    if schema.get("type") == "object" or "properties" in schema:
+        properties = schema.get("properties", {})
+        if not properties:
+            raise UnsupportedSchemaError("Объекты без перечисленных свойств не поддерживаются")
+        out.append("{")
+        for i, (key, value_schema) in enumerate(properties.items()):
+            prefix = ", " if i else ""
+            out.append(f"{prefix}{json.dumps(key, ensure_ascii=False)}: ")
+            _compile_value(value_schema, root, out)
+        out.append("}")
+        return
+
+    raise UnsupportedSchemaError(f"Неподдерживаемая схема: {schema}")
+
+
+def compile_schema(schema: Dict[str, Any]) -> List[Segment]:
+    """Компилирует JSON-схему в сегменты с объединёнными соседними литералами."""
+    raw: List[Segment] = []
+    _compile_value(schema, schema, raw)
+    segments: List[Segment] = []
+    for segment in raw:
+        if isinstance(segment, str) and segments and isinstance(segments[-1], str):
+            segments[-1] += segment
+        else:
+            segments.append(segment)
+    return segments
+
+
+# -------------------------------------------------------------
+# Автомат по символам
+# -------------------------------------------------------------
+
+_NUMBER_COMPLETE = {"zero", "int", "frac", "exp_digits"}
+_STRING_DONE = ("done",)
+_HEX = set("0123456789abcdefABCDEF")
+
+
+def _advance_number(phase: str, ch: str, integer: bool) -> Optional[str]:
+    if ch.isdigit() and ch.isascii():
+        if phase in ("start", "sign"):
+            return "zero" if ch == "0" else "int"
+        if phase in ("int", "frac", "exp_digits"):
+            return phase
+        if phase == "dot":
+            return "frac"
+        if phase in ("exp", "exp_sign"):
+            return "exp_digits"
+        return None
+    if ch == "-" and phase == "start":
+        return "sign"
+    if integer:
+        return None
+    if ch == "." and phase in ("zero", "int"):
+        return "dot"
+    if ch in "eE" and phase in ("zero", "int", "frac"):
+        return "exp"
+    if ch in "+-" and phase == "exp":
+        return "exp_sign"
+    return None
+
+
+def _advance_scalar(slot: ValueSlot, sub: Any, ch: str) -> Optional[Any]:
+    """Шаг внутри одного скалярного значения. ``sub`` — кортеж-состояние."""
+    kind = sub[0]
+    if kind == "start":
+        if slot.enum is not None:
+            options = tuple(o for o in slot.enum if o.startswith(ch))
+            return ("lit", ch, options) if options else None
+        if ch == '"' and "string" in slot.kinds:
+            return ("str", 0)
+        if ch == "-" or (ch.isdigit() and ch.isascii()):
+            if slot.kinds & {"number", "integer"}:
+                integer = "number" not in slot.kinds
+                phase = _advance_number("start", ch, integer)
+                return ("num", phase, integer) if phase else None
+            return None
+        options = tuple(
+            o for k in slot.kinds for o in KEYWORD_LITERALS.get(k, ()) if o.startswith(ch)
+        )
+        return ("lit", ch, options) if options else None
+
+    if kind == "str":
+        escape = sub[1]
+        if escape == 0:
+            if ch == '"':
+                return _STRING_DONE
+            if ch == "\\":
+                return ("str", 1)
+            if ch != REPLACEMENT_CHAR and ord(ch) < 0x20:
+                return None
+            return sub
+        if escape == 1:
+            if ch in '"\\/bfnrt':
+                return ("str", 0)
+            if ch == "u":
+                return ("str", 5)  # осталось 4 hex-цифры
+            return None
+        if ch not in _HEX:
+            return None
+        return ("str", 0 if escape == 2 else escape - 1)
+
+    if kind == "num":
+        phase = _advance_number(sub[1], ch, sub[2])
+        return ("num", phase, sub[2]) if phase else None
+
+    if kind == "lit":
+        prefix = sub[1] + ch
+        options = tuple(o for o in sub[2] if o.startswith(prefix))
+        return ("lit", prefix, options) if options else None
+    return None
+
+
+def _scalar_complete(sub: Any) -> bool:
+    if sub == _STRING_DONE:
+        return True
+    if sub[0] == "num":
+        return sub[1] in _NUMBER_COMPLETE
+    if sub[0] == "lit":
+        return sub[1] in sub[2]
+    return False
+
+
+def _scalar_closed(sub: Any) -> bool:
+    """Значение завершено и не может быть продолжено."""
+    if sub == _STRING_DONE:
+        return True
+    if sub[0] == "lit":
+        return sub[1] in sub[2] and not any(o != sub[1] for o in sub[2])
+    return False
+
+
+class SchemaAutomaton:
+    """Посимвольный автомат для скомпилированной схемы.
+
+    Состояние — ``(индекс сегмента, подсостояние)``; подсостояния — кортежи,
+    поэтому состояния хешируемы и используются как ключи кеша масок.
+    """
+
+    def __init__(self, segments: Sequence[Segment]) -> None:
+        self.segments = list(segments)
+        self.initial: State = self._enter(0)
+
+    def _enter(self, index: int) -> State:
+        if index >= len(self.segments):
+            return (len(self.segments), None)
+        if isinstance(self.segments[index], str):
+            return (index, 0)
+        slot = self.segments[index]
+        return (index, ("arr", "open") if slot.array else ("start",))
+
+    def is_final(self, state: State) -> bool:
+        return state[0] >= len(self.segments)
+
+    def advance(self, state: Optional[State], ch: str) -> Optional[State]:
+        """Переход по одному символу; ``None`` — символ недопустим."""
+        if state is None or self.is_final(state):
+            return None
+        index, sub = state
+        segment = self.segments[index]
+
+        if isinstance(segment, str):
+            if segment[sub] != ch:
+                return None
+            return self._enter(index + 1) if sub + 1 == len(segment) else (index, sub + 1)
+
+        if segment.array:
+            return self._advance_array(index, segment, sub, ch)
+
+        new_sub = _advance_scalar(segment, sub, ch)
+        if new_sub is not None:
+            return self._enter(index + 1) if _scalar_closed(new_sub) else (index, new_sub)
+        if _scalar_complete(sub):
+            # Число заканчивается первым символом, который его не продолжает
+            return self.advance(self._enter(index + 1), ch)
+        return None
+
+    def _advance_array(self, index: int, slot: ValueSlot, sub: Any, ch: str) -> Optional[State]:
+        phase = sub[0]
+        if phase == "arr":
+            if sub[1] == "open":
+                return (index, ("arr", "first")) if ch == "[" else None
+            if sub[1] == "first" and ch == "]":
+                return self._enter(index + 1)
+            if sub[1] == "comma":
+                return (index, ("arr", "item_start")) if ch == " " else None
+            item = _advance_scalar(slot, ("start",), ch)
+            return (index, ("item", item)) if item is not None else None
+
+        item = sub[1]
+        new_item = None if item == _STRING_DONE else _advance_scalar(slot, item, ch)
+        if new_item is not None:
+            return (index, ("item", new_item))
+        if _scalar_complete(item):
+            if ch == ",":
+                return (index, ("arr", "comma"))
+            if ch == "]":
+                return self._enter(index + 1)
+        return None
+
+    def advance_text(self, state: Optional[State], text: str) -> Optional[State]:
+        for ch in text:
+            state = self.advance(state, ch)
+            if state is None:
+                return None
+        return state
+
+
+# -------------------------------------------------------------
+# Маски токенов
+# -------------------------------------------------------------
+
+class TokenVocabulary:
+    """Строковые представления токенов, сгруппированные для быстрого построения масок.
+
+    Args:
+        token_strings (Sequence[str]): Текст каждого токена по id; пустая
+            строка — токен никогда не разрешается (служебные токены).
+        eos_ids (Sequence[int]): Токены завершения генерации; разрешаются только
+            после закрытия корневого объекта, даже если у них есть текст.
+    """
+
+    def __init__(self, token_strings: Sequence[str], eos_ids: Sequence[int]) -> None:
+        self.token_strings = list(token_strings)
+        self.eos_ids = np.array(sorted(set(eos_ids)), dtype=np.int64)
+        self.by_first_char: Dict[str, List[int]] = {}
+        string_safe: List[int] = []
+        eos = set(eos_ids)
+        for token_id, text in enumerate(self.token_strings):
+            if not text or token_id in eos:
+                continue
+            self.by_first_char.setdefault(text[0], []).append(token_id)
+            if all(c not in '"\\' and (ord(c) >= 0x20 or c == REPLACEMENT_CHAR) for c in text):
+                string_safe.append(token_id)
+        # Токены, не меняющие состояние «внутри строки»: их не нужно симулировать
+        self.string_safe = np.array(string_safe, dtype=np.int64)
+        self._string_safe_set = set(string_safe)
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer: Any, eos_ids: Sequence[int]) -> "TokenVocabulary":
+        """Строит словарь по HF-токенизатору, исключая служебные и добавленные токены."""
+        special = set(tokenizer.all_special_ids) | set(tokenizer.get_added_vocab().values())
+        token_strings = [
+            "" if token_id in special else tokenizer.decode([token_id])
+            for token_id in range(len(tokenizer))
+        ]
+        return cls(token_strings, eos_ids)
+
+    def is_string_safe(self, token_id: int) -> bool:
+        return token_id in self._string_safe_set
+
+
+class SchemaGuide:
+    """Автомат схемы и кеш масок допустимых токенов по состояниям.
+
+    Args:
+        schema (Dict[str, Any]): JSON-схема ответа.
+        vocabulary (TokenVocabulary): Словарь токенов модели.
+    """
+
+    def __init__(self, schema: Dict[str, Any], vocabulary: TokenVocabulary) -> None:
+        self.automaton = SchemaAutomaton(compile_schema(schema))
+        self.vocabulary = vocabulary
+        self._allowed_cache: Dict[State, np.ndarray] = {}
+        self._mask_cache: Dict[Tuple[Optional[State], int, str], Any] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def initial_state(self) -> State:
+        return self.automaton.initial
+
+    def advance_token(self, state: Optional[State], token_id: int) -> Optional[State]:
+        if state is None or self.automaton.is_final(state):
+            return None
+        return self.automaton.advance_text(state, self.vocabulary.token_strings[token_id])
+
+    def allowed_tokens(self, state: Optional[State]) -> np.ndarray:
+        """Отсортированные id токенов, допустимых в состоянии (с кешированием)."""
+        if state is None or self.automaton.is_final(state):
+            return self.vocabulary.eos_ids
+        cached = self._allowed_cache.get(state)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+        allowed = self._compute_allowed(state)
+        self._allowed_cache[state] = allowed
+        return allowed
+
+    def blocked_mask(self, state: Optional[State], size: int, device: Any) -> Any:
+        """Булев тензор запрещённых токенов размера ``size`` (кешируется на устройстве)."""
+        key = (state, size, str(device))
+        blocked = self._mask_cache.get(key)
+        if blocked is None:
+            import torch  # type: ignore
+
+            blocked = torch.ones(size, dtype=torch.bool, device=device)
+            blocked[torch.as_tensor(self.allowed_tokens(state), device=device)] = False
+            self._mask_cache[key] = blocked
+        return blocked
+
+    def _compute_allowed(self, state: State) -> np.ndarray:
+        automaton, vocabulary = self.automaton, self.vocabulary
+        in_plain_string = _is_plain_string(state)
+        allowed: List[int] = []
+        for first_char, token_ids in vocabulary.by_first_char.items():
+            if automaton.advance(state, first_char) is None:
+                continue
+            for token_id in token_ids:
+                if in_plain_string and vocabulary.is_string_safe(token_id):
+                    continue  # добавляются ниже одним массивом
+                if automaton.advance_text(state, vocabulary.token_strings[token_id]) is not None:
+                    allowed.append(token_id)
+        result = np.array(allowed, dtype=np.int64)
+        if in_plain_string:
+            result = np.union1d(result, vocabulary.string_safe)
+        return np.sort(result)
+
+
+def _is_plain_string(state: State) -> bool:
+    sub = state[1]
+    if isinstance(sub, tuple) and sub and sub[0] == "item":
+        sub = sub[1]
+    return sub == ("str", 0)
+
+
+class JsonSchemaLogitsProcessor:
+    """Логит-процессор ``generate``: запрещает токены, нарушающие схему.
+
+    Состояние автомата продвигается по новым токенам с прошлого вызова,
+    маска берётся из кеша ``SchemaGuide``.
+
+    Args:
+        guide (SchemaGuide): Скомпилированная схема с кешем масок.
+        prompt_length (int): Длина входа в токенах.
+    """
+
+    def __init__(self, guide: SchemaGuide, prompt_length: int) -> None:
+        self.guide = guide
+        self.state: Optional[State] = guide.initial_state
+        self._consumed = prompt_length
+
+    def __call__(self, input_ids: Any, scores: Any) -> Any:
+        for token_id in input_ids[0, self._consumed :].tolist():
+            self.state = self.guide.advance_token(self.state, token_id)
+        self._consumed = input_ids.shape[1]
+        blocked = self.guide.blocked_mask(self.state, scores.shape[-1], scores.device)
+        return scores.masked_fill(blocked, float("-inf"))
+
+
+class BatchJsonSchemaLogitsProcessor:
+    """Пакетный вариант ``JsonSchemaLogitsProcessor``: своя схема у каждой строки.
+
+    Строки, уже закрывшие объект, остаются в финальном состоянии (разрешён
+    только EOS), а pad-токены, которыми ``generate`` дополняет их, не
+    продвигают автомат.
+
+    Args:
+        guides (Sequence[SchemaGuide]): Схемы строк пакета.
+        prompt_length (int): Длина входа в токенах (с паддингом).
+    """
+
+    def __init__(self, guides: Sequence[SchemaGuide], prompt_length: int) -> None:
+        self.guides = list(guides)
+        self.states: List[Optional[State]] = [guide.initial_state for guide in self.guides]
+        self._consumed = prompt_length
+
+    def __call__(self, input_ids: Any, scores: Any) -> Any:
+        import torch  # type: ignore
+
+        new_tokens = input_ids[:, self._consumed :].tolist()
+        self._consumed = input_ids.shape[1]
+        masks = []
+        for row, (guide, tokens) in enumerate(zip(self.guides, new_tokens, strict=True)):
+            state = self.states[row]
+            for token_id in tokens:
+                if state is None or guide.automaton.is_final(state):
+                    break
+                state = guide.advance_token(state, token_id)
+            self.states[row] = state
+            masks.append(guide.blocked_mask(state, scores.shape[-1], scores.device))
+        return scores.masked_fill(torch.stack(masks), float("-inf"))
+
+
+_VOCABULARIES: Dict[int, TokenVocabulary] = {}
+_GUIDES: Dict[Tuple[int, str], SchemaGuide] = {}
+
+
+def get_schema_guide(tokenizer: Any, schema: Dict[str, Any], eos_ids: Sequence[int]) -> SchemaGuide:
+    """Возвращает ``SchemaGuide`` из кеша процесса (по токенизатору и схеме)."""
+    vocabulary = _VOCABULARIES.get(id(tokenizer))
+    if vocabulary is None:
+        vocabulary = TokenVocabulary.from_tokenizer(tokenizer, eos_ids)
+        _VOCABULARIES[id(tokenizer)] = vocabulary
+    key = (id(tokenizer), json.dumps(schema, sort_keys=True, ensure_ascii=False))
+    guide = _GUIDES.get(key)
+    if guide is None:
+        guide = SchemaGuide(schema, vocabulary)
+        _GUIDES[key] = guide
+    return guide
@@ -0,0 +1,250 @@
+"""Запуск Qwen2.5-VL на CPU: квантование линейных слоёв и настройка потоков.
+
+Режим включается в секции ``model`` конфига значением ``"device_map": "cpu"``.
+Параметры задаются подсекцией ``model.cpu``:
+
+- ``quantization`` — ``"int8"`` (динамическое квантование ``nn.Linear``,
+  по умолчанию), ``"bf16"`` (если процессор поддерживает bfloat16, иначе
+  int8) или ``"none"`` (fp32);
+- ``threads`` — число intra-op потоков; по умолчанию ядра узла делятся
+  поровну между ``workers`` процессами;
+- ``workers`` — сколько процессов с моделью запущено на узле (по умолчанию 1);
+- ``cache`` — сохранять int8-модель в ``cache_dir`` (по умолчанию true).
+
+Обёртка модели загружает веса сама, поэтому кеш экономит время квантования,
+а не чтения исходных весов: при повторном запуске в ``model.model`` слои
+``nn.Linear`` заменяются пустыми int8-слоями и в них загружается сохранённый
+``state_dict`` (``torch.load(weights_only=True)``, без распаковки pickle-кода).
+Ключ кеша включает ревизию и отпечаток исходных весов, так что обновлённые
+веса той же модели не подменяются старой квантованной копией.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+QUANTIZATION_MODES = ("int8", "bf16", "none")
+DEFAULT_QUANTIZATION = "int8"
+CACHE_SUBDIR = "cpu_backend"
+
+
+def is_cpu_backend(model_config: Dict[str, Any]) -> bool:
+    """Выбран ли CPU-режим в секции ``model``."""
+    return str(model_config.get("device_map", "")).strip().lower() == "cpu"
+
+
+def configure_threads(threads: Optional[int] = None, workers: int = 1) -> int:
+    """Настраивает число потоков torch для одного процесса.
+
+    Args:
+        threads (Optional[int]): Явное число intra-op потоков.
+        workers (int): Число процессов с моделью на узле; если ``threads``
+            не задан, ядра делятся между ними поровну.
+
+    Returns:
+        int: Установленное число intra-op потоков.
+    """
+    import torch  # type: ignore
+
+    if not threads:
+        threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    torch.set_num_threads(threads)
+    try:
+        # Межоперационный параллелизм на CPU только мешает intra-op потокам
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Можно вызвать только до первой параллельной операции
+        pass
+    return threads
+
+
+def bf16_supported() -> bool:
+    """Поддерживает ли процессор быстрые bfloat16-ядра (AVX512-BF16/AMX)."""
+    import torch  # type: ignore
+
+    check = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    try:
+        return bool(check()) if check is not None else False
+    except RuntimeError:
+        return False
+
+
+def resolve_quantization(mode: str) -> str:
+    """Проверяет режим квантования и заменяет bf16 на int8 без поддержки процессора.
+
+    Raises:
+        ValueError: Неизвестный режим.
+    """
+    mode = (mode or "none").lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Неизвестный режим квантования {mode!r}, ожидается один из {QUANTIZATION_MODES}"
+        )
+    if mode == "bf16" and not bf16_supported():
+        print("⚠️  cpu_backend: процессор не поддерживает bf16, используется int8")
+        return "int8"
+    return mode
+
+
+def quantize_model(module: Any, mode: str) -> Any:
+    """Квантует ``torch.nn.Module`` для инференса на CPU.
+
+    Args:
+        module (Any): Модель в fp32/fp16/bf16.
+        mode (str): ``"int8"``, ``"bf16"`` или ``"none"`` (уже проверенный
+            ``resolve_quantization``).
+
+    Returns:
+        Any: Квантованная модель в режиме ``eval``.
+    """
+    import torch  # type: ignore
+
+    module = module.to("cpu").eval()
+    if mode == "bf16":
+        return module.to(torch.bfloat16)
+    # Динамическое квантование работает только с fp32-весами
+    module = module.to(torch.float32)
+    if mode == "int8":
+        return torch.ao.quantization.quantize_dynamic(
+            module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return module
+
+
+def weights_fingerprint(module: Any, revision: Optional[str] = None) -> str:
+    """Короткий отпечаток исходных весов для ключа кеша.
+
+    Хешируются ревизия (коммит HF-репозитория, если известен), имена,
+    формы и типы параметров и по несколько значений с начала и конца
+    каждого тензора — без полного прохода по весам, но с заменой любого
+    дообученного слоя отпечаток меняется.
+
+    Args:
+        module (Any): Исходная (не квантованная) модель.
+        revision (Optional[str]): Ревизия весов.
+
+    Returns:
+        str: 12 hex-символов SHA-256.
+    """
+    import torch  # type: ignore
+
+    digest = hashlib.sha256(str(revision or "").encode())
+    for name, tensor in module.state_dict().items():
+        digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        flat = tensor.detach().reshape(-1)
+        sample = torch.cat([flat[:8], flat[-8:]]).to("cpu", torch.float32)
+        digest.update(sample.numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+def quantized_cache_path(model_config: Dict[str, Any], mode: str, fingerprint: str) -> Path:
+    """Путь к сохранённому ``state_dict`` квантованной модели в ``cache_dir``.
+
+    В имя входят отпечаток исходных весов (``weights_fingerprint``) и версия
+    torch: формат упакованных int8-весов от неё зависит.
+    """
+    import torch  # type: ignore
+
+    model_name = str(model_config["model_name"]).replace("/", "_").replace(" ", "_")
+    cache_dir = Path(model_config.get("cache_dir", "./model_cache"))
+    file_name = f"{model_name}-{fingerprint}-{mode}-torch{torch.__version__}.pt"
+    return cache_dir / CACHE_SUBDIR / file_name
+
+
+def int8_skeleton(module: Any) -> Any:
+    """Структура int8-модели без квантования весов.
+
+    ``nn.Linear`` (точного типа, как в ``quantize_dynamic``) заменяются
+    динамическими int8-слоями с пустыми весами; остальные параметры
+    приводятся к fp32. Веса затем загружаются из кеша ``load_state_dict``.
+    """
+    import torch  # type: ignore
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear  # type: ignore
+
+    module = module.to("cpu").eval().to(torch.float32)
+    for parent in list(module.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child) is torch.nn.Linear:
+                layer = DynamicLinear(
+                    child.in_features,
+                    child.out_features,
+                    bias_=child.bias is not None,
+                    dtype=torch.qint8,
+                )
+                setattr(parent, name, layer)
+    return module
+
+
+def _load_cached(path: Path) -> Optional[Dict[str, Any]]:
+    """``state_dict`` из кеша или ``None``, если файл повреждён или несовместим."""
+    import torch  # type: ignore
+
+    try:
+        # Только тензоры и dtype: weights_only не исполняет произвольный pickle-код
+        return torch.load(path, map_location="cpu", weights_only=True)
+    except (OSError, RuntimeError, pickle.UnpicklingError) as e:
+        print(f"⚠️  cpu_backend: кеш {path} не читается ({e}), квантую заново")
+        return None
+
+
+def _save_cached(module: Any, path: Path) -> None:
+    import torch  # type: ignore
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    torch.save(module.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def enable_cpu_backend(model: Any, model_config: Dict[str, Any]) -> Any:
+    """Готовит загруженную обёртку модели к инференсу на CPU.
+
+    Ничего не делает, если в ``model_config`` не выбран ``"device_map": "cpu"``.
+
+    Args:
+        model (Any): Обёртка модели с HF-моделью в атрибуте ``model``.
+        model_config (Dict[str, Any]): Секция ``model`` конфига.
+
+    Returns:
+        Any: Та же обёртка с квантованной ``model.model``.
+    """
+    if not is_cpu_backend(model_config):
+        return model
+
+    cpu_config = model_config.get("cpu") or {}
+    threads = configure_threads(cpu_config.get("threads"), int(cpu_config.get("workers", 1)))
+    mode = resolve_quantization(cpu_config.get("quantization", DEFAULT_QUANTIZATION))
+    print(f"🖥️  CPU-режим: потоков {threads}, квантование {mode}")
+
+    hf_model = getattr(model, "model", None)
+    if hf_model is None:
+        return model
+    if mode != "int8":
+        # Приведение типа дешевле чтения с диска — кешировать нечего
+        model.model = quantize_model(hf_model, mode)
+        return model
+
+    use_cache = bool(cpu_config.get("cache", True))
+    start = time.perf_counter()
+    cache_path, state_dict = None, None
+    if use_cache:
+        hf_config = getattr(hf_model, "config", None)
+        revision = model_config.get("revision") or getattr(hf_config, "_commit_hash", None)
+        fingerprint = weights_fingerprint(hf_model, revision)
+        cache_path = quantized_cache_path(model_config, mode, fingerprint)
+        if cache_path.exists():
+            state_dict = _load_cached(cache_path)
+    if state_dict is not None:
+        model.model = int8_skeleton(hf_model)
+        model.model.load_state_dict(state_dict)
+        print(f"📦 Квантованные веса загружены из {cache_path}")
+    else:
+        model.model = quantize_model(hf_model, mode)
+        if cache_path is not None:
+            _save_cached(model.model, cache_path)
+            print(f"💾 Квантованные веса сохранены в {cache_path}")
+    print(f"⏱️  Подготовка CPU-модели: {time.perf_counter() - start:.1f} с")
+    return model
@@ -0,0 +1,211 @@
+"""Инвентаризация датасета: сколько файлов, документов и байт в каждом классе и сабсете.
+
+Обход идёт параллельно: каждая директория читается одним ``os.scandir``
+в пуле потоков, а найденные поддиректории сразу отправляются в тот же
+пул, поэтому на сетевом хранилище одновременно ждут ответа несколько
+директорий. Пути разбираются на класс, сабсет, документ и страницу так
+же, как при упаковке (``pack_dataset.parse_member``).
+
+Размеры изображений читаются только из заголовков: ``PIL.Image.open``
+разбирает заголовок файла и не декодирует пиксели, пока их не запросят::
+
+    python dataset_inventory.py ./dataset --tree 5 --output inventory.csv
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Tuple
+
+import click
+import pandas as pd
+
+from limited_tree import list_dir
+from pack_dataset import parse_member
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+DEFAULT_WORKERS = 16
+
+
+def _scan_dir(root: Path, relative: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """Файлы (имя относительно ``root`` и размер) и поддиректории одной директории."""
+    files, directories = [], []
+    with os.scandir(root / relative if relative else root) as entries:
+        for entry in entries:
+            name = f"{relative}/{entry.name}" if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(name)
+            elif entry.is_file():
+                files.append((name, entry.stat().st_size))
+    return files, directories
+
+
+def walk_files(root: Path, workers: int = DEFAULT_WORKERS) -> List[Tuple[str, int]]:
+    """Все файлы дерева с размерами; директории читаются параллельно.
+
+    Args:
+        root (Path): Корень обхода.
+        workers (int): Число потоков.
+
+    Returns:
+        List[Tuple[str, int]]: Имена файлов относительно ``root`` (через ``/``)
+        и размеры в байтах, в порядке обхода.
+    """
+    found: List[Tuple[str, int]] = []
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        pending = {pool.submit(_scan_dir, root, "")}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories = future.result()
+                found.extend(files)
+                pending |= {pool.submit(_scan_dir, root, name) for name in directories}
+    return found
+
+
+def image_size(path: Path) -> Tuple[Optional[int], Optional[int]]:
+    """Ширина и высота изображения по заголовку файла (пиксели не декодируются)."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def inventory_files(
+    root: Path, workers: int = DEFAULT_WORKERS, read_sizes: bool = True
+) -> pd.DataFrame:
+    """Таблица файлов датасета: разбор пути, размер и размеры изображения.
+
+    Args:
+        root (Path): Корень датасета.
+        workers (int): Число потоков обхода и чтения заголовков.
+        read_sizes (bool): Читать ли ширину и высоту изображений.
+
+    Returns:
+        pd.DataFrame: Колонки ``name``, ``area`` (``images``, ``jsons`` или
+        ``other``), ``class_name``, ``subset``, ``document``, ``page``,
+        ``bytes``, ``is_image``, ``width``, ``height``.
+    """
+    files = walk_files(root, workers)
+    rows = []
+    for name, size in files:
+        parts = PurePosixPath(name).parts
+        area = next((marker for marker in ("images", "jsons") if marker in parts), "other")
+        rows.append(
+            {
+                "name": name,
+                "area": area,
+                **parse_member(name),
+                "bytes": size,
+                "is_image": PurePosixPath(name).suffix.lower() in IMAGE_SUFFIXES,
+            }
+        )
+    columns = ["name", "area", "class_name", "subset", "document", "page", "bytes", "is_image"]
+    df = pd.DataFrame(rows, columns=columns)
+    df["width"] = pd.Series(dtype="Int64")
+    df["height"] = pd.Series(dtype="Int64")
+    if read_sizes and df["is_image"].any():
+        images = df.index[df["is_image"]]
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            sizes = list(pool.map(image_size, (root / name for name in df.loc[images, "name"])))
+        df.loc[images, "width"] = [width for width, _ in sizes]
+        df.loc[images, "height"] = [height for _, height in sizes]
+    return df
+
+
+def summarize_inventory(files: pd.DataFrame) -> pd.DataFrame:
+    """Сводка по классу, области и сабсету.
+
+    Returns:
+        pd.DataFrame: ``files``, ``images``, ``documents``, страниц на документ
+        (``pages_min``/``pages_median``/``pages_max``; документ-директория с
+        несколькими страницами или отдельный файл), ``mb``, а также
+        минимальные, медианные и максимальные ``width`` и ``height``.
+    """
+    keys = ["class_name", "area", "subset"]
+    if files.empty:
+        return pd.DataFrame(columns=keys)
+    groups = files.groupby(keys, sort=True, dropna=False)
+    summary = groups.agg(
+        files=("name", "size"),
+        images=("is_image", "sum"),
+        documents=("document", "nunique"),
+        mb=("bytes", lambda sizes: round(sizes.sum() / 2**20, 2)),
+    )
+    pages = files.groupby(keys + ["document"], sort=False).size().groupby(level=keys)
+    summary["pages_min"] = pages.min()
+    summary["pages_median"] = pages.median()
+    summary["pages_max"] = pages.max()
+    for column in ("width", "height"):
+        values = files[column].astype("float64").groupby([files[k] for k in keys])
+        summary[f"{column}_min"] = values.min()
+        summary[f"{column}_median"] = values.median()
+        summary[f"{column}_max"] = values.max()
+    return summary.reset_index()
+
+
+@click.command()
+@click.argument("root", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--workers", type=int, default=DEFAULT_WORKERS, show_default=True)
+@click.option(
+    "--sizes/--no-sizes",
+    default=True,
+    show_default=True,
+    help="Читать ширину и высоту изображений из заголовков.",
+)
+@click.option(
+    "--tree",
+    "tree_limit",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Напечатать дерево, показывая столько элементов в каждой директории (0 — не печатать).",
+)
+@click.option(
+    "--output", type=click.Path(dir_okay=False, path_type=Path), default=None, help="CSV сводки."
+)
+@click.option(
+    "--files-output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="CSV по каждому файлу.",
+)
+def main(
+    root: Path,
+    workers: int,
+    sizes: bool,
+    tree_limit: int,
+    output: Optional[Path],
+    files_output: Optional[Path],
+) -> None:
+    """Считает файлы, документы, объём и размеры изображений датасета ROOT."""
+    if tree_limit > 0:
+        print(root)
+        list_dir(str(root), limit=tree_limit)
+        print()
+
+    files = inventory_files(root, workers, sizes)
+    summary = summarize_inventory(files)
+    if summary.empty:
+        print("Файлы не найдены.")
+        return
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(summary.to_string(index=False))
+    print(
+        f"\n📊 Всего: файлов {len(files)}, изображений {int(files['is_image'].sum())}, "
+        f"классов {files.loc[files['class_name'] != '', 'class_name'].nunique()}, "
+        f"объём {files['bytes'].sum() / 2**20:.1f} МБ"
+    )
+    if output:
+        summary.to_csv(output, index=False)
+        print(f"✅ Сводка сохранена в {output}")
+    if files_output:
+        files.to_csv(files_output, index=False)
+        print(f"✅ Таблица файлов сохранена в {files_output}")
+
+
+if __name__ == "__main__":
+    main()
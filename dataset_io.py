@@ -0,0 +1,358 @@
+"""Бэкенды доступа к датасету.
+
+Скрипты оценки обходят датасет через небольшой набор операций ``pathlib.Path``:
+``/``, ``exists``, ``iterdir``, ``is_file``, ``glob``, ``open``, ``relative_to``.
+Модуль позволяет подставить вместо директории zip-архив (например,
+``dataset_for_training.zip``) без распаковки на диск: индекс строится один раз
+по central directory архива, а дальнейшие обращения идут по нему.
+"""
+
+import atexit
+import fnmatch
+import io
+import mmap
+import os
+import struct
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Union
+
+if TYPE_CHECKING:
+    from augment import AugmentedPath
+
+# Сигнатура и размер фиксированной части local file header (APPNOTE 4.3.7)
+_LOCAL_HEADER_STRUCT = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# Ключ ``PIL.Image.info`` с идентичностью исходного файла (см. ``load_image_for_model``)
+SOURCE_KEY_INFO = "dataset_source_key"
+
+
+class ArchiveIndex:
+    """Индекс «файловой системы» архива: директории и их потомки.
+
+    Строится один раз по списку имён членов архива, поэтому ``iterdir`` и
+    ``exists`` не требуют повторного сканирования central directory.
+    """
+
+    def __init__(self, member_names: List[str]) -> None:
+        self.files: Dict[str, int] = {}
+        self.dirs: Dict[str, Dict[str, None]] = {"": {}}
+
+        for position, raw_name in enumerate(member_names):
+            name = raw_name.strip("/")
+            if not name:
+                continue
+            if raw_name.endswith("/"):
+                self._add_dir(name)
+                continue
+            self.files[name] = position
+            parent, _, _ = name.rpartition("/")
+            self._add_dir(parent)
+            self.dirs[parent][name] = None
+
+    def _add_dir(self, name: str) -> None:
+        """Регистрирует директорию и всех её предков."""
+        missing: List[str] = []
+        while name not in self.dirs:
+            missing.append(name)
+            name = name.rpartition("/")[0]
+        # Добавляем от ближайшего известного предка вниз
+        for directory in reversed(missing):
+            self.dirs[directory] = {}
+            self.dirs[directory.rpartition("/")[0]][directory] = None
+
+    def children(self, name: str) -> List[str]:
+        """Возвращает полные имена прямых потомков директории в порядке архива."""
+        return list(self.dirs.get(name, {}))
+
+
+class ZipDataset:
+    """Датасет, читаемый напрямую из zip-архива.
+
+    Args:
+        archive_path (Path): Путь к zip-архиву.
+        use_mmap (bool): Отображать архив в память. Несжатые (``ZIP_STORED``)
+            члены тогда отдаются как ``memoryview`` без копирования.
+    """
+
+    def __init__(self, archive_path: Path, use_mmap: bool = True) -> None:
+        self.archive_path = Path(archive_path)
+        self._zip = zipfile.ZipFile(self.archive_path)
+        self._infos = self._zip.infolist()
+        self.index = ArchiveIndex([info.filename for info in self._infos])
+
+        self._file: Optional[IO[bytes]] = None
+        self._mmap: Optional[mmap.mmap] = None
+        if use_mmap:
+            self._file = self.archive_path.open("rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def root(self) -> "ArchivePath":
+        """Корень архива как путь."""
+        return ArchivePath(self, "")
+
+    @property
+    def display_name(self) -> str:
+        """Имя, под которым архив фигурирует в путях и логах."""
+        return str(self.archive_path)
+
+    def read_bytes(self, name: str) -> Union[bytes, memoryview]:
+        """Читает содержимое члена архива.
+
+        Args:
+            name (str): Имя члена относительно корня архива.
+
+        Returns:
+            Union[bytes, memoryview]: ``memoryview`` поверх mmap для несжатых
+            членов (если mmap включён), иначе распакованные байты.
+        """
+        info = self._infos[self.index.files[name]]
+        if self._mmap is not None and info.compress_type == zipfile.ZIP_STORED:
+            start = self._data_offset(info)
+            return memoryview(self._mmap)[start : start + info.file_size]
+        return self._zip.read(info)
+
+    def member_signature(self, name: str) -> str:
+        """Идентичность члена без чтения данных: архив, имя, размер и CRC из central directory."""
+        info = self._infos[self.index.files[name]]
+        return f"{self.archive_path.resolve()}:{name}:{info.file_size}:{info.CRC:08x}"
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        """Смещение данных члена: длины имени и extra в local header могут
+        отличаться от central directory, поэтому читаем их из самого заголовка."""
+        mapping = self._mmap
+        assert mapping is not None, "смещение читается только из отображённого архива"
+        header = _LOCAL_HEADER_STRUCT.unpack_from(mapping, info.header_offset)
+        if header[0] != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"Некорректный local header у {info.filename}")
+        name_length, extra_length = header[9], header[10]
+        return info.header_offset + _LOCAL_HEADER_STRUCT.size + name_length + extra_length
+
+    def close(self) -> None:
+        """Закрывает архив и снимает отображение в память."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._zip.close()
+
+
+class ArchivePath:
+    """Путь внутри архивного датасета с подмножеством API ``pathlib.Path``.
+
+    Args:
+        backend (Any): Хранилище с атрибутом ``index`` (``ArchiveIndex``) и
+            методами ``read_bytes(name)`` и ``member_signature(name)``.
+        member (str): Имя внутри архива в posix-формате (``""`` — корень).
+    """
+
+    def __init__(self, backend: Any, member: str) -> None:
+        self._backend = backend
+        self._member = member.strip("/")
+
+    # --- Навигация ---
+    def __truediv__(self, other: Union[str, "PurePosixPath"]) -> "ArchivePath":
+        joined = PurePosixPath(self._member, str(other)).as_posix()
+        return ArchivePath(self._backend, "" if joined == "." else joined)
+
+    @property
+    def member(self) -> str:
+        return self._member
+
+    @property
+    def name(self) -> str:
+        if not self._member:
+            return Path(self._backend.display_name).name
+        return PurePosixPath(self._member).name
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.name).suffix
+
+    @property
+    def parent(self) -> "ArchivePath":
+        parent, _, _ = self._member.rpartition("/")
+        return ArchivePath(self._backend, parent)
+
+    @property
+    def parts(self) -> tuple:
+        return (self._backend.display_name,) + PurePosixPath(self._member).parts
+
+    def relative_to(self, other: "ArchivePath") -> PurePosixPath:
+        if not isinstance(other, ArchivePath) or other._backend is not self._backend:
+            raise ValueError(f"{self} не лежит внутри {other}")
+        return PurePosixPath(self._member).relative_to(other._member or ".")
+
+    # --- Проверки ---
+    def exists(self) -> bool:
+        return self.is_file() or self.is_dir()
+
+    def is_file(self) -> bool:
+        return self._member in self._backend.index.files
+
+    def is_dir(self) -> bool:
+        return self._member in self._backend.index.dirs
+
+    # --- Обход ---
+    def iterdir(self) -> Iterator["ArchivePath"]:
+        if not self.is_dir():
+            raise NotADirectoryError(str(self))
+        for child in self._backend.index.children(self._member):
+            yield ArchivePath(self._backend, child)
+
+    def glob(self, pattern: str) -> Iterator["ArchivePath"]:
+        """Сопоставляет шаблон с прямыми потомками (без ``**``)."""
+        for child in self.iterdir():
+            if fnmatch.fnmatchcase(child.name, pattern):
+                yield child
+
+    # --- Чтение ---
+    def read_bytes(self) -> Union[bytes, memoryview]:
+        if not self.is_file():
+            raise FileNotFoundError(str(self))
+        return self._backend.read_bytes(self._member)
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        return bytes(self.read_bytes()).decode(encoding)
+
+    def source_key(self) -> str:
+        """Идентичность содержимого (для кешей) без чтения и декодирования данных."""
+        return self._backend.member_signature(self._member)
+
+    def open(self, mode: str = "r", encoding: Optional[str] = None) -> IO[Any]:
+        if mode not in ("r", "rb"):
+            raise ValueError("Архивный датасет доступен только для чтения")
+        stream = io.BytesIO(self.read_bytes())
+        if mode == "rb":
+            return stream
+        return io.TextIOWrapper(stream, encoding=encoding or "utf-8")
+
+    # --- Сравнение и представление ---
+    def __str__(self) -> str:
+        if not self._member:
+            return self._backend.display_name
+        return f"{self._backend.display_name}/{self._member}"
+
+    def __repr__(self) -> str:
+        return f"ArchivePath({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, ArchivePath)
+            and other._backend is self._backend
+            and other._member == self._member
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self._backend), self._member))
+
+    def __lt__(self, other: "ArchivePath") -> bool:
+        return self._member < other._member
+
+
+# Производный сабсет (``augment.AugmentedPath``) обходится теми же операциями
+DatasetPath = Union[Path, ArchivePath, "AugmentedPath"]
+
+# Открытые zip-архивы и упакованные датасеты (``pack_dataset.PackedDataset``)
+_OPEN_ARCHIVES: Dict[Path, Any] = {}
+
+
+def open_dataset(dataset_path: Union[str, Path], use_mmap: bool = True) -> DatasetPath:
+    """Открывает датасет по пути из конфига.
+
+    Поддерживаются обычная директория, zip-архив и упакованный датасет
+    (``pack_dataset.py``), в том числе путь внутрь них:
+    ``dataset_for_training.zip/dataset/passport``, ``dataset.vlmpack/passport``.
+
+    Args:
+        dataset_path (Union[str, Path]): Путь к датасету.
+        use_mmap (bool): Отображать архив в память (см. ``ZipDataset``).
+
+    Returns:
+        DatasetPath: ``Path`` для директории или ``ArchivePath`` для архива
+        и упакованного датасета.
+    """
+    from pack_dataset import PackedDataset, is_packed_dataset
+
+    path = Path(dataset_path)
+
+    # Упакованный датасет — тоже директория, поэтому ищем его раньше обычной
+    for candidate in [path, *path.parents]:
+        if candidate.is_dir() and is_packed_dataset(candidate):
+            packed = candidate.resolve()
+            if packed not in _OPEN_ARCHIVES:
+                _OPEN_ARCHIVES[packed] = PackedDataset(candidate)
+            inner = path.relative_to(candidate).as_posix()
+            return _OPEN_ARCHIVES[packed].root / inner
+
+    if path.is_dir():
+        return path
+
+    # Ищем архив среди самого пути и его родителей: всё, что ниже, — путь внутри
+    for candidate in [path, *path.parents]:
+        if candidate.is_file() and zipfile.is_zipfile(candidate):
+            archive = candidate.resolve()
+            if archive not in _OPEN_ARCHIVES:
+                _OPEN_ARCHIVES[archive] = ZipDataset(candidate, use_mmap=use_mmap)
+            inner = path.relative_to(candidate).as_posix()
+            return _OPEN_ARCHIVES[archive].root / inner
+
+    # Несуществующий путь отдаём как есть — вызывающий код сам сообщит об ошибке
+    return path
+
+
+def close_datasets() -> None:
+    """Закрывает архивы и упакованные датасеты, открытые ``open_dataset``.
+
+    Вызывается и при выходе из процесса. Пути, полученные до вызова, после
+    него читать нельзя; следующий ``open_dataset`` откроет архив заново.
+    """
+    while _OPEN_ARCHIVES:
+        _, dataset = _OPEN_ARCHIVES.popitem()
+        try:
+            dataset.close()
+        except BufferError:
+            # На отображение ещё ссылается memoryview: его освободит сборщик мусора
+            pass
+
+
+atexit.register(close_datasets)
+
+
+def path_source_key(path: Union[str, Path]) -> str:
+    """Идентичность файла на диске: абсолютный путь, размер и время изменения."""
+    stat = os.stat(path)
+    return f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_image_for_model(image_path: DatasetPath) -> Any:
+    """Готовит изображение к передаче в ``predict_on_image(s)``.
+
+    Для файлов на диске возвращает строковый путь (как и раньше), для
+    членов архива и производных сабсетов (``augment.AugmentedPath``) —
+    ``PIL.Image``, не создавая временных файлов. В ``image.info[SOURCE_KEY_INFO]``
+    записывается ``source_key()`` пути: по нему ``pixel_cache`` находит
+    изображение, не хешируя пиксели. Член архива в RGB не декодируется,
+    пока к его пикселям не обратятся.
+    """
+    if isinstance(image_path, Path):
+        return str(image_path)
+    load_image = getattr(image_path, "load_image", None)
+    if load_image is not None:
+        image = load_image()
+    else:
+        from PIL import Image  # type: ignore
+
+        image = Image.open(io.BytesIO(image_path.read_bytes()))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    image.info[SOURCE_KEY_INFO] = image_path.source_key()
+    return image
@@ -0,0 +1,700 @@
+"""Параллельная докачиваемая загрузка по HTTP Range с проверкой и распаковкой на лету.
+
+``gdown`` скачивает файл одним последовательным потоком: оборванная
+загрузка начинается заново, а распаковка архива — отдельный полный проход
+после неё. Здесь:
+
+* файл делится на чанки, которые качаются параллельно Range-запросами в
+  заранее выделенный ``<output>.part``;
+* прогресс каждого чанка (сколько байт уже записано) сохраняется в
+  ``<output>.part.state.json``, поэтому повторный запуск продолжает и
+  недокачанные чанки с того места, где они оборвались;
+* поток-потребитель читает уже докачанный непрерывный префикс файла,
+  считает по нему SHA-256 и распаковывает члены zip-архива по их local
+  file header, не дожидаясь конца загрузки (CRC каждого члена проверяется);
+* итоговый хеш сверяется с манифестом в формате ``sha256sum``.
+
+Если сервер не поддерживает Range или не сообщает размер, файл качается
+одним потоком, а хеширование и распаковка идут после загрузки. Архивы,
+которые нельзя разобрать потоком (шифрование, stored-члены с data
+descriptor), распаковываются ``zipfile`` после загрузки.
+
+Для проверки без сети есть локальный сервер с поддержкой Range и
+имитацией обрывов соединения::
+
+    python downloaders/chunked_download.py serve ./files --port 8000 --drop-rate 0.2
+    python downloaders/chunked_download.py fetch http://127.0.0.1:8000/dataset.zip \\
+        --output dataset.zip --checksums SHA256SUMS --unpack-to ./dataset
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import random
+import struct
+import threading
+import time
+import urllib.request
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import click
+from tqdm import tqdm
+
+DEFAULT_CHUNK_MB = 16
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT_S = 60.0
+READ_BLOCK = 1 << 20
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.state.json"
+# Состояние сохраняется не чаще, чем раз в столько секунд (и по завершении каждого чанка)
+STATE_SAVE_INTERVAL_S = 1.0
+
+# Local file header zip (APPNOTE 4.3.7) без сигнатуры
+_LOCAL_HEADER = struct.Struct("<HHHHHIIIHH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+_ZIP64_EXTRA_ID = 0x0001
+
+
+class DownloadError(RuntimeError):
+    """Загрузка не удалась или файл не прошёл проверку."""
+
+
+class UnsupportedStreamError(RuntimeError):
+    """Архив нельзя распаковать потоком — распаковка будет после загрузки."""
+
+
+def gdrive_url(file_id: str) -> str:
+    """Прямая ссылка на файл Google Drive (без страницы подтверждения, с поддержкой Range)."""
+    return f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t"
+
+
+def load_manifest(path: Path) -> Dict[str, str]:
+    """Читает манифест формата ``sha256sum``: ``<hex>  <имя>`` (или ``<hex> *<имя>``)."""
+    manifest = {}
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        digest, _, name = line.strip().partition(" ")
+        if digest and name:
+            manifest[PurePosixPath(name.strip().lstrip("*")).name] = digest.lower()
+    return manifest
+
+
+def sha256_file(path: Path) -> str:
+    """SHA-256 файла на диске."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class RemoteFile:
+    """Что сервер сообщил о файле."""
+
+    size: Optional[int]
+    accepts_ranges: bool
+    validator: str
+
+
+def _open(
+    url: str, start: Optional[int] = None, end: Optional[int] = None, timeout: float = 60.0
+) -> Any:
+    headers = {"User-Agent": "vlm-hyperbench-downloader"}
+    if start is not None:
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+
+
+def probe(url: str, timeout: float = DEFAULT_TIMEOUT_S) -> RemoteFile:
+    """Узнаёт размер файла и поддержку Range одним запросом первого байта.
+
+    Raises:
+        DownloadError: Сервер недоступен, ответил ошибкой HTTP или вернул HTML.
+    """
+    try:
+        response = _open(url, 0, 0, timeout)
+    except (OSError, http.client.HTTPException) as err:
+        # HTTPError и URLError — подклассы OSError; наружу выходит только DownloadError,
+        # чтобы вызывающий код (download_dataset.py) мог перейти на gdown
+        raise DownloadError(f"Не удалось запросить {url}: {err}") from err
+    with response:
+        if response.headers.get("Content-Type", "").startswith("text/html"):
+            raise DownloadError(
+                "Сервер вернул HTML-страницу вместо файла (нет доступа или нужна авторизация)"
+            )
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or ""
+        if response.status == 206:
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            size = int(total) if total.isdigit() else None
+            return RemoteFile(size, size is not None, validator)
+        length = response.headers.get("Content-Length", "")
+        return RemoteFile(int(length) if length.isdigit() else None, False, validator)
+
+
+class ChunkState:
+    """Прогресс загрузки по чанкам, сохраняемый рядом с ``.part``.
+
+    ``done[i]`` — сколько байт от начала чанка ``i`` уже записано; внутри
+    чанка байты пишутся по порядку, поэтому докачка чанка продолжается с
+    ``start + done[i]``.
+    """
+
+    def __init__(self, path: Path, meta: Dict[str, Any], done: Optional[List[int]] = None) -> None:
+        self.path = path
+        self.meta = meta
+        n_chunks = -(-meta["size"] // meta["chunk_size"]) if meta["size"] else 0
+        self.done = done if done is not None and len(done) == n_chunks else [0] * n_chunks
+        self.error: Optional[BaseException] = None
+        # Вызывается с числом новых байт (полоса прогресса)
+        self.on_progress: Callable[[int], None] = lambda n_bytes: None
+        self._cond = threading.Condition()
+        self._frontier_chunk = 0
+        self._saved_at = 0.0
+
+    @classmethod
+    def load_or_create(cls, path: Path, meta: Dict[str, Any]) -> "ChunkState":
+        """Продолжает сохранённое состояние, если файл на сервере и разбиение не изменились."""
+        if path.exists():
+            try:
+                saved = json.loads(path.read_text(encoding="utf-8"))
+                if saved.get("meta") == meta:
+                    return cls(path, meta, saved.get("done"))
+            except (OSError, ValueError):
+                pass
+        return cls(path, meta)
+
+    def chunk_range(self, index: int) -> Tuple[int, int]:
+        """Границы чанка ``[start, end)``."""
+        start = index * self.meta["chunk_size"]
+        return start, min(start + self.meta["chunk_size"], self.meta["size"])
+
+    def chunk_complete(self, index: int) -> bool:
+        start, end = self.chunk_range(index)
+        return start + self.done[index] >= end
+
+    @property
+    def downloaded(self) -> int:
+        return sum(self.done)
+
+    def frontier(self) -> int:
+        """Конец непрерывно докачанного префикса файла."""
+        while self._frontier_chunk < len(self.done) and self.chunk_complete(self._frontier_chunk):
+            self._frontier_chunk += 1
+        if self._frontier_chunk == len(self.done):
+            return self.meta["size"]
+        return self.chunk_range(self._frontier_chunk)[0] + self.done[self._frontier_chunk]
+
+    def advance(self, index: int, n_bytes: int) -> None:
+        """Отмечает записанные байты чанка (данные уже должны быть в файле)."""
+        with self._cond:
+            self.done[index] += n_bytes
+            self._cond.notify_all()
+            overdue = time.monotonic() - self._saved_at > STATE_SAVE_INTERVAL_S
+            if overdue or self.chunk_complete(index):
+                self._save()
+        self.on_progress(n_bytes)
+
+    def fail(self, error: BaseException) -> None:
+        """Будит ожидающих потребителей: загрузка прервана."""
+        with self._cond:
+            self.error = error
+            self._cond.notify_all()
+
+    def wait_for(self, offset: int) -> None:
+        """Ждёт, пока непрерывный префикс файла дойдёт до ``offset``."""
+        with self._cond:
+            while self.frontier() < offset:
+                if self.error is not None:
+                    raise DownloadError(f"Загрузка прервана: {self.error}")
+                self._cond.wait(timeout=1.0)
+
+    def save(self) -> None:
+        with self._cond:
+            self._save()
+
+    def _save(self) -> None:
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps({"meta": self.meta, "done": self.done}), encoding="utf-8")
+        os.replace(temporary, self.path)
+        self._saved_at = time.monotonic()
+
+
+class ArrivingStream:
+    """Последовательное чтение файла, который ещё докачивается.
+
+    ``read`` ждёт, пока нужные байты появятся в непрерывном префиксе, и
+    попутно считает SHA-256 по каждому байту ровно один раз (``unread``
+    возвращает позицию назад, не портя хеш).
+    """
+
+    def __init__(self, path: Path, size: int, wait_for: Callable[[int], None]) -> None:
+        self.size = size
+        self.position = 0
+        self.digest = hashlib.sha256()
+        self._hashed = 0
+        self._wait_for = wait_for
+        self._file: BinaryIO = open(path, "rb")
+
+    def read(self, n: int) -> bytes:
+        end = min(self.position + n, self.size)
+        if end <= self.position:
+            return b""
+        self._wait_for(end)
+        self._file.seek(self.position)
+        data = self._file.read(end - self.position)
+        if end > self._hashed:
+            self.digest.update(data[self._hashed - self.position :])
+            self._hashed = end
+        self.position = end
+        return data
+
+    def unread(self, n: int) -> None:
+        self.position -= n
+
+    def drain(self) -> None:
+        """Дочитывает файл до конца (для хеша)."""
+        self.position = max(self.position, self._hashed)
+        while self.read(READ_BLOCK):
+            pass
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _safe_target(destination: Path, name: str) -> Optional[Path]:
+    """Путь распаковки члена архива; абсолютные пути и ``..`` отбрасываются."""
+    parts = PurePosixPath(name.replace("\\", "/")).parts
+    if not parts or parts[0] == "/" or ".." in parts:
+        return None
+    return destination.joinpath(*parts)
+
+
+def _zip64_sizes(extra: bytes, size: int, compressed: int) -> Tuple[int, int]:
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, position)
+        if header_id == _ZIP64_EXTRA_ID:
+            values = list(struct.unpack_from(f"<{length // 8}Q", extra, position + 4))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed == 0xFFFFFFFF and values:
+                compressed = values.pop(0)
+            break
+        position += 4 + length
+    return size, compressed
+
+
+def stream_unzip(stream: ArrivingStream, destination: Path) -> List[str]:
+    """Распаковывает zip по local file header, по мере поступления байт.
+
+    Returns:
+        List[str]: Имена распакованных членов.
+
+    Raises:
+        UnsupportedStreamError: Член нельзя распаковать потоком.
+        DownloadError: CRC распакованного члена не совпал.
+    """
+    extracted = []
+    while stream.read(4) == _LOCAL_SIGNATURE:
+        header = _LOCAL_HEADER.unpack(stream.read(_LOCAL_HEADER.size))
+        _, flags, method, _, _, crc, compressed, size, name_length, extra_length = header
+        name = stream.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = stream.read(extra_length)
+        is_zip64 = 0xFFFFFFFF in (size, compressed)
+        if is_zip64:
+            size, compressed = _zip64_sizes(extra, size, compressed)
+        has_descriptor = bool(flags & 0x08)
+        if flags & 0x01:
+            raise UnsupportedStreamError(f"{name}: зашифрованный член архива")
+        if method not in (0, 8) or (method == 0 and has_descriptor):
+            raise UnsupportedStreamError(f"{name}: метод {method} нельзя распаковать потоком")
+
+        target = _safe_target(destination, name)
+        is_dir = name.endswith("/")
+        if target is not None and is_dir:
+            target.mkdir(parents=True, exist_ok=True)
+        elif target is not None:
+            target.parent.mkdir(parents=True, exist_ok=True)
+        actual_crc = 0
+        with open(os.devnull if target is None or is_dir else target, "wb") as out:
+            if method == 0:
+                remaining = compressed
+                while remaining:
+                    block = stream.read(min(READ_BLOCK, remaining))
+                    if not block:
+                        raise UnsupportedStreamError(f"{name}: архив обрывается")
+                    remaining -= len(block)
+                    out.write(block)
+                    actual_crc = zlib.crc32(block, actual_crc)
+            else:
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                remaining = None if has_descriptor else compressed
+                while not decompressor.eof:
+                    limit = READ_BLOCK if remaining is None else min(READ_BLOCK, remaining)
+                    block = stream.read(limit)
+                    if not block:
+                        raise UnsupportedStreamError(f"{name}: архив обрывается")
+                    if remaining is not None:
+                        remaining -= len(block)
+                    data = decompressor.decompress(block)
+                    out.write(data)
+                    actual_crc = zlib.crc32(data, actual_crc)
+                # Хвост последнего блока принадлежит следующей записи архива
+                stream.unread(len(decompressor.unused_data))
+
+        if has_descriptor:
+            if stream.read(4) != _DESCRIPTOR_SIGNATURE:
+                stream.unread(4)
+            crc = struct.unpack("<I", stream.read(4))[0]
+            stream.read(16 if is_zip64 else 8)
+        if actual_crc != crc:
+            raise DownloadError(f"CRC члена {name} не совпал: архив повреждён")
+        extracted.append(name)
+    return extracted
+
+
+def _fetch_chunk(
+    url: str, part_path: Path, state: ChunkState, index: int, timeout: float, retries: int
+) -> None:
+    """Докачивает один чанк; при обрыве повторяет запрос с места обрыва."""
+    for attempt in range(retries + 1):
+        start, end = state.chunk_range(index)
+        offset = start + state.done[index]
+        if offset >= end:
+            return
+        try:
+            with _open(url, offset, end - 1, timeout) as response, open(part_path, "r+b") as f:
+                content_range = response.headers.get("Content-Range", "")
+                if response.status != 206 or not content_range.startswith(f"bytes {offset}-"):
+                    raise DownloadError(f"сервер не вернул запрошенный диапазон ({content_range})")
+                f.seek(offset)
+                while offset < end:
+                    block = response.read(min(READ_BLOCK, end - offset))
+                    if not block:
+                        raise DownloadError("соединение закрыто до конца чанка")
+                    f.write(block)
+                    f.flush()
+                    offset += len(block)
+                    state.advance(index, len(block))
+            return
+        except (OSError, http.client.HTTPException, DownloadError) as err:
+            if attempt == retries:
+                raise DownloadError(f"чанк {index}: {err}") from err
+            time.sleep(min(2**attempt, 30))
+
+
+def _download_sequential(url: str, part_path: Path, timeout: float, retries: int) -> None:
+    """Загрузка одним потоком для серверов без Range (обрыв — загрузка заново)."""
+    for attempt in range(retries + 1):
+        try:
+            with _open(url, timeout=timeout) as response, open(part_path, "wb") as f:
+                total = response.headers.get("Content-Length", "")
+                with tqdm(
+                    total=int(total) if total.isdigit() else None, unit="B", unit_scale=True
+                ) as progress:
+                    for block in iter(lambda: response.read(READ_BLOCK), b""):
+                        f.write(block)
+                        progress.update(len(block))
+            return
+        except (OSError, http.client.HTTPException) as err:
+            if attempt == retries:
+                raise DownloadError(str(err)) from err
+            time.sleep(min(2**attempt, 30))
+
+
+def _consume(
+    stream: ArrivingStream, unpack_to: Optional[Path], result: Dict[str, Any]
+) -> None:
+    """Поток-потребитель: распаковка (если нужна) и хеш всего файла."""
+    try:
+        if unpack_to is not None:
+            if stream.read(4) == _LOCAL_SIGNATURE:
+                stream.unread(4)
+                try:
+                    result["extracted"] = stream_unzip(stream, unpack_to)
+                except UnsupportedStreamError as err:
+                    result["fallback"] = str(err)
+            else:
+                stream.unread(4)
+                result["fallback"] = "не zip-архив"
+        stream.drain()
+        result["sha256"] = stream.digest.hexdigest()
+    except Exception as err:
+        # Ошибка потребителя передаётся в основной поток
+        result["error"] = err
+    finally:
+        stream.close()
+
+
+def download(
+    url: str,
+    output: Path,
+    chunk_mb: int = DEFAULT_CHUNK_MB,
+    workers: int = DEFAULT_WORKERS,
+    sha256: Optional[str] = None,
+    unpack_to: Optional[Path] = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+    retries: int = DEFAULT_RETRIES,
+) -> str:
+    """Скачивает файл, проверяет хеш и (по желанию) распаковывает zip на лету.
+
+    Args:
+        url (str): Адрес файла.
+        output (Path): Куда сохранить файл.
+        chunk_mb (int): Размер чанка в мегабайтах.
+        workers (int): Число параллельных Range-запросов.
+        sha256 (Optional[str]): Ожидаемый SHA-256; ``None`` — только посчитать.
+        unpack_to (Optional[Path]): Куда распаковать zip-архив.
+        timeout (float): Таймаут сетевых операций, секунд.
+        retries (int): Повторов на чанк при обрыве соединения.
+
+    Returns:
+        str: SHA-256 скачанного файла.
+
+    Raises:
+        DownloadError: Загрузка не удалась или хеш не совпал.
+    """
+    output = Path(output)
+    if output.exists():
+        digest = sha256_file(output)
+        if sha256 and digest != sha256:
+            raise DownloadError(
+                f"{output} уже существует, но его SHA-256 не совпадает с манифестом"
+            )
+        print(f"✅ {output} уже загружен")
+        if unpack_to is not None:
+            _extract_after(output, unpack_to)
+        return digest
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    part_path = output.with_name(output.name + PART_SUFFIX)
+    state_path = output.with_name(output.name + STATE_SUFFIX)
+    remote = probe(url, timeout)
+    result: Dict[str, Any] = {}
+
+    if not remote.accepts_ranges or not remote.size:
+        print("⚠️  Сервер не поддерживает Range: загрузка одним потоком, распаковка после неё")
+        _download_sequential(url, part_path, timeout, retries)
+        result["sha256"] = sha256_file(part_path)
+        result["fallback"] = "загрузка без Range"
+    else:
+        meta = {
+            "url": url,
+            "size": remote.size,
+            "validator": remote.validator,
+            "chunk_size": max(1, chunk_mb) * 2**20,
+        }
+        state = ChunkState.load_or_create(state_path, meta)
+        if not part_path.exists() or part_path.stat().st_size != remote.size:
+            state = ChunkState(state_path, meta)
+            with open(part_path, "wb") as f:
+                f.truncate(remote.size)
+        pending = [i for i in range(len(state.done)) if not state.chunk_complete(i)]
+        if state.downloaded:
+            print(f"🔁 Докачка: уже есть {state.downloaded / 2**20:.1f} МБ")
+
+        stream = ArrivingStream(part_path, remote.size, state.wait_for)
+        consumer = threading.Thread(
+            target=_consume, args=(stream, unpack_to, result), name="download-consumer"
+        )
+        consumer.start()
+        progress = tqdm(total=remote.size, initial=state.downloaded, unit="B", unit_scale=True)
+        state.on_progress = progress.update
+        try:
+            with ThreadPoolExecutor(max(1, workers)) as pool:
+                futures = [
+                    pool.submit(_fetch_chunk, url, part_path, state, i, timeout, retries)
+                    for i in pending
+                ]
+                for future in futures:
+                    future.result()
+        except BaseException as err:
+            state.fail(err)
+            raise
+        finally:
+            progress.close()
+            state.save()
+            consumer.join()
+        if "error" in result:
+            raise DownloadError(f"Проверка/распаковка не удалась: {result['error']}")
+
+    digest = result["sha256"]
+    if sha256 and digest != sha256:
+        part_path.unlink()
+        state_path.unlink(missing_ok=True)
+        raise DownloadError(
+            f"SHA-256 {output.name} не совпал: ожидался {sha256}, получен {digest}; "
+            "загрузка удалена, запустите её заново"
+        )
+    os.replace(part_path, output)
+    state_path.unlink(missing_ok=True)
+    print(f"✅ {output}: SHA-256 {digest}" + (" (совпадает с манифестом)" if sha256 else ""))
+
+    if unpack_to is not None:
+        if "fallback" in result:
+            print(f"⚠️  Распаковка потоком невозможна: {result['fallback']}")
+            _extract_after(output, unpack_to)
+        else:
+            print(f"📦 Распаковано на лету: {len(result.get('extracted', []))} файлов → {unpack_to}")
+    return digest
+
+
+def _extract_after(archive: Path, destination: Path) -> None:
+    if not zipfile.is_zipfile(archive):
+        print(f"⚠️  {archive} не zip-архив, распаковка пропущена")
+        return
+    with zipfile.ZipFile(archive) as zf:
+        zf.extractall(destination)
+    print(f"📦 Распаковано: {archive} → {destination}")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Раздача файлов с поддержкой ``Range: bytes=a-b`` и имитацией обрывов.
+
+    С вероятностью ``drop_rate`` ответ обрывается в случайном месте — так
+    проверяется докачка чанков.
+    """
+
+    drop_rate = 0.0
+    rng = random.Random(0)
+
+    def end_headers(self) -> None:
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def send_head(self) -> Any:
+        self._length: Optional[int] = None
+        path = self.translate_path(self.path)
+        range_header = self.headers.get("Range", "")
+        if not range_header.startswith("bytes=") or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, _, last = range_header[len("bytes=") :].split(",")[0].partition("-")
+        if first:
+            start, end = int(first), min(int(last) if last else size - 1, size - 1)
+        else:
+            start, end = max(0, size - int(last)), size - 1
+        if start >= size or start > end:
+            self.send_error(416, "Requested Range Not Satisfiable")
+            return None
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Last-Modified", self.date_time_string(int(os.path.getmtime(path))))
+        self.end_headers()
+        self._length = end - start + 1
+        return f
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        remaining = self._length
+        if remaining is None:
+            remaining = os.fstat(source.fileno()).st_size - source.tell()
+        if self.rng.random() < self.drop_rate:
+            remaining = self.rng.randint(0, remaining)
+        while remaining > 0:
+            block = source.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            outputfile.write(block)
+            remaining -= len(block)
+        self.close_connection = True
+
+    def log_message(self, *args: Any) -> None:
+        return None
+
+
+def make_range_server(
+    directory: Path, host: str = "127.0.0.1", port: int = 8000, drop_rate: float = 0.0
+) -> ThreadingHTTPServer:
+    """Локальный HTTP-сервер с Range для проверки загрузчика без сети."""
+    handler = type("Handler", (RangeRequestHandler,), {"drop_rate": drop_rate})
+    return ThreadingHTTPServer((host, port), partial(handler, directory=str(directory)))
+
+
+@click.group()
+def cli() -> None:
+    """Параллельная докачиваемая загрузка с проверкой SHA-256 и распаковкой на лету."""
+
+
+@cli.command("fetch")
+@click.argument("url")
+@click.option("--output", required=True, type=click.Path(dir_okay=False, path_type=Path))
+@click.option(
+    "--checksums",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Манифест формата sha256sum; строка ищется по имени --output.",
+)
+@click.option("--sha256", default=None, help="Ожидаемый SHA-256 (вместо манифеста).")
+@click.option(
+    "--unpack-to",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Распаковать zip-архив в эту директорию по мере загрузки.",
+)
+@click.option("--chunk-mb", type=int, default=DEFAULT_CHUNK_MB, show_default=True)
+@click.option("--workers", type=int, default=DEFAULT_WORKERS, show_default=True)
+@click.option("--retries", type=int, default=DEFAULT_RETRIES, show_default=True)
+def fetch(
+    url: str,
+    output: Path,
+    checksums: Optional[Path],
+    sha256: Optional[str],
+    unpack_to: Optional[Path],
+    chunk_mb: int,
+    workers: int,
+    retries: int,
+) -> None:
+    """Скачивает URL в OUTPUT."""
+    if checksums is not None and sha256 is None:
+        sha256 = load_manifest(checksums).get(output.name)
+        if sha256 is None:
+            raise click.ClickException(f"В манифесте {checksums} нет строки для {output.name}")
+    try:
+        download(url, output, chunk_mb, workers, sha256, unpack_to, retries=retries)
+    except DownloadError as err:
+        raise click.ClickException(str(err)) from err
+
+
+@cli.command("manifest")
+@click.argument(
+    "files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+def manifest(files: Tuple[Path, ...]) -> None:
+    """Печатает манифест формата sha256sum для FILES."""
+    for path in files:
+        print(f"{sha256_file(path)}  {path.name}")
+
+
+@cli.command("serve")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option("--drop-rate", type=float, default=0.0, show_default=True, help="Доля обрывов.")
+def serve(directory: Path, host: str, port: int, drop_rate: float) -> None:
+    """Раздаёт DIRECTORY по HTTP с поддержкой Range (замена сервера для проверки)."""
+    server = make_range_server(directory, host, port, drop_rate)
+    print(f"🧪 http://{host}:{port}/ → {directory} (обрывов {drop_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,6 +1,21 @@
-import gdown
+import sys
+from pathlib import Path
+
+from chunked_download import DownloadError, download, gdrive_url, load_manifest
 
 if __name__ == '__main__':
     file_id = "1IBPr80SmPGmcGIQyIKgdaRhedu8h1Rbg"
     output = "dataset_for_training.zip"
-    gdown.download(id=file_id, output=output, quiet=False)
\ No newline at end of file
+    # Необязательный манифест sha256sum рядом со скриптом; распаковка не нужна —
+    # скрипты оценки читают zip напрямую (dataset_io.open_dataset)
+    checksums = Path(__file__).with_name("SHA256SUMS")
+    sha256 = load_manifest(checksums).get(output) if checksums.exists() else None
+    unpack_to = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+    try:
+        download(gdrive_url(file_id), Path(output), sha256=sha256, unpack_to=unpack_to)
+    except DownloadError as e:
+        # Например, Google Drive требует подтверждения, которое умеет обходить gdown
+        print(f"⚠️  Параллельная загрузка не удалась ({e}), пробую gdown")
+        import gdown
+
+        gdown.download(id=file_id, output=output, quiet=False)
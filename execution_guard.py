@@ -0,0 +1,267 @@
+"""Защита вызовов модели от нехватки памяти (OOM) с адаптивной деградацией.
+
+``ExecutionGuard`` перехватывает OOM, освобождает кеш CUDA и повторяет вызов
+с более «дешёвыми» настройками: меньшим батчем, меньшим числом изображений
+или уменьшенным разрешением. Найденные безопасные настройки запоминаются
+до конца запуска, поэтому следующие вызовы сразу идут с ними.
+
+Если деградировать больше некуда, выбрасывается ``OOMExhaustedError`` —
+вызывающий код должен пропустить элемент, а не записывать фиктивный ответ.
+"""
+
+import gc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# Во сколько раз уменьшается площадь изображения на каждом шаге деградации
+DEFAULT_PIXEL_FACTOR = 0.5
+# Ниже этой площади (≈ 448×448) снижать разрешение бессмысленно
+DEFAULT_MIN_PIXELS = 448 * 448
+
+
+class OOMExhaustedError(RuntimeError):
+    """OOM повторяется даже на минимальных настройках."""
+
+
+class SimulatedOutOfMemoryError(RuntimeError):
+    """OOM, который бросают заглушки моделей для проверки деградации без GPU."""
+
+    def __init__(self, message: str = "CUDA out of memory (simulated)") -> None:
+        super().__init__(message)
+
+
+def is_oom_error(error: BaseException) -> bool:
+    """Проверяет, является ли исключение нехваткой памяти (CUDA или хоста)."""
+    if isinstance(error, MemoryError):
+        return True
+    try:
+        import torch  # type: ignore
+
+        if isinstance(error, torch.cuda.OutOfMemoryError):
+            return True
+    except (ImportError, AttributeError):
+        pass
+    # Старые версии torch и часть ядер бросают обычный RuntimeError
+    return isinstance(error, RuntimeError) and "out of memory" in str(error).lower()
+
+
+def free_memory() -> None:
+    """Освобождает неиспользуемую память Python и кеш аллокатора CUDA."""
+    gc.collect()
+    try:
+        import torch  # type: ignore
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def downscale_image(image: Any, max_pixels: int) -> Any:
+    """Уменьшает изображение до площади не более ``max_pixels``.
+
+    Args:
+        image (Any): Путь к файлу (str/Path) или ``PIL.Image``.
+        max_pixels (int): Допустимая площадь в пикселях.
+
+    Returns:
+        Any: Исходный объект, если уменьшать не нужно, иначе ``PIL.Image``.
+    """
+    from PIL import Image  # type: ignore
+
+    if isinstance(image, (str, Path)):
+        with Image.open(image) as opened:
+            if opened.width * opened.height <= max_pixels:
+                return image
+            pil_image = opened.convert("RGB")
+    else:
+        pil_image = image
+        if pil_image.width * pil_image.height <= max_pixels:
+            return image
+
+    scale = (max_pixels / (pil_image.width * pil_image.height)) ** 0.5
+    size = (max(1, int(pil_image.width * scale)), max(1, int(pil_image.height * scale)))
+    return pil_image.resize(size, resample=Image.Resampling.BICUBIC)
+
+
+def _image_pixels(image: Any) -> int:
+    from PIL import Image  # type: ignore
+
+    if isinstance(image, (str, Path)):
+        with Image.open(image) as opened:
+            return opened.width * opened.height
+    return image.width * image.height
+
+
+@dataclass
+class GuardSettings:
+    """Текущие (максимальные безопасные) настройки вызова."""
+
+    batch_size: int
+    max_images: Optional[int] = None
+    max_pixels: Optional[int] = None
+
+
+class ExecutionGuard:
+    """Выполняет вызовы модели, деградируя настройки при OOM.
+
+    Args:
+        batch_size (int): Начальный размер батча для ``map_batches``.
+        max_images (Optional[int]): Начальный лимит изображений в запросе.
+        max_pixels (Optional[int]): Начальный лимит площади изображения.
+        min_pixels (int): Нижняя граница площади при деградации разрешения.
+        pixel_factor (float): Множитель площади на шаге деградации.
+        is_oom (Callable[[BaseException], bool]): Классификатор ошибок; можно
+            подменить в тестах.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1,
+        max_images: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        min_pixels: int = DEFAULT_MIN_PIXELS,
+        pixel_factor: float = DEFAULT_PIXEL_FACTOR,
+        is_oom: Callable[[BaseException], bool] = is_oom_error,
+    ) -> None:
+        self.settings = GuardSettings(batch_size, max_images, max_pixels)
+        self.min_pixels = min_pixels
+        self.pixel_factor = pixel_factor
+        self.is_oom = is_oom
+        self.oom_count = 0
+        self.exhausted_count = 0
+
+    def _prepare_images(self, images: Sequence[Any], min_images: int) -> List[Any]:
+        selected = list(images)
+        if self.settings.max_images is not None:
+            # Лимит общий для запуска, но обязательные изображения не отбрасываем
+            selected = selected[: max(min_images, self.settings.max_images)]
+        if self.settings.max_pixels is not None:
+            selected = [downscale_image(img, self.settings.max_pixels) for img in selected]
+        return selected
+
+    def _degrade_images(self, images: Sequence[Any], n_used: int, min_images: int) -> bool:
+        """Делает один шаг деградации для запроса с изображениями.
+
+        Сначала сокращается число изображений (если разрешено), затем разрешение.
+        """
+        if n_used > min_images:
+            self.settings.max_images = max(min_images, n_used // 2)
+            return True
+        if n_used == 0:
+            return False
+
+        current = self.settings.max_pixels or max(_image_pixels(img) for img in images)
+        reduced = int(current * self.pixel_factor)
+        if reduced < self.min_pixels:
+            return False
+        self.settings.max_pixels = reduced
+        return True
+
+    def run(
+        self,
+        fn: Callable[[List[Any]], T],
+        images: Sequence[Any],
+        min_images: Optional[int] = None,
+    ) -> T:
+        """Вызывает ``fn(images)``, при OOM уменьшая число и размер изображений.
+
+        Args:
+            fn (Callable[[List[Any]], T]): Вызов модели для списка изображений.
+            images (Sequence[Any]): Изображения запроса (пути или ``PIL.Image``).
+            min_images (Optional[int]): Сколько изображений обязательно оставить.
+                По умолчанию все (сокращать нельзя, только снижать разрешение).
+
+        Returns:
+            T: Результат ``fn``.
+
+        Raises:
+            OOMExhaustedError: OOM сохраняется на минимальных настройках.
+        """
+        min_images = len(images) if min_images is None else min_images
+        while True:
+            prepared = self._prepare_images(images, min_images)
+            try:
+                return fn(prepared)
+            except Exception as error:
+                if not self.is_oom(error):
+                    raise
+                self.oom_count += 1
+                free_memory()
+                if not self._degrade_images(images, len(prepared), min_images):
+                    self.exhausted_count += 1
+                    raise OOMExhaustedError(
+                        f"OOM даже при {len(prepared)} изобр. и max_pixels="
+                        f"{self.settings.max_pixels}"
+                    ) from error
+                print(f"⚠️  OOM, повтор с настройками: {self.settings}")
+
+    def map_batches(self, fn: Callable[[List[Any]], List[T]], items: Sequence[Any]) -> List[T]:
+        """Обрабатывает ``items`` батчами, уменьшая размер батча при OOM.
+
+        Args:
+            fn (Callable[[List[Any]], List[T]]): Обработка батча, возвращает
+                по результату на элемент.
+            items (Sequence[Any]): Элементы для обработки.
+
+        Returns:
+            List[T]: Результаты в исходном порядке.
+        """
+        results: List[T] = []
+        position = 0
+        while position < len(items):
+            batch = list(items[position : position + self.settings.batch_size])
+            try:
+                results.extend(fn(batch))
+            except Exception as error:
+                if not self.is_oom(error):
+                    raise
+                self.oom_count += 1
+                free_memory()
+                if self.settings.batch_size == 1:
+                    self.exhausted_count += 1
+                    raise OOMExhaustedError("OOM даже при batch_size=1") from error
+                self.settings.batch_size = max(1, self.settings.batch_size // 2)
+                print(f"⚠️  OOM, уменьшаем batch_size до {self.settings.batch_size}")
+                continue
+            position += len(batch)
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        """Счётчики OOM и итоговые безопасные настройки."""
+        return {
+            "oom_count": self.oom_count,
+            "exhausted_count": self.exhausted_count,
+            "batch_size": self.settings.batch_size,
+            "max_images": self.settings.max_images,
+            "max_pixels": self.settings.max_pixels,
+        }
+
+
+_GUARD = ExecutionGuard()
+
+
+def get_execution_guard() -> ExecutionGuard:
+    """Возвращает общий для запуска экземпляр ``ExecutionGuard``."""
+    return _GUARD
+
+
+def configure_execution_guard(guard_config: Optional[Dict[str, Any]]) -> ExecutionGuard:
+    """Создаёт общий ``ExecutionGuard`` по секции ``execution_guard`` конфига.
+
+    Поддерживаемые ключи: ``batch_size``, ``max_images``, ``max_pixels``,
+    ``min_pixels``, ``pixel_factor``.
+    """
+    global _GUARD
+    guard_config = guard_config or {}
+    _GUARD = ExecutionGuard(
+        batch_size=int(guard_config.get("batch_size", 1)),
+        max_images=guard_config.get("max_images"),
+        max_pixels=guard_config.get("max_pixels"),
+        min_pixels=int(guard_config.get("min_pixels", DEFAULT_MIN_PIXELS)),
+        pixel_factor=float(guard_config.get("pixel_factor", DEFAULT_PIXEL_FACTOR)),
+    )
+    return _GUARD
@@ -0,0 +1,213 @@
+"""Потоковое распознавание JSON в ответе модели и остановка генерации.
+
+``JsonObjectScanner`` получает текст по кусочкам (по мере декодирования
+токенов) и за один проход отслеживает вложенность скобок и строковые
+литералы. Как только закрывается объект верхнего уровня, он разбирается
+``json.loads`` и передаётся валидатору. ``OrderedPagesRecognizer`` принимает
+только ``{"ordered_pages": [...]}`` с ожидаемым числом страниц.
+
+``JsonStoppingCriteria`` подключает распознаватель к ``generate`` из
+``transformers``: декодирование прекращается сразу после закрывающей скобки,
+а разобранный результат доступен без повторного парсинга ответа. Текст
+строится ``IncrementalDecoder`` по новым токенам, а не декодированием всего
+ответа на каждом шаге.
+"""
+
+import json
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+try:
+    from transformers import StoppingCriteria  # type: ignore
+except ImportError:  # transformers нужен только для подключения к generate
+    StoppingCriteria = object  # type: ignore
+
+
+class JsonObjectScanner:
+    """Инкрементальный поиск JSON-объектов верхнего уровня в потоке текста.
+
+    Текст вне объектов (пояснения, ограждение ```json) пропускается.
+    """
+
+    def __init__(self) -> None:
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """Обрабатывает очередной фрагмент текста.
+
+        Returns:
+            List[str]: Исходный текст объектов, закрытых в этом фрагменте.
+        """
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append("".join(self._buffer))
+                    self._buffer = []
+        return completed
+
+
+class JsonRecognizer:
+    """Распознаватель первого JSON-объекта, прошедшего проверку ``validate``.
+
+    Args:
+        validate (Callable[[Any], Any]): Возвращает извлечённое значение или
+            ``None``, если объект не подходит (тогда поиск продолжается).
+    """
+
+    def __init__(self, validate: Callable[[Any], Any]) -> None:
+        self._scanner = JsonObjectScanner()
+        self._validate = validate
+        self.text = ""
+        self.result: Any = None
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        """Добавляет фрагмент ответа. Возвращает True, когда результат найден."""
+        if self.done:
+            return True
+        self.text += chunk
+        for raw_object in self._scanner.feed(chunk):
+            try:
+                parsed = json.loads(raw_object)
+            except json.JSONDecodeError:
+                continue
+            value = self._validate(parsed)
+            if value is not None:
+                self.result = value
+                self.done = True
+                break
+        return self.done
+
+
+class OrderedPagesRecognizer(JsonRecognizer):
+    """Ждёт ``{"ordered_pages": [...]}`` со списком из ``expected_pages`` целых чисел.
+
+    Args:
+        expected_pages (Optional[int]): Ожидаемое число страниц; ``None`` —
+            любое непустое.
+    """
+
+    def __init__(self, expected_pages: Optional[int] = None) -> None:
+        self.expected_pages = expected_pages
+        super().__init__(self._extract_pages)
+
+    def _extract_pages(self, parsed: Any) -> Optional[List[int]]:
+        if not isinstance(parsed, dict):
+            return None
+        pages = parsed.get("ordered_pages")
+        if not isinstance(pages, list) or not pages:
+            return None
+        if not all(isinstance(p, int) and not isinstance(p, bool) for p in pages):
+            return None
+        if self.expected_pages is not None and len(pages) != self.expected_pages:
+            return None
+        return pages
+
+
+class IncrementalDecoder:
+    """Декодирование токенов по одному без повторного разбора всего ответа.
+
+    Декодируется только окно с последней выданной границы: прирост текста —
+    разница между декодом окна с новыми токенами и без них. Так сохраняются
+    пробелы в начале слов (их добавляет токенизатор по контексту), а
+    стоимость шага не растёт с длиной ответа. Пока последний токен обрывает
+    многобайтовый символ (декод оканчивается на U+FFFD), текст не выдаётся.
+
+    Args:
+        tokenizer (Any): Токенизатор с методом ``decode``.
+    """
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+        self.token_ids: List[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def push(self, token_ids: Sequence[int]) -> str:
+        """Добавляет токены и возвращает прирост текста (возможно, пустой)."""
+        self.token_ids.extend(int(token_id) for token_id in token_ids)
+        window = self.token_ids[self._prefix_offset :]
+        prefix_text = self._decode(self.token_ids[self._prefix_offset : self._read_offset])
+        text = self._decode(window)
+        if len(text) <= len(prefix_text) or text.endswith("\ufffd"):
+            return ""
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self.token_ids)
+        return text[len(prefix_text) :]
+
+    def _decode(self, token_ids: List[int]) -> str:
+        if not token_ids:
+            return ""
+        return self.tokenizer.decode(token_ids, skip_special_tokens=True)
+
+
+class JsonStoppingCriteria(StoppingCriteria):  # type: ignore[misc]
+    """Критерий остановки ``generate``: стоп, когда распознаватель нашёл объект.
+
+    Каждая строка батча ведёт свой декодер и свой распознаватель; на шаге
+    декодируются только новые токены строки, а в распознаватель передаётся
+    прирост текста. Строка, для которой объект найден, больше не декодируется.
+
+    Args:
+        tokenizer (Any): Токенизатор модели (``processor.tokenizer``).
+        recognizers (Union[JsonRecognizer, Sequence[JsonRecognizer]]):
+            Распознаватель ответа или по одному на строку батча.
+        prompt_length (int): Длина входа в токенах (генерация начинается после неё).
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        recognizers: Union[JsonRecognizer, Sequence[JsonRecognizer]],
+        prompt_length: int,
+    ) -> None:
+        if isinstance(recognizers, JsonRecognizer):
+            recognizers = [recognizers]
+        self.tokenizer = tokenizer
+        self.recognizers = list(recognizers)
+        self.prompt_length = prompt_length
+        self._decoders = [IncrementalDecoder(tokenizer) for _ in self.recognizers]
+
+    @property
+    def recognizer(self) -> JsonRecognizer:
+        """Распознаватель первой строки (батч из одного ответа)."""
+        return self.recognizers[0]
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        import torch  # type: ignore
+
+        if input_ids.shape[0] != len(self.recognizers):
+            raise ValueError(
+                f"В батче {input_ids.shape[0]} строк, а распознавателей {len(self.recognizers)}"
+            )
+        done = []
+        for row, (recognizer, decoder) in enumerate(
+            zip(self.recognizers, self._decoders, strict=True)
+        ):
+            if not recognizer.done:
+                start = self.prompt_length + len(decoder.token_ids)
+                recognizer.feed(decoder.push(input_ids[row, start:].tolist()))
+            done.append(recognizer.done)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -1,26 +1,45 @@
+import heapq
 import os
 import sys
+from typing import Iterable, Iterator, List, Tuple
 
 
-def list_dir(path, indent="", limit=5):
-    items = sorted(os.listdir(path))
-    count = 0
-    for item in items:
-        full_path = os.path.join(path, item)
-        if count >= limit:
-            print(f"{indent}└── ... ({len(items)-limit} more)")
-            break
+def first_entries(path: str, limit: int) -> Tuple[List[Tuple[str, bool]], int]:
+    """Первые ``limit`` записей директории по имени и общее число записей.
 
-        prefix = "├──" if count < len(items)-1 else "└──"
+    Записи читаются потоком через ``os.scandir``, а первые по алфавиту
+    выбираются частичной сортировкой (куча размера ``limit``), без
+    сортировки всего каталога.
+    """
+    total = 0
+
+    def counted(entries: Iterable[os.DirEntry[str]]) -> Iterator[Tuple[str, bool]]:
+        nonlocal total
+        for entry in entries:
+            total += 1
+            yield entry.name, entry.is_dir()
+
+    with os.scandir(path) as entries:
+        first = heapq.nsmallest(limit, counted(entries))
+    return first, total
+
+
+def list_dir(path: str, indent: str = "", limit: int = 5) -> None:
+    items, total = first_entries(path, limit)
+    for count, (item, is_dir) in enumerate(items):
+        prefix = "├──" if count < total - 1 else "└──"
         print(f"{indent}{prefix} {item}")
 
-        if os.path.isdir(full_path):
-            new_indent = indent + ("│   " if count < len(items)-1 else "    ")
-            list_dir(full_path, new_indent, limit)
+        if is_dir:
+            new_indent = indent + ("│   " if count < total - 1 else "    ")
+            list_dir(os.path.join(path, item), new_indent, limit)
+
+    if total > limit:
+        print(f"{indent}└── ... ({total - limit} more)")
 
-        count += 1
 
 if __name__ == "__main__":
     root = sys.argv[1] if len(sys.argv) > 1 else "."
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 5
     print(root)
-    list_dir(root, limit=5)
\ No newline at end of file
+    list_dir(root, limit=limit)
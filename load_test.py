@@ -0,0 +1,393 @@
+"""Нагрузочное тестирование OpenAI-совместимого эндпоинта извлечения сущностей.
+
+``check_entity_extractor`` держит фиксированное число запросов в полёте
+(семафор), поэтому при медленном сервере он просто замедляется и не
+показывает, какой поток запросов развёртывание выдерживает. Здесь нагрузка
+открытая: запросы приходят по пуассоновскому процессу с заданной
+интенсивностью и отправляются в момент прихода, даже если предыдущие ещё
+не завершились, как у реальных клиентов.
+
+Запросы — те же, что отправляет ``run_request_to_runpod``: промпт,
+изображение в base64 и ``guided_json`` по схеме из разметки документа.
+Они готовятся заранее по сабсету датасета и повторяются по кругу. Для
+каждой ступени интенсивности считаются перцентили задержки, доля ошибок и
+goodput — число успешных ответов в секунду, уложившихся в SLO по задержке::
+
+    python load_test.py run --dataset-path ./dataset --prompt-path prompt.txt \\
+        --model-name Qwen2.5-VL-7B-Instruct --rates 0.5,1,2,4 --duration 60
+
+Для проверки самого стенда без GPU есть локальный мок-сервер с моделью
+задержки (``python load_test.py mock-server``; затем
+``run --base-url http://127.0.0.1:8000/v1``).
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import click
+import numpy as np
+import pandas as pd
+
+from dataset_io import DatasetPath, open_dataset
+
+DEFAULT_TIMEOUT_S = 120.0
+DEFAULT_SLO_MS = 10_000.0
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class LoadRequest:
+    """Подготовленный запрос: те же аргументы, что у ``run_request_to_runpod``."""
+
+    image: str
+    schema: Dict[str, Any]
+    base64_image: str
+    prompt: str
+
+
+def build_requests(
+    dataset_path: DatasetPath, prompt: str, subset: str, limit: Optional[int] = None
+) -> List[LoadRequest]:
+    """Готовит запросы по изображениям сабсета и их разметке в ``jsons/``.
+
+    Кодирование в base64 и построение схемы выполняются заранее, чтобы
+    клиент не отставал от расписания прихода запросов. Сабсет выбирается
+    через ``augment.subset_dir``, как в ``check_entity_extractor``.
+    """
+    from augment import subset_dir
+    from check_entity_extractor import generate_pydantic_model, image_to_base64, read_json_file
+
+    requests = []
+    for image in sorted(subset_dir(dataset_path / "images", subset).glob("*.jpg"))[:limit]:
+        gt_path = dataset_path / "jsons" / f"{image.stem}.json"
+        if not gt_path.exists():
+            continue
+        schema = generate_pydantic_model(read_json_file(gt_path), "StructureModel")
+        requests.append(
+            LoadRequest(
+                image=image.name,
+                schema=schema.model_json_schema(),
+                base64_image=image_to_base64(image),
+                prompt=prompt,
+            )
+        )
+    return requests
+
+
+def poisson_arrivals(rate: float, duration_s: float, rng: random.Random) -> List[float]:
+    """Моменты прихода запросов (секунды от начала ступени) с интенсивностью ``rate``/с."""
+    arrivals, t = [], rng.expovariate(rate)
+    while t < duration_s:
+        arrivals.append(t)
+        t += rng.expovariate(rate)
+    return arrivals
+
+
+async def _send(
+    request: LoadRequest, model_name: str, openai_client: Any, timeout_s: float
+) -> Dict[str, Any]:
+    from check_entity_extractor import run_request_to_runpod
+
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            run_request_to_runpod(
+                request.schema, request.base64_image, request.prompt, model_name, openai_client
+            ),
+            timeout_s,
+        )
+        status, error = "ok", ""
+    except asyncio.TimeoutError:
+        status, error = "timeout", f"нет ответа за {timeout_s:.0f} с"
+    except json.JSONDecodeError as e:
+        status, error = "invalid_json", str(e)
+    except Exception as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+    return {
+        "image": request.image,
+        "status": status,
+        "latency_ms": 1000 * (time.perf_counter() - start),
+        "error": error[:200],
+    }
+
+
+async def run_step(
+    requests: List[LoadRequest],
+    rate: float,
+    duration_s: float,
+    model_name: str,
+    openai_client: Any,
+    timeout_s: float,
+    rng: random.Random,
+) -> List[Dict[str, Any]]:
+    """Одна ступень открытой нагрузки: запросы уходят строго по расписанию прихода.
+
+    Returns:
+        List[Dict[str, Any]]: Строка на запрос со статусом, задержкой и
+        отставанием отправки от расписания (``dispatch_lag_ms``; большое
+        значение означает, что не успевает сам клиент).
+    """
+    arrivals = poisson_arrivals(rate, duration_s, rng)
+    start = time.perf_counter()
+    tasks = []
+    for index, arrival in enumerate(arrivals):
+        delay = start + arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lag_ms = 1000 * (time.perf_counter() - start - arrival)
+        task = asyncio.create_task(
+            _send(requests[index % len(requests)], model_name, openai_client, timeout_s)
+        )
+        tasks.append((arrival, lag_ms, task))
+
+    rows = []
+    for arrival, lag_ms, task in tasks:
+        row = await task
+        rows.append(
+            {"rate": rate, "arrival_s": round(arrival, 3), "dispatch_lag_ms": lag_ms, **row}
+        )
+    return rows
+
+
+def summarize_steps(
+    records: pd.DataFrame,
+    duration_s: float,
+    slo_ms: float,
+    rates: Optional[List[float]] = None,
+) -> pd.DataFrame:
+    """Метрики по ступеням: перцентили задержки успешных ответов, ошибки, goodput.
+
+    Ступени из ``rates``, на которые не пришло ни одного запроса (малая
+    интенсивность или короткая ступень), дают строку с нулём запросов.
+    """
+    steps = dict(iter(records.groupby("rate", sort=True))) if len(records) else {}
+    empty = pd.DataFrame(columns=["status", "latency_ms", "dispatch_lag_ms"])
+    rows = []
+    for rate in sorted(set(steps) | set(rates or [])):
+        step = steps.get(rate, empty)
+        ok = step[step["status"] == "ok"]
+        row: Dict[str, Any] = {
+            "rate": rate,
+            "requests": len(step),
+            "offered_rps": len(step) / duration_s,
+            "throughput_rps": len(ok) / duration_s,
+            "goodput_rps": int((ok["latency_ms"] <= slo_ms).sum()) / duration_s,
+            "error_rate": 1 - len(ok) / len(step) if len(step) else 0.0,
+            "timeouts": int((step["status"] == "timeout").sum()),
+        }
+        latencies = ok["latency_ms"].to_numpy()
+        for q in PERCENTILES:
+            row[f"p{q}_ms"] = float(np.percentile(latencies, q)) if latencies.size else np.nan
+        row["max_dispatch_lag_ms"] = float(step["dispatch_lag_ms"].max()) if len(step) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows).round(3)
+
+
+def _mock_value(schema: Dict[str, Any], definitions: Dict[str, Any]) -> Any:
+    """Значение, удовлетворяющее (простой) JSON-схеме pydantic."""
+    if "$ref" in schema:
+        return _mock_value(definitions[schema["$ref"].split("/")[-1]], definitions)
+    schema_type = schema.get("type", "")
+    if schema_type == "object" or "properties" in schema:
+        return {
+            key: _mock_value(value, definitions)
+            for key, value in schema.get("properties", {}).items()
+        }
+    return {"string": "mock", "integer": 0, "number": 0.0, "boolean": False, "array": []}.get(
+        schema_type
+    )
+
+
+@dataclass
+class MockLatency:
+    """Модель задержки мок-сервера.
+
+    Время обслуживания — ``base_ms`` плюс логнормальный разброс с медианой
+    ``jitter_ms``; одновременно обслуживается не больше ``slots`` запросов,
+    остальные ждут в очереди (как в пакетном сервере с ограниченным KV-кешем).
+    Доля ``error_rate`` запросов завершается ответом 500.
+    """
+
+    base_ms: float = 800.0
+    jitter_ms: float = 200.0
+    slots: int = 4
+    error_rate: float = 0.0
+
+
+def make_mock_server(host: str, port: int, latency: MockLatency, seed: int = 0) -> Any:
+    """HTTP-сервер ``/v1/chat/completions`` с моделью задержки ``latency``."""
+    slots = threading.BoundedSemaphore(max(1, latency.slots))
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            self._reply(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+
+        def do_POST(self) -> None:  # noqa: N802
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with rng_lock:
+                jitter_ms = rng.lognormvariate(0, 0.5) * latency.jitter_ms
+                service_s = (latency.base_ms + jitter_ms) / 1000
+                failed = rng.random() < latency.error_rate
+            with slots:
+                time.sleep(service_s)
+            if failed:
+                self._reply(500, {"error": {"message": "mock failure", "type": "server_error"}})
+                return
+            schema = request.get("guided_json") or {}
+            content = json.dumps(_mock_value(schema, schema.get("$defs", {})), ensure_ascii=False)
+            self._reply(
+                200,
+                {
+                    "id": f"mock-{time.time_ns()}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                },
+            )
+
+        def log_message(self, *args: Any) -> None:
+            return None
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def _parse_rates(value: str) -> List[float]:
+    rates = [float(item) for item in value.split(",") if item.strip()]
+    if not rates or any(rate <= 0 for rate in rates):
+        raise click.BadParameter("Интенсивности должны быть положительными числами через запятую")
+    return rates
+
+
+@click.group()
+def cli() -> None:
+    """Открытая нагрузка на OpenAI-совместимый эндпоинт извлечения сущностей."""
+
+
+@cli.command("run")
+@click.option("--dataset-path", required=True, type=click.Path(path_type=Path))
+@click.option("--prompt-path", required=True, type=click.Path(exists=True, path_type=Path))
+@click.option("--model-name", required=True, type=str)
+@click.option("--subset", default="clean", show_default=True, help="Сабсет-источник запросов.")
+@click.option("--limit", type=int, default=None, help="Сколько изображений подготовить.")
+@click.option(
+    "--rates", default="0.5,1,2,4", show_default=True, help="Интенсивности (запросов/с) ступеней."
+)
+@click.option("--duration", type=float, default=60.0, show_default=True, help="Секунд на ступень.")
+@click.option("--slo-ms", type=float, default=DEFAULT_SLO_MS, show_default=True, help="SLO.")
+@click.option("--timeout", type=float, default=DEFAULT_TIMEOUT_S, show_default=True)
+@click.option(
+    "--base-url", default=None, help="OpenAI-совместимый эндпоинт (по умолчанию RUNPOD_URL)."
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--output",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Каталог результатов (по умолчанию ./load_tests/<время запуска>).",
+)
+def run(
+    dataset_path: Path,
+    prompt_path: Path,
+    model_name: str,
+    subset: str,
+    limit: Optional[int],
+    rates: str,
+    duration: float,
+    slo_ms: float,
+    timeout: float,
+    base_url: Optional[str],
+    seed: int,
+    output: Optional[Path],
+) -> None:
+    """Прогоняет ступени интенсивности и сохраняет метрики по каждой."""
+    from openai import AsyncOpenAI
+
+    from check_entity_extractor import read_prompt_from_file
+
+    rate_steps = _parse_rates(rates)
+    requests = build_requests(
+        open_dataset(dataset_path), read_prompt_from_file(prompt_path), subset, limit
+    )
+    if not requests:
+        raise click.ClickException(f"В сабсете {subset} нет изображений с разметкой")
+    base_url = base_url or os.getenv("RUNPOD_URL")
+    print(f"🚀 {len(requests)} запросов по кругу, ступени {rate_steps} запр/с по {duration:.0f} с")
+
+    async def run_all() -> List[Dict[str, Any]]:
+        # Без повторов: каждая ошибка сервера должна попасть в статистику ступени
+        openai_client = AsyncOpenAI(base_url=base_url, api_key="token-test", max_retries=0)
+        rng = random.Random(seed)
+        records: List[Dict[str, Any]] = []
+        for rate in rate_steps:
+            rows = await run_step(
+                requests, rate, duration, model_name, openai_client, timeout, rng
+            )
+            step = summarize_steps(pd.DataFrame(rows), duration, slo_ms, [rate]).iloc[0]
+            print(
+                f"  {rate:g} запр/с: p50 {step['p50_ms']:.0f} мс, p99 {step['p99_ms']:.0f} мс, "
+                f"ошибки {step['error_rate']:.1%}, goodput {step['goodput_rps']:.2f} запр/с"
+            )
+            records.extend(rows)
+        await openai_client.close()
+        return records
+
+    records = pd.DataFrame(asyncio.run(run_all()))
+    steps = summarize_steps(records, duration, slo_ms, rate_steps)
+    output_dir = output or Path("load_tests") / datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    steps.to_csv(output_dir / "steps.csv", index=False)
+    records.to_csv(output_dir / "requests.csv", index=False)
+    print(steps.to_string(index=False))
+    print(f"✅ Результаты: {output_dir}")
+
+
+@cli.command("mock-server")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option("--base-ms", type=float, default=800.0, show_default=True, help="Базовая задержка.")
+@click.option("--jitter-ms", type=float, default=200.0, show_default=True, help="Разброс.")
+@click.option("--slots", type=int, default=4, show_default=True, help="Одновременных запросов.")
+@click.option("--error-rate", type=float, default=0.0, show_default=True, help="Доля ошибок 500.")
+def mock_server(
+    host: str, port: int, base_ms: float, jitter_ms: float, slots: int, error_rate: float
+) -> None:
+    """Локальный мок эндпоинта с моделью задержки для проверки стенда без GPU."""
+    server = make_mock_server(host, port, MockLatency(base_ms, jitter_ms, slots, error_rate))
+    print(f"🧪 Мок-сервер: http://{host}:{port}/v1 (слотов {slots}, база {base_ms:.0f} мс)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    cli()
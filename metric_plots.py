@@ -0,0 +1,143 @@
+"""Графики метрик по полям, которые рисуются вне основного потока.
+
+``PlotRenderer`` отдаёт каждую таблицу метрик в пул процессов (``spawn``),
+где графики строятся с неинтерактивным бэкендом Agg и каждая фигура
+закрывается после сохранения. Основной процесс не импортирует
+``matplotlib.pyplot`` и не держит фигуры, поэтому память не растёт от
+запуска к запуску, а графики сабсета рисуются параллельно с инференсом
+следующего.
+"""
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+DEFAULT_DPI = 300
+DEFAULT_WORKERS = 1
+
+# Колонка, заголовок, подпись оси, палитра, сортировка по убыванию
+PLOTS: List[Tuple[str, str, str, str, bool]] = [
+    ("cer", "CER по полям", "CER", "Reds_r", True),
+    ("wer", "WER по полям", "WER", "Oranges_r", True),
+    ("fuzzy_match", "Fuzzy Accuracy по полям", "Fuzzy Accuracy", "Blues", False),
+    ("exact_match", "Exact Match Accuracy по полям", "Точность (Exact Match)", "Greens", False),
+]
+
+
+def render_field_plots(
+    per_field_df: pd.DataFrame, output_dir: Path, prefix: str, dpi: int
+) -> List[Path]:
+    """Рисует столбчатые графики метрик по полям и сохраняет их в PNG.
+
+    Графики строятся только для колонок, которые есть в таблице.
+
+    Args:
+        per_field_df (pd.DataFrame): Метрики по полям (колонка ``field``).
+        output_dir (Path): Каталог для PNG.
+        prefix (str): Префикс имён файлов (обычно имя сабсета).
+        dpi (int): Разрешение сохраняемых изображений.
+
+    Returns:
+        List[Path]: Пути сохранённых графиков.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set(style="whitegrid")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    data = per_field_df.assign(field=per_field_df["field"].astype(str))
+
+    saved = []
+    for column, title, xlabel, palette, descending in PLOTS:
+        if column not in data.columns:
+            continue
+        fig, ax = plt.subplots(figsize=(10, 5))
+        try:
+            sns.barplot(
+                x=column,
+                y="field",
+                data=data.sort_values(column, ascending=not descending),
+                palette=palette,
+                ax=ax,
+            )
+            ax.set_title(title)
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel("Поле")
+            fig.tight_layout()
+            path = output_dir / f"{prefix}_{column}_per_field.png"
+            fig.savefig(path, dpi=dpi, bbox_inches="tight")
+            saved.append(path)
+        finally:
+            plt.close(fig)
+    return saved
+
+
+class PlotRenderer:
+    """Пул процессов, рисующий графики метрик в фоне.
+
+    Args:
+        output_dir (Path): Каталог для PNG.
+        dpi (int): Разрешение; ``0`` отключает графики (``submit`` ничего не делает).
+        workers (int): Число процессов; ``0`` — рисовать синхронно в этом процессе.
+    """
+
+    def __init__(
+        self, output_dir: Path, dpi: int = DEFAULT_DPI, workers: int = DEFAULT_WORKERS
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.dpi = dpi
+        self._futures: List[Tuple[str, Future]] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.enabled and workers > 0:
+            # spawn: воркер не наследует состояние модели и CUDA-контекст
+            self._pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.dpi > 0
+
+    def submit(self, per_field_df: pd.DataFrame, prefix: str) -> None:
+        """Ставит графики таблицы в очередь (или рисует сразу без пула)."""
+        if not self.enabled:
+            return
+        if self._pool is None:
+            render_field_plots(per_field_df, self.output_dir, prefix, self.dpi)
+            return
+        future = self._pool.submit(
+            render_field_plots, per_field_df, self.output_dir, prefix, self.dpi
+        )
+        self._futures.append((prefix, future))
+
+    def close(self) -> List[Path]:
+        """Дожидается всех графиков и останавливает пул.
+
+        Returns:
+            List[Path]: Пути сохранённых графиков; ошибки отдельных задач
+            печатаются и не прерывают запуск.
+        """
+        saved: List[Path] = []
+        for prefix, future in self._futures:
+            try:
+                saved.extend(future.result())
+            except Exception as err:
+                print(f"⚠️  Не удалось построить графики для {prefix}: {err}")
+        self._futures.clear()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return saved
+
+    def __enter__(self) -> "PlotRenderer":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
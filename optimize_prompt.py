@@ -1,10 +1,10 @@
 import json
 import random
 import re
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-import torch  # type: ignore  # нужен для обработки OutOfMemoryError
 from bench_utils.metrics import calculate_classification_metrics  # type: ignore
 
 # --- Внутренние пакеты проекта ---
@@ -18,6 +18,17 @@ from check_classifiication import (
 from check_classifiication import (
     get_prediction as _predict_single,
 )
+from augment import configure_augmentation, subset_dir, subset_label
+from cpu_backend import enable_cpu_backend
+from dataset_io import DatasetPath, load_image_for_model, open_dataset
+from execution_guard import (
+    OOMExhaustedError,
+    configure_execution_guard,
+    get_execution_guard,
+)
+from pixel_cache import enable_pixel_cache, pixel_cache_report
+from prefix_cache import enable_prefix_cache, prefix_cache_report
+from results_db import ResultsDB, results_db_from_config
 
 # --- Константы ---
 PROMPTS_DIR = Path("prompts")
@@ -56,19 +67,20 @@ def extract_prompt_from_output(model_output: str) -> str:
 
 
 def sample_images_for_improvement(
-    dataset_path: Path,
+    dataset_path: DatasetPath,
     document_classes: Dict[str, str],
     subset: str,
     images_per_class: int,
-) -> List[Path]:
+) -> List[DatasetPath]:
     """Сэмплирует *images_per_class* изображений для каждого класса."""
-    sampled: List[Path] = []
+    sampled: List[DatasetPath] = []
     for class_name in document_classes.keys():
-        class_dir = dataset_path / class_name / "images" / subset
+        # Отсутствующий сабсет вычисляется из clean на лету (augment.py)
+        class_dir = subset_dir(dataset_path / class_name / "images", subset)
         if not class_dir.exists():
             continue
 
-        all_files: List[Path] = [p for p in class_dir.iterdir() if p.is_file()]
+        all_files: List[DatasetPath] = [p for p in class_dir.iterdir() if p.is_file()]
         if len(all_files) > images_per_class:
             sampled.extend(random.sample(all_files, images_per_class))
         else:
@@ -78,43 +90,81 @@ def sample_images_for_improvement(
 
 def evaluate_prompt(
     model: Any,
-    dataset_path: Path,
+    dataset_path: DatasetPath,
     document_classes: Dict[str, str],
     subsets: List[str],
     sample_size: Optional[int],
     prompt_template: str,
+    results_db: Optional[ResultsDB] = None,
+    run_id: Optional[str] = None,
 ) -> float:
-    """Вычисляет accuracy для переданного промпта."""
+    """Вычисляет accuracy для переданного промпта.
+
+    Если передан ``results_db``, предсказания и метрики по сабсетам
+    записываются в реестр под ``run_id`` (запуск должен быть зарегистрирован).
+    """
 
     classes_str = ", ".join(f"{idx}: {name}" for idx, name in enumerate(document_classes.values()))
     prompt = prepare_prompt(prompt_template, classes=classes_str)
 
     y_true: List[str] = []
     y_pred: List[str] = []
+    processed_subsets: List[str] = []
 
     for subset in subsets:
+        subset_start = len(y_true)
+        item_ids: List[str] = []
         image_paths = _collect_image_paths(
             dataset_path,
             list(document_classes.keys()),
             subset,
             sample_size,
         )
+        # Вычисленный из clean сабсет пишется в реестр как <subset>+derived
+        subset = subset_label(subset, image_paths)
+        processed_subsets.append(subset)
         for img_path in tqdm(image_paths, desc=f"Eval {subset}"):
             try:
                 class_name = img_path.relative_to(dataset_path).parts[0]
             except ValueError:
                 class_name = img_path.parts[-5] if len(img_path.parts) >= 5 else "Unknown"
 
+            try:
+                prediction = _predict_single(model, img_path, prompt, document_classes)
+            except OOMExhaustedError as e:
+                print(f"⚠️  Пропуск {img_path.name}: {e}")
+                continue
+
             y_true.append(class_name)
-            y_pred.append(_predict_single(model, img_path, prompt, document_classes))
+            y_pred.append(prediction)
+            item_ids.append(str(img_path))
+
+        if results_db is not None and run_id is not None:
+            subset_true, subset_pred = y_true[subset_start:], y_pred[subset_start:]
+            results_db.add_predictions(
+                run_id,
+                subset,
+                (
+                    (i, t, p, t == p, None)
+                    for i, t, p in zip(item_ids, subset_true, subset_pred, strict=True)
+                ),
+            )
+            results_db.add_metrics(
+                run_id,
+                subset,
+                calculate_classification_metrics(subset_true, subset_pred, document_classes),
+            )
 
     metrics = calculate_classification_metrics(y_true, y_pred, document_classes)
+    if results_db is not None and run_id is not None:
+        results_db.add_metrics(run_id, "ALL", metrics)
+        results_db.set_subsets(run_id, processed_subsets)
     return metrics.get("accuracy", 0.0)
 
 
 def generate_improved_prompt(
     model: Any,
-    images: List[Path],
+    images: List[DatasetPath],
     current_prompt: str,
 ) -> str:
     """Запрашивает у модели улучшенную версию текущего промпта."""
@@ -129,22 +179,14 @@ def generate_improved_prompt(
 
     # Ограничиваем batch, чтобы не словить OOM
     images_batch = images[:MAX_IMAGES_IN_REQUEST]
-    images_str = [str(p) for p in images_batch]
-
-    try:
-        model_output = model.predict_on_images(images=images_str, prompt=instruction)
-    except torch.cuda.OutOfMemoryError:
-        # Фолбэк: пробуем с одной картинкой, если всё ещё падает — убираем картинки вовсе
-        torch.cuda.empty_cache()
-        try:
-            model_output = model.predict_on_images(images=[images_str[0]], prompt=instruction)
-        except Exception:
-            # Последний фолбэк — вызываем только текстовый prompt без изображений
-            print("⚠️  OOM при генерации промпта, пробуем без изображений…")
-            model_output = model.predict_on_images(images=[], prompt=instruction)
-    except AttributeError:
-        # На случай, если в конкретной реализации название метода иное.
-        model_output = model.predict_on_images(images=images_str, prompt=instruction)  # type: ignore
+    model_images = [load_image_for_model(p) for p in images_batch]
+
+    # При OOM guard сокращает число картинок вплоть до текстового запроса без них
+    model_output = get_execution_guard().run(
+        lambda batch: model.predict_on_images(images=batch, prompt=instruction),
+        model_images,
+        min_images=0,
+    )
 
     return extract_prompt_from_output(model_output)
 
@@ -169,7 +211,7 @@ def main() -> None:
     model_cfg = config["model"]
     optim_cfg = config.get("optimization", {})
 
-    dataset_path = Path(task_cfg["dataset_path"])
+    dataset_path = open_dataset(task_cfg["dataset_path"])
     prompt_path = Path(task_cfg["prompt_path"])
     subsets = task_cfg["subsets"]
     sample_size = task_cfg.get("sample_size")
@@ -179,7 +221,35 @@ def main() -> None:
     images_per_class: int = IMAGES_PER_CLASS
 
     # --- Инициализация модели ---
-    model = initialize_model(model_cfg)
+    configure_execution_guard(config.get("execution_guard"))
+    configure_augmentation(config.get("augmentation"))
+    model = enable_prefix_cache(
+        enable_pixel_cache(
+            enable_cpu_backend(initialize_model(model_cfg), model_cfg), config.get("pixel_cache")
+        ),
+        config.get("prefix_cache"),
+    )
+    results_db = results_db_from_config(config)
+    run_prefix = (
+        f"{model_cfg['model_name'].replace(' ', '_')}_{prompt_path.stem}_"
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    )
+
+    def register_attempt(attempt_name: str, prompt_text: str) -> Optional[str]:
+        """Регистрирует оценку одного варианта промпта в реестре."""
+        if results_db is None:
+            return None
+        run_id = f"{run_prefix}_{attempt_name}"
+        results_db.register_run(
+            run_id,
+            "prompt_optimization",
+            model_cfg["model_name"],
+            prompt_text=prompt_text,
+            prompt_name=f"{prompt_path.stem}_{attempt_name}",
+            config=config,
+            subsets=subsets,
+        )
+        return run_id
 
     # --- Базовый промпт ---
     current_prompt_template = load_prompt(prompt_path)
@@ -190,6 +260,8 @@ def main() -> None:
         subsets,
         sample_size,
         current_prompt_template,
+        results_db,
+        register_attempt("baseline", current_prompt_template),
     )
     print(f"Базовая accuracy: {baseline_acc:.4f}\n")
 
@@ -226,6 +298,8 @@ def main() -> None:
             subsets,
             sample_size,
             candidate_prompt,
+            results_db,
+            register_attempt(f"attempt_{attempt}", candidate_prompt),
         )
         print(f"  ➜ Accuracy с новым промптом: {acc:.4f}")
 
@@ -252,6 +326,13 @@ def main() -> None:
     else:
         print("\n😐 Не удалось улучшить промпт. Остаёмся на исходной версии.")
 
+    prefix_report = prefix_cache_report(model)
+    if prefix_report:
+        print(f"Кеш префикса промпта: {prefix_report}")
+    pixel_report = pixel_cache_report()
+    if pixel_report:
+        print(f"Кеш изображений: {pixel_report}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
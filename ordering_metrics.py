@@ -0,0 +1,258 @@
+"""Метрики порядка страниц сразу по всем документам сабсета.
+
+``calculate_ordering_metrics`` из ``bench_utils`` считает Kendall tau и
+Spearman rho для одного документа на чистом Python. Здесь истинные и
+предсказанные порядки собираются в матрицы ``(документы, страницы)`` и
+метрики вычисляются для всех документов одной серией NumPy-операций:
+
+* ``kendall_tau`` — tau-b (с поправкой на повторы, как ``scipy.stats.kendalltau``);
+* ``spearman_rho`` — корреляция Пирсона средних рангов (как ``scipy.stats.spearmanr``);
+* ``accuracy`` — доля документов с полностью верным порядком;
+* ``valid_share`` — доля документов, где длина предсказания совпала с истинной.
+
+Дополнительно считаются разбивки ошибок: доля документов с неверной
+страницей на каждой позиции и матрица перестановок — как часто страница,
+стоящая в истинном порядке на позиции ``i``, оказывается после страницы
+с позиции ``j > i``.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def _pairwise_signs(values: np.ndarray) -> np.ndarray:
+    """Знаки ``values[:, j] - values[:, i]`` для всех пар ``i < j`` (форма ``(n, пары)``)."""
+    rows, cols = np.triu_indices(values.shape[1], k=1)
+    return np.sign(values[:, cols] - values[:, rows])
+
+
+def kendall_tau_b(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Kendall tau-b для каждой строки двух матриц одинаковой формы.
+
+    Строка без вариации (все значения равны) даёт ``nan``, как в scipy.
+    """
+    sx, sy = _pairwise_signs(x), _pairwise_signs(y)
+    numerator = (sx * sy).sum(axis=1)
+    denominator = np.sqrt(np.abs(sx).sum(axis=1) * np.abs(sy).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def average_ranks(values: np.ndarray) -> np.ndarray:
+    """Ранги значений в каждой строке (с 1), повторы получают средний ранг."""
+    # less + (equal + 1) / 2, где less - greater — сумма знаков разностей по строке
+    balance = np.sign(values[:, :, None] - values[:, None, :]).sum(axis=2)
+    return (balance + values.shape[1] + 1) / 2
+
+
+def spearman_rho(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Spearman rho для каждой строки двух матриц одинаковой формы."""
+    rx = average_ranks(x)
+    ry = average_ranks(y)
+    rx -= rx.mean(axis=1, keepdims=True)
+    ry -= ry.mean(axis=1, keepdims=True)
+    denominator = np.sqrt((rx * rx).sum(axis=1) * (ry * ry).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, (rx * ry).sum(axis=1) / denominator, np.nan)
+
+
+def _nanmean(values: np.ndarray) -> float:
+    finite = values[np.isfinite(values)]
+    return round(float(finite.mean()), 4) if finite.size else 0.0
+
+
+def _scored_mean(values: np.ndarray, valid: np.ndarray) -> float:
+    """Среднее по документам, где предсказание неверной длины получает 0.
+
+    Иначе модель, часто ошибающаяся в числе страниц, выглядела бы лучше:
+    в среднее попадали бы только удачные ответы. ``nan`` у документа
+    верной длины (нет вариации порядка) по-прежнему не учитывается.
+    """
+    return _nanmean(np.where(valid, values, 0.0))
+
+
+@dataclass
+class OrderingMetrics:
+    """Метрики порядка страниц по документам и их разбивки.
+
+    Attributes:
+        kendall_tau (np.ndarray): Kendall tau-b по документам.
+        spearman_rho (np.ndarray): Spearman rho по документам.
+        accuracy (np.ndarray): 1.0, если порядок документа предсказан полностью верно.
+        valid (np.ndarray): Длина предсказания совпала с истинной; у остальных
+            документов tau и rho равны ``nan``, а accuracy — 0.
+        position_error_rate (np.ndarray): Доля документов с неверной страницей
+            на каждой позиции (по документам с предсказанием-перестановкой,
+            в которых есть эта позиция).
+        swap_rate (np.ndarray): ``swap_rate[i, j]`` при ``i < j`` — доля
+            документов (из тех, где есть обе позиции), где страница с истинной
+            позиции ``i`` стоит после страницы с позиции ``j``.
+    """
+
+    kendall_tau: np.ndarray
+    spearman_rho: np.ndarray
+    accuracy: np.ndarray
+    valid: np.ndarray
+    position_error_rate: np.ndarray
+    swap_rate: np.ndarray
+
+    def summary(self) -> Dict[str, float]:
+        """Средние метрики (ключи как у ``calculate_ordering_metrics``) и ``valid_share``.
+
+        Документы с предсказанием неверной длины входят в средние tau и rho
+        с нулём, а не отбрасываются.
+        """
+        if not self.accuracy.size:
+            return {}
+        return {
+            "kendall_tau": _scored_mean(self.kendall_tau, self.valid),
+            "accuracy": round(float(self.accuracy.mean()), 4),
+            "spearman_rho": _scored_mean(self.spearman_rho, self.valid),
+            "valid_share": round(float(self.valid.mean()), 4),
+        }
+
+    def per_document(self) -> List[Dict[str, float]]:
+        """Метрики каждого документа в порядке входа."""
+        return [
+            {"kendall_tau": float(tau), "accuracy": float(acc), "spearman_rho": float(rho)}
+            for tau, acc, rho in zip(
+                self.kendall_tau, self.accuracy, self.spearman_rho, strict=True
+            )
+        ]
+
+    def position_frame(self) -> pd.DataFrame:
+        """Доля ошибок по позициям: ``position`` (с 1), ``error_rate``."""
+        return pd.DataFrame(
+            {
+                "position": np.arange(1, self.position_error_rate.size + 1),
+                "error_rate": self.position_error_rate,
+            }
+        )
+
+    def swap_frame(self) -> pd.DataFrame:
+        """Перестановки пар позиций: ``position_a < position_b``, ``swap_rate``."""
+        rows, cols = np.triu_indices(self.swap_rate.shape[0], k=1)
+        return pd.DataFrame(
+            {
+                "position_a": rows + 1,
+                "position_b": cols + 1,
+                "swap_rate": self.swap_rate[rows, cols],
+            }
+        )
+
+
+def _permutation_breakdown(
+    true_orders: np.ndarray, predicted_orders: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """Разбивки ошибок по документам, где предсказание — перестановка истинных страниц.
+
+    ``documents`` — число таких документов, по которым усреднены доли.
+    """
+    n_pages = true_orders.shape[1]
+    is_permutation = (np.sort(true_orders, axis=1) == np.sort(predicted_orders, axis=1)).all(
+        axis=1
+    )
+    true_orders, predicted_orders = true_orders[is_permutation], predicted_orders[is_permutation]
+    if not len(true_orders):
+        return {
+            "position_error_rate": np.full(n_pages, np.nan),
+            "swap_rate": np.full((n_pages, n_pages), np.nan),
+            "documents": np.asarray(0),
+        }
+
+    # predicted_position[d, i] — куда модель поставила страницу с истинной позиции i
+    predicted_position = (predicted_orders[:, None, :] == true_orders[:, :, None]).argmax(axis=2)
+    swaps = predicted_position[:, :, None] > predicted_position[:, None, :]
+    return {
+        "position_error_rate": (true_orders != predicted_orders).mean(axis=0),
+        "swap_rate": np.triu(swaps.mean(axis=0), k=1),
+        "documents": np.asarray(len(true_orders)),
+    }
+
+
+def _combine_breakdowns(
+    breakdowns: List[Dict[str, np.ndarray]], n_pages: int
+) -> Dict[str, np.ndarray]:
+    """Объединяет разбивки групп разной длины с весом числа документов-перестановок группы.
+
+    Позиции, которых нет в группе (документ короче), в её вес не входят.
+    """
+    position_sum = np.zeros(n_pages)
+    position_weight = np.zeros(n_pages)
+    swap_sum = np.zeros((n_pages, n_pages))
+    swap_weight = np.zeros((n_pages, n_pages))
+    for breakdown in breakdowns:
+        count = int(breakdown["documents"])
+        positions = breakdown["position_error_rate"]
+        swaps = breakdown["swap_rate"]
+        size = positions.size
+        known = np.isfinite(positions)
+        position_sum[:size][known] += positions[known] * count
+        position_weight[:size][known] += count
+        known_swaps = np.isfinite(swaps)
+        swap_sum[:size, :size][known_swaps] += swaps[known_swaps] * count
+        swap_weight[:size, :size][known_swaps] += count
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "position_error_rate": np.where(
+                position_weight > 0, position_sum / position_weight, np.nan
+            ),
+            "swap_rate": np.where(swap_weight > 0, swap_sum / swap_weight, np.nan),
+        }
+
+
+def compute_ordering_metrics(
+    true_orders: Sequence[Sequence[int]], predicted_orders: Sequence[Sequence[int]]
+) -> OrderingMetrics:
+    """Считает метрики порядка для всех документов сразу.
+
+    Документы группируются по числу страниц, и каждая группа считается
+    своей матрицей ``(документы, страницы)``; разбивки ошибок групп затем
+    объединяются по позициям до длины самого длинного документа.
+
+    Args:
+        true_orders (Sequence[Sequence[int]]): Истинные порядки страниц
+            (документы могут иметь разное число страниц) или матрица
+            ``(документы, страницы)``.
+        predicted_orders (Sequence[Sequence[int]]): Предсказанные порядки;
+            предсказания другой длины считаются неверными.
+
+    Returns:
+        OrderingMetrics: Метрики по документам и разбивки ошибок.
+    """
+    n_docs = len(true_orders)
+    lengths = np.array([len(true) for true in true_orders], dtype=np.int64)
+    n_pages = int(lengths.max()) if n_docs else 0
+    valid = np.array(
+        [len(pred) == length for pred, length in zip(predicted_orders, lengths, strict=True)],
+        dtype=bool,
+    )
+
+    kendall = np.full(n_docs, np.nan)
+    spearman = np.full(n_docs, np.nan)
+    accuracy = np.zeros(n_docs)
+    breakdowns: List[Dict[str, np.ndarray]] = []
+
+    for length in np.unique(lengths[valid]):
+        (docs,) = np.nonzero(valid & (lengths == length))
+        x = np.asarray([true_orders[i] for i in docs], dtype=np.int64).reshape(len(docs), length)
+        y = np.asarray([predicted_orders[i] for i in docs], dtype=np.int64).reshape(
+            len(docs), length
+        )
+        kendall[docs] = kendall_tau_b(x, y)
+        spearman[docs] = spearman_rho(x, y)
+        accuracy[docs] = (x == y).all(axis=1)
+        breakdowns.append(_permutation_breakdown(x, y))
+
+    breakdown = _combine_breakdowns(breakdowns, n_pages)
+    return OrderingMetrics(
+        kendall,
+        spearman,
+        accuracy,
+        valid,
+        breakdown["position_error_rate"],
+        breakdown["swap_rate"],
+    )
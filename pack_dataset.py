@@ -0,0 +1,244 @@
+"""Упаковка датасета в несколько больших шардов с индексом смещений.
+
+На сетевом хранилище обход ``dataset/<class>/images/<subset>/`` стоит одной
+метаданных-операции на каждый из десятков тысяч файлов. Команда ``pack``
+складывает все файлы датасета подряд в шарды ``shard-NNNNN.bin`` (порядок —
+класс, сабсет, документ, страница, поэтому сабсет читается последовательно)
+и пишет индекс ``pack_index.json``: имя файла, шард, смещение, размер и
+разобранные из пути класс, сабсет, документ и страницу.
+
+``PackedDataset`` отображает шарды в память и отдаёт содержимое как
+``memoryview`` без копирования. Он реализует тот же интерфейс, что и
+``ZipDataset`` (``index`` + ``read_bytes``), поэтому ``open_dataset``
+открывает упакованный датасет прозрачно для скриптов оценки::
+
+    python pack_dataset.py ./dataset ./dataset.vlmpack
+    # в конфиге: "dataset_path": "./dataset.vlmpack" или "./dataset.vlmpack/passport"
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path, PurePosixPath
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, Union
+
+import click
+
+from dataset_io import ArchiveIndex, ArchivePath
+
+INDEX_NAME = "pack_index.json"
+FORMAT_VERSION = 1
+DEFAULT_SHARD_SIZE_MB = 1024
+
+
+class PackEntry(NamedTuple):
+    """Строка индекса: где лежит файл и что он описывает."""
+
+    name: str
+    shard: int
+    offset: int
+    size: int
+    class_name: str
+    subset: str
+    document: str
+    page: str
+
+
+def parse_member(name: str) -> Dict[str, str]:
+    """Разбирает путь внутри датасета на класс, сабсет, документ и страницу.
+
+    Поддерживаются раскладки классификации (``<class>/images/<subset>/[<doc>/]<file>``)
+    и сортировки страниц (``images/<subset>/<doc>/<page>.jpg``, ``jsons/<doc>.json``).
+    Для остальных файлов поля остаются пустыми.
+    """
+    parts = PurePosixPath(name).parts
+    fields = {"class_name": "", "subset": "", "document": "", "page": ""}
+    for marker in ("images", "jsons"):
+        if marker not in parts:
+            continue
+        position = parts.index(marker)
+        fields["class_name"] = parts[position - 1] if position > 0 else ""
+        rest = parts[position + 1 :]
+        if marker == "images" and rest:
+            fields["subset"], rest = rest[0], rest[1:]
+        if len(rest) >= 2:
+            fields["document"], fields["page"] = rest[-2], PurePosixPath(rest[-1]).stem
+        elif rest:
+            fields["document"] = PurePosixPath(rest[0]).stem
+        break
+    return fields
+
+
+def _walk_files(root: Path) -> Iterator[str]:
+    """Имена файлов относительно ``root`` в отсортированном порядке (через ``os.scandir``)."""
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        with os.scandir(root / relative if relative else root) as entries:
+            children = sorted(entries, key=lambda entry: entry.name)
+        # Директории кладём в стек в обратном порядке, чтобы обходить их по алфавиту
+        directories = []
+        for entry in children:
+            name = f"{relative}/{entry.name}" if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(name)
+            elif entry.is_file():
+                yield name
+        stack.extend(reversed(directories))
+
+
+def pack_dataset(
+    source: Union[str, Path],
+    destination: Union[str, Path],
+    shard_size_mb: int = DEFAULT_SHARD_SIZE_MB,
+) -> Dict[str, Any]:
+    """Упаковывает директорию датасета в шарды с индексом.
+
+    Args:
+        source (Union[str, Path]): Корень датасета.
+        destination (Union[str, Path]): Директория упакованного датасета.
+        shard_size_mb (int): Предельный размер шарда; файл целиком попадает
+            в один шард, поэтому шард может превысить предел на один файл.
+
+    Returns:
+        Dict[str, Any]: Содержимое записанного индекса.
+    """
+    source, destination = Path(source), Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    shard_limit = shard_size_mb * 1024 * 1024
+
+    shards: List[str] = []
+    entries: List[PackEntry] = []
+    shard_file: Optional[IO[bytes]] = None
+    offset = 0
+    try:
+        for name in _walk_files(source):
+            data = (source / name).read_bytes()
+            if shard_file is None or (offset > 0 and offset + len(data) > shard_limit):
+                if shard_file is not None:
+                    shard_file.close()
+                shards.append(f"shard-{len(shards):05d}.bin")
+                shard_file = (destination / shards[-1]).open("wb")
+                offset = 0
+            shard_file.write(data)
+            entries.append(
+                PackEntry(name, len(shards) - 1, offset, len(data), **parse_member(name))
+            )
+            offset += len(data)
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    index = {
+        "version": FORMAT_VERSION,
+        "source": str(source),
+        "shards": shards,
+        "columns": list(PackEntry._fields),
+        "entries": [list(entry) for entry in entries],
+    }
+    tmp_path = destination / f"{INDEX_NAME}.tmp"
+    tmp_path.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, destination / INDEX_NAME)
+    return index
+
+
+def is_packed_dataset(path: Path) -> bool:
+    """Является ли директория упакованным датасетом."""
+    return (path / INDEX_NAME).is_file()
+
+
+class PackedDataset:
+    """Упакованный датасет, читаемый через отображение шардов в память.
+
+    Args:
+        pack_dir (Path): Директория с ``pack_index.json`` и шардами.
+    """
+
+    def __init__(self, pack_dir: Path) -> None:
+        self.pack_dir = Path(pack_dir)
+        index_path = self.pack_dir / INDEX_NAME
+        self._index_mtime_ns = index_path.stat().st_mtime_ns
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Неподдерживаемая версия упакованного датасета: {index.get('version')}"
+            )
+        self.shards: List[str] = index["shards"]
+        self.entries = [PackEntry(*row) for row in index["entries"]]
+        self._positions = {entry.name: i for i, entry in enumerate(self.entries)}
+        self.index = ArchiveIndex([entry.name for entry in self.entries])
+
+        self._files: List[Optional[IO[bytes]]] = [None] * len(self.shards)
+        self._mmaps: List[Optional[mmap.mmap]] = [None] * len(self.shards)
+
+    @property
+    def root(self) -> ArchivePath:
+        """Корень датасета как путь."""
+        return ArchivePath(self, "")
+
+    @property
+    def display_name(self) -> str:
+        return str(self.pack_dir)
+
+    def _shard(self, shard: int) -> mmap.mmap:
+        # Шарды отображаются при первом обращении: сабсет читает обычно один-два шарда
+        shard_map = self._mmaps[shard]
+        if shard_map is None:
+            shard_file = (self.pack_dir / self.shards[shard]).open("rb")
+            self._files[shard] = shard_file
+            shard_map = mmap.mmap(shard_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmaps[shard] = shard_map
+        return shard_map
+
+    def read_bytes(self, name: str) -> memoryview:
+        """Содержимое файла как ``memoryview`` поверх шарда (без копирования)."""
+        entry = self.entries[self._positions[name]]
+        if entry.size == 0:
+            return memoryview(b"")
+        return memoryview(self._shard(entry.shard))[entry.offset : entry.offset + entry.size]
+
+    def member_signature(self, name: str) -> str:
+        """Идентичность файла без чтения данных: датасет, имя, шард, смещение и размер.
+
+        Время изменения индекса входит в подпись, так как переупаковка может
+        сохранить смещения и размеры при другом содержимом.
+        """
+        entry = self.entries[self._positions[name]]
+        return (
+            f"{self.pack_dir.resolve()}:{self._index_mtime_ns}:{name}:"
+            f"{entry.shard}:{entry.offset}:{entry.size}"
+        )
+
+    def close(self) -> None:
+        """Снимает отображения шардов и закрывает файлы."""
+        for i, shard_map in enumerate(self._mmaps):
+            if shard_map is not None:
+                shard_map.close()
+                self._mmaps[i] = None
+        for i, shard_file in enumerate(self._files):
+            if shard_file is not None:
+                shard_file.close()
+                self._files[i] = None
+
+
+@click.command()
+@click.argument("source", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("destination", type=click.Path(file_okay=False, path_type=Path))
+@click.option(
+    "--shard-size-mb",
+    default=DEFAULT_SHARD_SIZE_MB,
+    show_default=True,
+    help="Предельный размер одного шарда в мегабайтах",
+)
+def main(source: Path, destination: Path, shard_size_mb: int) -> None:
+    """Упаковывает датасет SOURCE в шарды с индексом в DESTINATION."""
+    index = pack_dataset(source, destination, shard_size_mb)
+    total = sum(row[3] for row in index["entries"])
+    print(
+        f"✅ Упаковано файлов: {len(index['entries'])}, шардов: {len(index['shards'])}, "
+        f"объём: {total / 1024 / 1024:.1f} МБ → {destination}"
+    )
+
+
+if __name__ == "__main__":
+    main()
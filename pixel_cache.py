@@ -0,0 +1,280 @@
+"""Постоянный кеш предобработанных изображений (``pixel_values``) на диске.
+
+Процессор Qwen2.5-VL на каждом запуске заново декодирует изображение,
+приводит его к своему разрешению, нормализует и режет на патчи, хотя ни
+изображения, ни настройки процессора между запусками не меняются.
+``PixelCache`` сохраняет результат (``pixel_values`` и ``image_grid_thw``)
+в ``.npy``-файлы и при повторном запуске отображает их в память вместо
+декодирования и ресайза.
+
+Кеш разделён по хешу настроек процессора: смена ``min_pixels``/``max_pixels``
+или нормализации автоматически даёт новый раздел. Ключ изображения — путь,
+размер и время изменения файла (для путей), а для ``PIL.Image`` из архива
+или производного сабсета — путь архива, имя члена, размер и CRC (плюс
+сабсет и зерно аугментации), так что ключ считается без декодирования и
+аугментации. Суммарный размер
+ограничен ``max_size_gb``: при превышении удаляются давно не читавшиеся
+записи (время последнего чтения хранится в mtime файла).
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dataset_io import SOURCE_KEY_INFO, path_source_key
+
+DEFAULT_CACHE_DIR = "./pixel_cache"
+DEFAULT_MAX_SIZE_GB = 20.0
+# После вытеснения кеш занимает не больше этой доли лимита, чтобы не чистить его на каждой записи
+EVICTION_TARGET = 0.9
+
+
+@dataclass
+class PixelCacheStats:
+    """Попадания и промахи кеша за запуск."""
+
+    hits: int = 0
+    misses: int = 0
+    evicted: int = 0
+    miss_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evicted": self.evicted,
+            "avg_miss_seconds": round(self.miss_seconds / self.misses, 3) if self.misses else 0.0,
+        }
+
+
+@dataclass
+class _Entry:
+    path: Path
+    grid: Tuple[int, int, int]
+    size: int
+    last_used: float
+
+
+def processor_hash(image_processor: Any) -> str:
+    """Хеш настроек процессора изображений (всё, что влияет на ``pixel_values``)."""
+    settings = image_processor.to_dict() if hasattr(image_processor, "to_dict") else {}
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def image_key(image: Any) -> str:
+    """Ключ изображения без декодирования пикселей, где это возможно.
+
+    Для файлов — путь, размер и mtime; для ``PIL.Image`` из архива или
+    производного сабсета — идентичность источника из ``load_image_for_model``
+    (архив, член, размер и CRC; для производного сабсета ещё сабсет и зерно)
+    вместе с режимом и размером изображения: уменьшенная ``execution_guard``
+    копия наследует ``info``, но получает свой ключ. Остальные ``PIL.Image``
+    ключуются хешем пикселей.
+    """
+    if isinstance(image, (str, Path)):
+        return hashlib.sha1(path_source_key(image).encode("utf-8")).hexdigest()
+    source = getattr(image, "info", {}).get(SOURCE_KEY_INFO)
+    if source is not None:
+        payload = f"{source}:{image.mode}:{image.size}".encode("utf-8")
+        return hashlib.sha1(payload).hexdigest()
+    digest = hashlib.sha1(f"{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class PixelCache:
+    """Кеш ``pixel_values`` одного процессора изображений.
+
+    Args:
+        root (Path): Корневая директория кеша.
+        image_processor (Any): ``processor.image_processor`` модели.
+        max_size_gb (float): Лимит суммарного размера раздела.
+    """
+
+    def __init__(
+        self, root: Path, image_processor: Any, max_size_gb: float = DEFAULT_MAX_SIZE_GB
+    ) -> None:
+        self.image_processor = image_processor
+        self.directory = Path(root) / processor_hash(image_processor)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_gb * 1024**3)
+        self.stats = PixelCacheStats()
+        self._entries = self._scan()
+        self._total_bytes = sum(entry.size for entry in self._entries.values())
+
+    def _scan(self) -> Dict[str, _Entry]:
+        """Читает записи раздела: имя файла ``<key>.<t>x<h>x<w>.npy``."""
+        entries: Dict[str, _Entry] = {}
+        with os.scandir(self.directory) as files:
+            for file in files:
+                key, _, rest = file.name.partition(".")
+                if not rest.endswith(".npy"):
+                    continue
+                try:
+                    t, h, w = (int(value) for value in rest[: -len(".npy")].split("x"))
+                except ValueError:
+                    continue
+                stat = file.stat()
+                entries[key] = _Entry(Path(file.path), (t, h, w), stat.st_size, stat.st_mtime)
+        return entries
+
+    def _compute(self, image: Any) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+        """Предобработка, как в ``qwen_runtime.prepare_inputs`` (qwen_vl_utils + процессор)."""
+        from qwen_vl_utils import process_vision_info  # type: ignore
+
+        image_inputs, _ = process_vision_info(
+            [{"role": "user", "content": [{"type": "image", "image": image}]}]
+        )
+        output = self.image_processor(images=image_inputs, return_tensors="np")
+        grid = tuple(int(value) for value in output["image_grid_thw"][0])
+        return np.ascontiguousarray(output["pixel_values"]), grid  # type: ignore[return-value]
+
+    def _store(self, key: str, pixels: np.ndarray, grid: Tuple[int, int, int]) -> None:
+        path = self.directory / f"{key}.{grid[0]}x{grid[1]}x{grid[2]}.npy"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("wb") as f:
+            np.save(f, pixels)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        self._entries[key] = _Entry(path, grid, size, time.time())
+        self._total_bytes += size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Удаляет давно не читавшиеся записи, пока размер не опустится ниже цели."""
+        target = self.max_bytes * EVICTION_TARGET
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1].last_used):
+            if self._total_bytes <= target:
+                break
+            try:
+                entry.path.unlink()
+            except FileNotFoundError:
+                # Запись уже удалил другой процесс
+                pass
+            self._total_bytes -= entry.size
+            del self._entries[key]
+            self.stats.evicted += 1
+
+    def get(self, image: Any) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+        """Предобработанные патчи изображения и его сетка ``(t, h, w)``.
+
+        Args:
+            image (Any): Путь к файлу или ``PIL.Image``.
+
+        Returns:
+            Tuple[np.ndarray, Tuple[int, int, int]]: ``pixel_values``
+            (при попадании — отображение файла в память) и ``image_grid_thw``.
+        """
+        key = image_key(image)
+        entry = self._entries.get(key)
+        if entry is not None and entry.path.exists():
+            self.stats.hits += 1
+            entry.last_used = time.time()
+            os.utime(entry.path, (entry.last_used, entry.last_used))
+            return np.load(entry.path, mmap_mode="r"), entry.grid
+
+        self.stats.misses += 1
+        start = time.perf_counter()
+        pixels, grid = self._compute(image)
+        self._store(key, pixels, grid)
+        self.stats.miss_seconds += time.perf_counter() - start
+        return pixels, grid
+
+    def build_inputs(self, processor: Any, texts: Sequence[str], images: Sequence[Any]) -> Any:
+        """Собирает входы модели из текстов chat template и закешированных патчей.
+
+        Повторяет то, что делает процессор Qwen2.5-VL: каждый токен
+        ``<|image_pad|>`` в тексте разворачивается в столько токенов,
+        сколько патчей изображения остаётся после слияния ``merge_size²``.
+        Изображения сопоставляются местам под них по порядку во всех текстах.
+        """
+        import torch  # type: ignore
+        from transformers import BatchFeature  # type: ignore
+
+        pixels: List[np.ndarray] = []
+        grids: List[Tuple[int, int, int]] = []
+        for image in images:
+            image_pixels, grid = self.get(image)
+            pixels.append(image_pixels)
+            grids.append(grid)
+
+        image_token = getattr(processor, "image_token", "<|image_pad|>")
+        merge_length = self.image_processor.merge_size**2
+        slots = sum(text.count(image_token) for text in texts)
+        if slots != len(grids):
+            raise ValueError(f"В текстах {slots} мест под изображения, передано {len(grids)}")
+        remaining = iter(grids)
+        expanded_texts = []
+        for text in texts:
+            pieces = text.split(image_token)
+            expanded = [pieces[0]]
+            for piece in pieces[1:]:
+                expanded.append(image_token * (int(np.prod(next(remaining))) // merge_length))
+                expanded.append(piece)
+            expanded_texts.append("".join(expanded))
+
+        inputs = dict(processor.tokenizer(expanded_texts, return_tensors="pt", padding=True))
+        inputs["pixel_values"] = torch.from_numpy(np.concatenate(pixels))
+        inputs["image_grid_thw"] = torch.tensor(grids, dtype=torch.long)
+        return BatchFeature(data=inputs)
+
+
+_CACHE: Optional[PixelCache] = None
+
+
+def get_pixel_cache() -> Optional[PixelCache]:
+    """Кеш текущего запуска или ``None``, если он не включён."""
+    return _CACHE
+
+
+def enable_pixel_cache(model: Any, cache_config: Optional[Dict[str, Any]] = None) -> Any:
+    """Включает кеш ``pixel_values`` для модели по секции ``pixel_cache`` конфига.
+
+    Поддерживаемые ключи: ``enabled`` (по умолчанию ``false``), ``dir``,
+    ``max_size_gb``, ``max_new_tokens``. Вызовы ``predict_on_image(s)`` переключаются на
+    ``qwen_runtime.generate``, который берёт входы из кеша; обёртки без
+    доступа к HF-модели и процессору работают как раньше.
+    """
+    global _CACHE
+    from qwen_runtime import DEFAULT_MAX_NEW_TOKENS, generate, supports_direct_generation
+
+    cache_config = cache_config or {}
+    if not cache_config.get("enabled", False):
+        return model
+    if not supports_direct_generation(model):
+        print("⚠️  pixel_cache: у обёртки нет model/processor, кеш изображений отключён")
+        return model
+
+    _CACHE = PixelCache(
+        Path(cache_config.get("dir", DEFAULT_CACHE_DIR)),
+        model.processor.image_processor,
+        max_size_gb=float(cache_config.get("max_size_gb", DEFAULT_MAX_SIZE_GB)),
+    )
+    max_new_tokens = int(cache_config.get("max_new_tokens", DEFAULT_MAX_NEW_TOKENS))
+
+    def predict_on_image(image: Any, prompt: str) -> str:
+        return generate(model, [image], prompt, max_new_tokens=max_new_tokens).text
+
+    def predict_on_images(images: Sequence[Any], prompt: str) -> str:
+        return generate(model, list(images), prompt, max_new_tokens=max_new_tokens).text
+
+    model.predict_on_image = predict_on_image
+    model.predict_on_images = predict_on_images
+    return model
+
+
+def pixel_cache_report() -> Optional[Dict[str, Any]]:
+    """Статистика кеша за запуск, если он включён и использовался."""
+    if _CACHE is None or not (_CACHE.stats.hits or _CACHE.stats.misses):
+        return None
+    return _CACHE.stats.as_dict()
@@ -0,0 +1,251 @@
+"""Общий KV-кеш текстового префикса промпта для всех изображений запуска.
+
+В классификации и оптимизации промпта каждое изображение отправляется с
+одним и тем же промптом. Если поставить текст перед изображением (раскладка
+``text_first`` из ``qwen_runtime``), начало последовательности — системный
+промпт, шаблон чата и текст — совпадает у всех запросов. ``PrefixCache``
+считает KV-кеш этого префикса один раз, а для каждого изображения выполняет
+prefill только хвоста (изображение и текст после него) и жадное декодирование.
+
+После вызова кеш обрезается обратно до длины префикса (``DynamicCache.crop``),
+поэтому копировать его между запросами не нужно.
+"""
+
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from qwen_runtime import (
+    DEFAULT_MAX_NEW_TOKENS,
+    eos_token_ids,
+    prepare_inputs,
+    supports_direct_generation,
+)
+
+DEFAULT_MAX_ENTRIES = 4
+
+
+@dataclass
+class PrefixCacheStats:
+    """Сколько prefill-вычислений сэкономлено за запуск.
+
+    Время сэкономленного prefill не измеряется, а оценивается по средней
+    стоимости построения префикса, поэтому ключ помечен ``estimated_``.
+    """
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    prefix_builds: int = 0
+    prefix_build_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = max(self.calls, 1)
+        reused_calls = max(self.calls - self.prefix_builds, 0)
+        avg_build = self.prefix_build_seconds / self.prefix_builds if self.prefix_builds else 0.0
+        return {
+            "calls": self.calls,
+            "prefix_builds": self.prefix_builds,
+            "avg_prompt_tokens": round(self.prompt_tokens / calls, 1),
+            "avg_cached_tokens": round(self.cached_tokens / calls, 1),
+            "cached_share": round(self.cached_tokens / max(self.prompt_tokens, 1), 3),
+            # Оценка: каждый повторный вызов сэкономил столько же, сколько стоил prefill префикса
+            "estimated_saved_prefill_seconds": round(avg_build * reused_calls, 2),
+        }
+
+
+@dataclass
+class _PrefixEntry:
+    cache: Any
+    length: int
+
+
+class PrefixCache:
+    """Генерация с переиспользованием KV-кеша общего текстового префикса.
+
+    Args:
+        model (Any): Обёртка модели, для которой ``supports_direct_generation``.
+        max_entries (int): Сколько разных префиксов держать в памяти (LRU).
+        max_new_tokens (int): Лимит новых токенов на ответ.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    ) -> None:
+        self.model = model
+        self.max_entries = max_entries
+        self.max_new_tokens = max_new_tokens
+        self.stats = PrefixCacheStats()
+        self._entries: "OrderedDict[str, _PrefixEntry]" = OrderedDict()
+        self._eos_ids = set(eos_token_ids(model))
+
+    def _rope_index(self, input_ids: Any, image_grid_thw: Any, attention_mask: Any) -> Any:
+        hf_model = self.model.model
+        get_rope_index = getattr(hf_model, "get_rope_index", None)
+        if get_rope_index is None:
+            get_rope_index = hf_model.model.get_rope_index
+        position_ids, _ = get_rope_index(
+            input_ids=input_ids,
+            image_grid_thw=image_grid_thw,
+            video_grid_thw=None,
+            attention_mask=attention_mask,
+        )
+        return position_ids
+
+    def _get_prefix(
+        self, input_ids: Any, position_ids: Any, attention_mask: Any, length: int
+    ) -> _PrefixEntry:
+        import torch  # type: ignore
+
+        prefix_ids = input_ids[0, :length]
+        key = hashlib.sha1(prefix_ids.cpu().numpy().tobytes()).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output = self.model.model(
+                input_ids=input_ids[:, :length],
+                attention_mask=attention_mask[:, :length],
+                position_ids=position_ids[..., :length],
+                use_cache=True,
+            )
+        self.stats.prefix_builds += 1
+        self.stats.prefix_build_seconds += time.perf_counter() - start
+
+        entry = _PrefixEntry(cache=output.past_key_values, length=length)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def generate(
+        self,
+        images: Sequence[Any],
+        prompt: str,
+        logits_processor: Optional[List[Any]] = None,
+        stopping_criteria: Optional[List[Any]] = None,
+    ) -> Optional[str]:
+        """Генерирует ответ, переиспользуя кеш префикса.
+
+        Returns:
+            Optional[str]: Текст ответа или ``None``, если в запросе нет
+            изображения и общий префикс выделить нельзя.
+        """
+        import torch  # type: ignore
+
+        hf_model = self.model.model
+        inputs = prepare_inputs(self.model, images, prompt, text_first=True)
+        input_ids, attention_mask = inputs["input_ids"], inputs["attention_mask"]
+        starts = (input_ids[0] == hf_model.config.vision_start_token_id).nonzero()
+        if len(starts) == 0:
+            return None
+        prefix_length = int(starts[0])
+        position_ids = self._rope_index(input_ids, inputs.get("image_grid_thw"), attention_mask)
+        entry = self._get_prefix(input_ids, position_ids, attention_mask, prefix_length)
+        cache = entry.cache if hasattr(entry.cache, "crop") else copy.deepcopy(entry.cache)
+
+        total_length = input_ids.shape[1]
+        self.stats.calls += 1
+        self.stats.prompt_tokens += total_length
+        self.stats.cached_tokens += prefix_length
+
+        generated: List[int] = []
+        try:
+            with torch.inference_mode():
+                # Prefill только хвоста: изображение и текст после него
+                output = hf_model(
+                    input_ids=input_ids[:, prefix_length:],
+                    attention_mask=attention_mask,
+                    position_ids=position_ids[..., prefix_length:],
+                    pixel_values=inputs["pixel_values"],
+                    image_grid_thw=inputs["image_grid_thw"],
+                    past_key_values=cache,
+                    cache_position=torch.arange(
+                        prefix_length, total_length, device=input_ids.device
+                    ),
+                    use_cache=True,
+                )
+                # Текст после изображения: все три оси M-RoPE растут синхронно
+                next_position = position_ids[..., -1:].max() + 1
+                sequence = input_ids
+                for step in range(self.max_new_tokens):
+                    logits = output.logits[:, -1, :]
+                    for processor in logits_processor or []:
+                        logits = processor(sequence, logits)
+                    token = logits.argmax(dim=-1, keepdim=True)
+                    sequence = torch.cat([sequence, token], dim=1)
+                    generated.append(int(token))
+                    if int(token) in self._eos_ids:
+                        break
+                    if any(bool(c(sequence, logits).all()) for c in stopping_criteria or []):
+                        break
+                    attention_mask = torch.cat(
+                        [attention_mask, attention_mask.new_ones((1, 1))], dim=1
+                    )
+                    output = hf_model(
+                        input_ids=token,
+                        attention_mask=attention_mask,
+                        position_ids=(next_position + step).view(1, 1, 1).expand(3, 1, 1),
+                        past_key_values=cache,
+                        cache_position=torch.tensor([sequence.shape[1] - 1], device=token.device),
+                        use_cache=True,
+                    )
+        finally:
+            if hasattr(cache, "crop"):
+                # Возвращаем общий кеш к состоянию «только префикс»
+                cache.crop(entry.length)
+
+        return self.model.processor.tokenizer.decode(generated, skip_special_tokens=True)
+
+
+def enable_prefix_cache(model: Any, prefix_config: Optional[Dict[str, Any]] = None) -> Any:
+    """Подменяет ``predict_on_image(s)`` обёртки генерацией с кешем префикса.
+
+    Поддерживаемые ключи секции ``prefix_cache``: ``enabled`` (по умолчанию
+    ``false``), ``max_entries``, ``max_new_tokens``. Запросы без изображений
+    и модели без доступа к HF-модели обрабатываются исходными методами.
+    """
+    prefix_config = prefix_config or {}
+    if not prefix_config.get("enabled", False):
+        return model
+    if not supports_direct_generation(model):
+        print("⚠️  prefix_cache: у обёртки нет model/processor, кеш префикса отключён")
+        return model
+
+    cache = PrefixCache(
+        model,
+        max_entries=int(prefix_config.get("max_entries", DEFAULT_MAX_ENTRIES)),
+        max_new_tokens=int(prefix_config.get("max_new_tokens", DEFAULT_MAX_NEW_TOKENS)),
+    )
+    original_single = model.predict_on_image
+    original_multi = model.predict_on_images
+
+    def predict_on_image(image: Any, prompt: str) -> str:
+        result = cache.generate([image], prompt)
+        return original_single(image=image, prompt=prompt) if result is None else result
+
+    def predict_on_images(images: Sequence[Any], prompt: str) -> str:
+        result = cache.generate(list(images), prompt) if images else None
+        return original_multi(images=images, prompt=prompt) if result is None else result
+
+    model.predict_on_image = predict_on_image
+    model.predict_on_images = predict_on_images
+    model.prefix_cache = cache
+    return model
+
+
+def prefix_cache_report(model: Any) -> Optional[Dict[str, Any]]:
+    """Статистика кеша префикса, если он включён для модели."""
+    cache = getattr(model, "prefix_cache", None)
+    if cache is None or not cache.stats.calls:
+        return None
+    return cache.stats.as_dict()
@@ -0,0 +1,359 @@
+"""Прямая генерация Qwen2.5-VL с управлением декодированием.
+
+Обёртки из ``model_qwen2_5_vl`` дают только ``predict_on_image(s)`` и не
+принимают критерии остановки или обработчики логитов. Этот модуль строит
+входы так же, как обёртка (chat template + ``qwen_vl_utils``), и вызывает
+``generate`` у HF-модели (атрибуты ``model`` и ``processor`` обёртки).
+
+Если у обёртки нет этих атрибутов, ``supports_direct_generation`` вернёт
+False — вызывающий код должен использовать обычный ``predict_on_images``.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from pixel_cache import get_pixel_cache
+from tracing import model_call
+
+DEFAULT_MAX_NEW_TOKENS = 512
+# Место изображения в шаблоне промпта (см. ``build_messages(text_first=True)``)
+IMAGE_MARKER = "<image>"
+
+
+@dataclass
+class GenerationResult:
+    """Результат одного вызова ``generate``."""
+
+    text: str
+    new_tokens: int
+    stopped_early: bool
+
+
+@dataclass
+class GenerationStats:
+    """Накопленная статистика прямых вызовов генерации за запуск."""
+
+    calls: int = 0
+    new_tokens: int = 0
+    stopped_early: int = 0
+
+    def add(self, result: GenerationResult) -> None:
+        self.calls += 1
+        self.new_tokens += result.new_tokens
+        self.stopped_early += int(result.stopped_early)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "avg_new_tokens": round(self.new_tokens / self.calls, 1) if self.calls else 0.0,
+            "stopped_early": self.stopped_early,
+        }
+
+
+_STATS = GenerationStats()
+
+
+def get_generation_stats() -> GenerationStats:
+    """Статистика генерации текущего запуска."""
+    return _STATS
+
+
+def supports_direct_generation(model: Any) -> bool:
+    """Есть ли у обёртки HF-модель и процессор для прямого ``generate``."""
+    hf_model = getattr(model, "model", None)
+    return (
+        hf_model is not None
+        and callable(getattr(hf_model, "generate", None))
+        and getattr(model, "processor", None) is not None
+    )
+
+
+def build_messages(
+    images: Sequence[Any], prompt: str, system_prompt: str = "", text_first: bool = False
+) -> List[Dict[str, Any]]:
+    """Сообщения chat template.
+
+    По умолчанию изображения идут перед текстом промпта, как в обёртке.
+    При ``text_first`` текст ставится перед изображениями, чтобы начало
+    последовательности совпадало у всех запросов с одним промптом; если в
+    промпте есть маркер ``<image>``, изображения вставляются на его место.
+    """
+    image_parts = [{"type": "image", "image": image} for image in images]
+    if text_first:
+        before, _, after = prompt.partition(IMAGE_MARKER)
+        content: List[Dict[str, Any]] = []
+        if before.strip():
+            content.append({"type": "text", "text": before})
+        content.extend(image_parts)
+        if after.strip():
+            content.append({"type": "text", "text": after})
+    else:
+        content = [*image_parts, {"type": "text", "text": prompt}]
+    messages: List[Dict[str, Any]] = []
+    if system_prompt:
+        messages.append({"role": "system", "content": [{"type": "text", "text": system_prompt}]})
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def prepare_inputs(
+    model: Any, images: Sequence[Any], prompt: str, text_first: bool = False
+) -> Any:
+    """Токенизирует промпт и изображения так же, как ``predict_on_images``.
+
+    Если включён ``pixel_cache``, патчи изображений берутся из него без
+    декодирования и ресайза.
+
+    Args:
+        model (Any): Обёртка модели (``model.model`` и ``model.processor``).
+        images (Sequence[Any]): Пути к файлам или ``PIL.Image``.
+        prompt (str): Текст промпта.
+        text_first (bool): Раскладка «текст перед изображением» (см. ``build_messages``).
+
+    Returns:
+        Any: ``BatchFeature`` на устройстве модели.
+    """
+    return prepare_batch_inputs(model, [(images, prompt)], text_first=text_first)
+
+
+def prepare_batch_inputs(
+    model: Any, requests: Sequence[Tuple[Sequence[Any], str]], text_first: bool = False
+) -> Any:
+    """Входы для пакета запросов ``(изображения, промпт)`` с паддингом слева.
+
+    Returns:
+        Any: ``BatchFeature`` на устройстве модели, строка на запрос.
+    """
+    from qwen_vl_utils import process_vision_info  # type: ignore
+
+    system_prompt = getattr(model, "system_prompt", "") or ""
+    conversations = [
+        build_messages(images, prompt, system_prompt, text_first=text_first)
+        for images, prompt in requests
+    ]
+    texts = [
+        model.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        for messages in conversations
+    ]
+    tokenizer = model.processor.tokenizer
+    padding_side = tokenizer.padding_side
+    # Для генерации пакетом новые токены должны идти сразу после промпта каждой строки
+    tokenizer.padding_side = "left"
+    try:
+        all_images = [image for images, _ in requests for image in images]
+        pixel_cache = get_pixel_cache()
+        if pixel_cache is not None and all_images:
+            inputs = pixel_cache.build_inputs(model.processor, texts, all_images)
+        else:
+            image_inputs, video_inputs = process_vision_info(conversations)
+            inputs = model.processor(
+                text=texts,
+                images=image_inputs,
+                videos=video_inputs,
+                padding=True,
+                return_tensors="pt",
+            )
+    finally:
+        tokenizer.padding_side = padding_side
+    return inputs.to(model.model.device)
+
+
+def generate(
+    model: Any,
+    images: Sequence[Any],
+    prompt: str,
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    stopping_criteria: Optional[List[Any]] = None,
+    logits_processor: Optional[List[Any]] = None,
+    inputs: Optional[Any] = None,
+    **generate_kwargs: Any,
+) -> GenerationResult:
+    """Генерирует ответ с пользовательскими критериями остановки и логит-процессорами.
+
+    Args:
+        model (Any): Обёртка модели, для которой ``supports_direct_generation``.
+        images (Sequence[Any]): Изображения запроса.
+        prompt (str): Текст промпта.
+        max_new_tokens (int): Лимит новых токенов.
+        stopping_criteria (Optional[List[Any]]): Критерии остановки. Если
+            критерию нужна длина входа, подготовьте ``inputs`` заранее.
+        logits_processor (Optional[List[Any]]): Обработчики логитов.
+        inputs (Optional[Any]): Уже подготовленные входы (иначе ``prepare_inputs``).
+        **generate_kwargs: Дополнительные аргументы ``generate``.
+
+    Returns:
+        GenerationResult: Текст ответа и число сгенерированных токенов.
+    """
+    import torch  # type: ignore
+    from transformers import LogitsProcessorList, StoppingCriteriaList  # type: ignore
+
+    if inputs is None:
+        inputs = prepare_inputs(model, images, prompt)
+    prompt_length = inputs["input_ids"].shape[1]
+
+    with model_call(model, "model.generate"), torch.inference_mode():
+        output_ids = model.model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            stopping_criteria=StoppingCriteriaList(stopping_criteria or []),
+            logits_processor=LogitsProcessorList(logits_processor or []),
+            **generate_kwargs,
+        )
+
+    new_ids = output_ids[0, prompt_length:]
+    eos_token_id = model.processor.tokenizer.eos_token_id
+    finished_by_eos = len(new_ids) > 0 and int(new_ids[-1]) == eos_token_id
+    result = GenerationResult(
+        text=model.processor.tokenizer.decode(new_ids, skip_special_tokens=True),
+        new_tokens=int(new_ids.shape[0]),
+        stopped_early=bool(stopping_criteria)
+        and not finished_by_eos
+        and int(new_ids.shape[0]) < max_new_tokens,
+    )
+    _STATS.add(result)
+    return result
+
+
+def generate_batch(
+    model: Any,
+    requests: Sequence[Tuple[Sequence[Any], str]],
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    logits_processor: Optional[List[Any]] = None,
+    inputs: Optional[Any] = None,
+    text_first: bool = False,
+) -> List[GenerationResult]:
+    """Генерирует ответы на пакет запросов ``(изображения, промпт)`` одним вызовом ``generate``.
+
+    Args:
+        model (Any): Обёртка модели, для которой ``supports_direct_generation``.
+        requests (Sequence[Tuple[Sequence[Any], str]]): Запросы пакета.
+        max_new_tokens (int): Лимит новых токенов.
+        logits_processor (Optional[List[Any]]): Обработчики логитов (должны
+            поддерживать пакет).
+        inputs (Optional[Any]): Уже подготовленные входы (иначе ``prepare_batch_inputs``).
+        text_first (bool): Раскладка «текст перед изображением».
+
+    Returns:
+        List[GenerationResult]: Результаты в порядке запросов.
+    """
+    import torch  # type: ignore
+    from transformers import LogitsProcessorList  # type: ignore
+
+    if inputs is None:
+        inputs = prepare_batch_inputs(model, requests, text_first=text_first)
+    prompt_length = inputs["input_ids"].shape[1]
+
+    with model_call(model, "model.generate"), torch.inference_mode():
+        output_ids = model.model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            logits_processor=LogitsProcessorList(logits_processor or []),
+        )
+
+    tokenizer = model.processor.tokenizer
+    pad_token_id = tokenizer.pad_token_id
+    results = []
+    for row in output_ids[:, prompt_length:]:
+        # Завершившиеся раньше строки дополнены pad-токенами до общей длины
+        new_tokens = int((row != pad_token_id).sum()) if pad_token_id is not None else len(row)
+        result = GenerationResult(
+            text=tokenizer.decode(row, skip_special_tokens=True),
+            new_tokens=new_tokens,
+            stopped_early=False,
+        )
+        _STATS.add(result)
+        results.append(result)
+    return results
+
+
+def eos_token_ids(model: Any) -> List[int]:
+    """Токены завершения генерации из ``generation_config`` модели."""
+    eos = getattr(getattr(model.model, "generation_config", None), "eos_token_id", None)
+    if eos is None:
+        eos = model.processor.tokenizer.eos_token_id
+    return list(eos) if isinstance(eos, (list, tuple)) else [eos]
+
+
+def predict_json(
+    model: Any,
+    images: Sequence[Any],
+    prompt: str,
+    schema: Dict[str, Any],
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+) -> Dict[str, Any]:
+    """Генерирует ответ, ограниченный JSON-схемой, и возвращает разобранный объект.
+
+    Маски токенов строятся ``constrained_decoding`` и кешируются по состояниям
+    схемы, поэтому повторные вызовы с той же схемой не пересчитывают их.
+
+    Args:
+        model (Any): Обёртка модели, для которой ``supports_direct_generation``.
+        images (Sequence[Any]): Изображения запроса.
+        prompt (str): Текст промпта.
+        schema (Dict[str, Any]): JSON-схема ответа (например, из pydantic).
+        max_new_tokens (int): Лимит новых токенов.
+
+    Returns:
+        Dict[str, Any]: Объект, соответствующий схеме.
+
+    Raises:
+        ValueError: Лимит токенов исчерпан до закрытия объекта.
+    """
+    from constrained_decoding import JsonSchemaLogitsProcessor, get_schema_guide
+
+    guide = get_schema_guide(model.processor.tokenizer, schema, eos_token_ids(model))
+    inputs = prepare_inputs(model, images, prompt)
+    result = generate(
+        model,
+        images,
+        prompt,
+        max_new_tokens=max_new_tokens,
+        logits_processor=[JsonSchemaLogitsProcessor(guide, inputs["input_ids"].shape[1])],
+        inputs=inputs,
+    )
+    try:
+        return json.loads(result.text)
+    except json.JSONDecodeError as e:
+        raise ValueError(
+            f"Ответ не завершён за {max_new_tokens} токенов: {result.text[:200]!r}"
+        ) from e
+
+
+def predict_json_batch(
+    model: Any,
+    requests: Sequence[Tuple[Sequence[Any], str]],
+    schemas: Sequence[Dict[str, Any]],
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    text_first: bool = False,
+) -> List[Union[Dict[str, Any], ValueError]]:
+    """Пакетный ``predict_json``: у каждого запроса своя схема.
+
+    Returns:
+        List[Union[Dict[str, Any], ValueError]]: Разобранный объект или
+        ``ValueError`` для строк, не завершённых за ``max_new_tokens``, —
+        ошибка одной строки не отменяет остальные.
+    """
+    from constrained_decoding import BatchJsonSchemaLogitsProcessor, get_schema_guide
+
+    eos_ids = eos_token_ids(model)
+    guides = [get_schema_guide(model.processor.tokenizer, schema, eos_ids) for schema in schemas]
+    inputs = prepare_batch_inputs(model, requests, text_first=text_first)
+    results = generate_batch(
+        model,
+        requests,
+        max_new_tokens=max_new_tokens,
+        logits_processor=[BatchJsonSchemaLogitsProcessor(guides, inputs["input_ids"].shape[1])],
+        inputs=inputs,
+    )
+    parsed: List[Union[Dict[str, Any], ValueError]] = []
+    for result in results:
+        try:
+            parsed.append(json.loads(result.text))
+        except json.JSONDecodeError:
+            parsed.append(
+                ValueError(f"Ответ не завершён за {max_new_tokens} токенов: {result.text[:200]!r}")
+            )
+    return parsed
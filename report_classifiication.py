@@ -1,13 +1,18 @@
 # Новый скрипт для генерации отчёта классификации
 import warnings
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd  # type: ignore
 from bench_utils.utils import get_run_id, load_config  # type: ignore
 
+from artifact_store import DEFAULT_ROOT, RunArtifactStore, find_latest_run
+
 HEADER = "# 📝 Отчёт по задаче классификации"
+METRIC_COLUMNS = ["accuracy", "f1", "precision", "recall"]
+CLASS_REPORT_COLUMNS = ["precision", "recall", "f1-score", "support"]
 
 
 def _metrics_row_to_md(metrics: Dict[str, float]) -> str:
@@ -42,9 +47,92 @@ def _append_md_section(lines: List[str], title: str) -> None:
     lines.extend(["", f"## {title}", ""])
 
 
+@dataclass
+class RunArtifacts:
+    """Артефакты запуска, необходимые для отчёта."""
+
+    final_metrics: Optional[Dict[str, float]] = None
+    subset_metrics: List[Tuple[str, Dict[str, float]]] = field(default_factory=list)
+    class_reports: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    confusion_matrices: Dict[str, pd.DataFrame] = field(default_factory=dict)
+
+
+def _load_from_store(store: RunArtifactStore, subsets: List[str]) -> RunArtifacts:
+    """Читает из хранилища только колонки и сабсеты, которые попадут в отчёт."""
+    artifacts = RunArtifacts()
+
+    final_df = store.read_table("final_classification_results", columns=METRIC_COLUMNS)
+    if not final_df.empty:
+        artifacts.final_metrics = final_df.iloc[0].to_dict()
+
+    metrics_df = store.read_table("classification_results", columns=METRIC_COLUMNS, subsets=subsets)
+    for subset in subsets:
+        rows = metrics_df[metrics_df["subset"] == subset] if not metrics_df.empty else metrics_df
+        if not rows.empty:
+            artifacts.subset_metrics.append((subset, rows.iloc[0].to_dict()))
+
+    report_df = store.read_table(
+        "class_report",
+        columns=CLASS_REPORT_COLUMNS,
+        subsets=["overall", *subsets],
+        restore_index=True,
+    )
+    for subset, group in report_df.groupby("subset", sort=False) if not report_df.empty else []:
+        artifacts.class_reports[subset] = group.drop(columns="subset")
+
+    # Колонки матрицы ошибок — это метки классов, поэтому читаем её целиком
+    cm_df = store.read_table("confusion_matrix", subsets=subsets, restore_index=True)
+    for subset, group in cm_df.groupby("subset", sort=False) if not cm_df.empty else []:
+        artifacts.confusion_matrices[subset] = (
+            group.drop(columns="subset").dropna(axis=1, how="all").astype("int64")
+        )
+    return artifacts
+
+
+def _find_csv_run_id(model_name: str, model_name_clean: str, prompt_name: str) -> str:
+    """Определяет run_id по CSV-файлам старого формата в текущей директории."""
+    pattern = f"{model_name_clean}_{prompt_name}_*_final_classification_results.csv"
+    candidate_files = sorted(Path(".").glob(pattern))
+    if candidate_files:
+        # Берём самый новый (по имени, так как timestamp входит в имя)
+        return candidate_files[-1].stem.replace("_final_classification_results", "")
+    # Фоллбэк — без timestamp (совместимость)
+    return get_run_id(model_name)  # type: ignore
+
+
+def _load_from_csv(run_id: str, subsets: List[str]) -> RunArtifacts:
+    """Читает артефакты запусков, сохранённых до появления хранилища."""
+    artifacts = RunArtifacts()
+
+    final_metrics_file = Path(f"{run_id}_final_classification_results.csv")
+    if final_metrics_file.exists():
+        artifacts.final_metrics = pd.read_csv(final_metrics_file).iloc[0].to_dict()
+
+    for subset in subsets:
+        metrics_file = Path(f"{run_id}_{subset}_classification_results.csv")
+        if metrics_file.exists():
+            df = pd.read_csv(metrics_file)
+            if not df.empty:
+                artifacts.subset_metrics.append((subset, df.iloc[0].to_dict()))
+
+    for subset in ["overall", *subsets]:
+        class_rep_file = Path(f"{run_id}_{subset}_class_report.csv")
+        if class_rep_file.exists():
+            artifacts.class_reports[subset] = pd.read_csv(class_rep_file, index_col=0)
+
+    for subset in subsets:
+        cm_file = Path(f"{run_id}_{subset}_confusion_matrix.csv")
+        if cm_file.exists():
+            artifacts.confusion_matrices[subset] = pd.read_csv(cm_file, index_col=0)
+    return artifacts
+
+
 def build_report(config_path: Path, output_path: Path) -> None:
     """Формирует файл отчёта на основании результатов `check_classifiication.py`.
 
+    Артефакты берутся из последнего подходящего запуска в хранилище
+    (``artifacts.root`` в конфиге), а при его отсутствии — из CSV старого формата.
+
     Параметры:
         config_path: путь к конфигурационному JSON, использованному при запуске оценки.
         output_path: путь для сохранения итогового markdown-файла.
@@ -92,72 +180,51 @@ def build_report(config_path: Path, output_path: Path) -> None:
     for k, v in document_classes.items():
         md_lines.append(f"| {k} | {v} |")
 
-    # --- Определяем run_id по имеющимся CSV-файлам ---
+    # --- Определяем запуск: сначала хранилище артефактов, затем старые CSV ---
     model_name_clean = model_cfg["model_name"].replace(" ", "_")
     prompt_name = Path(prompt_path).stem if prompt_path else "prompt"
+    subsets: List[str] = task_cfg.get("subsets", [])
 
-    pattern = f"{model_name_clean}_{prompt_name}_*_final_classification_results.csv"
-    candidate_files = sorted(Path(".").glob(pattern))
-    if candidate_files:
-        # Берём самый новый (по имени, так как timestamp входит в имя)
-        latest_file = candidate_files[-1]
-        run_id = latest_file.stem.replace("_final_classification_results", "")
+    artifacts_root = config.get("artifacts", {}).get("root", DEFAULT_ROOT)
+    run_dir = find_latest_run(artifacts_root, f"{model_name_clean}_{prompt_name}_")
+    if run_dir is not None:
+        artifacts = _load_from_store(RunArtifactStore.open(run_dir), subsets)
     else:
-        # Фоллбэк — без timestamp (совместимость)
-        run_id = get_run_id(model_cfg["model_name"])  # type: ignore
+        run_id = _find_csv_run_id(model_cfg["model_name"], model_name_clean, prompt_name)
+        artifacts = _load_from_csv(run_id, subsets)
 
     # --- Итоговые метрики ---
-    final_metrics_file = Path(f"{run_id}_final_classification_results.csv")
-    if final_metrics_file.exists():
-        final_df = pd.read_csv(final_metrics_file)
-        final_metrics = final_df.iloc[0].to_dict()
+    if artifacts.final_metrics:
         _append_md_section(md_lines, "Итоговые метрики")
         md_lines.append("| Accuracy | F1-score | Precision | Recall |")
         md_lines.append("|----------|---------|-----------|--------|")
-        md_lines.append(_metrics_row_to_md(final_metrics))
+        md_lines.append(_metrics_row_to_md(artifacts.final_metrics))
 
     # --- Метрики по сабсетам ---
-    subset_metrics: List[Tuple[str, Dict[str, float]]] = []
-    for subset in task_cfg.get("subsets", []):
-        metrics_file = Path(f"{run_id}_{subset}_classification_results.csv")
-        if metrics_file.exists():
-            df = pd.read_csv(metrics_file)
-            if not df.empty:
-                subset_metrics.append((subset, df.iloc[0].to_dict()))
-
-    if subset_metrics:
+    if artifacts.subset_metrics:
         _append_md_section(md_lines, "Метрики по сабсетам")
         md_lines.append("| Сабсет | Accuracy | F1-score | Precision | Recall |")
         md_lines.append("|--------|----------|---------|-----------|--------|")
-        for subset, metrics in subset_metrics:
+        for subset, metrics in artifacts.subset_metrics:
             row = _metrics_row_to_md(metrics)
             md_lines.append(f"| {subset} {row[1:]}")  # удаляем первый символ '|' у row
 
-    # --- Метрики по документам (overall) ---
-    overall_class_report = Path(f"{run_id}_overall_class_report.csv")
-    if overall_class_report.exists():
-        df_overall = pd.read_csv(overall_class_report, index_col=0)
-        # Оставляем только precision/recall/F1 и убираем агрегированную строку 'accuracy'
-        df_overall = df_overall.drop(index=[row for row in ["accuracy"] if row in df_overall.index], errors="ignore")
-        _append_md_section(md_lines, "Метрики по документам — общий датасет")
-        md_lines.append(_df_to_md_table(df_overall))
-
-    # --- Метрики по документам для каждого сабсета ---
-    for subset in task_cfg.get("subsets", []):
-        class_rep_file = Path(f"{run_id}_{subset}_class_report.csv")
-        if not class_rep_file.exists():
+    # --- Метрики по документам (overall и каждый сабсет) ---
+    for subset in ["overall", *subsets]:
+        df_report = artifacts.class_reports.get(subset)
+        if df_report is None:
             continue
-        df_subset = pd.read_csv(class_rep_file, index_col=0)
-        df_subset = df_subset.drop(index=[row for row in ["accuracy"] if row in df_subset.index], errors="ignore")
-        _append_md_section(md_lines, f"Метрики по документам — {subset}")
-        md_lines.append(_df_to_md_table(df_subset))
+        # Оставляем только precision/recall/F1 и убираем агрегированную строку 'accuracy'
+        df_report = df_report.drop(index=[row for row in ["accuracy"] if row in df_report.index], errors="ignore")
+        title = "общий датасет" if subset == "overall" else subset
+        _append_md_section(md_lines, f"Метрики по документам — {title}")
+        md_lines.append(_df_to_md_table(df_report))
 
     # --- Матрицы ошибок ---
-    for subset in task_cfg.get("subsets", []):
-        cm_file = Path(f"{run_id}_{subset}_confusion_matrix.csv")
-        if not cm_file.exists():
+    for subset in subsets:
+        cm_df = artifacts.confusion_matrices.get(subset)
+        if cm_df is None:
             continue
-        cm_df = pd.read_csv(cm_file, index_col=0)
         _append_md_section(md_lines, f"Confusion Matrix — {subset}")
         md_lines.append(_df_to_md_table(cm_df))
 
@@ -0,0 +1,349 @@
+"""Реестр результатов всех запусков в SQLite.
+
+Каждый запуск ``check_*`` и ``optimize_prompt.py`` регистрирует здесь модель,
+промпт, хеш конфига, сабсеты, метрики и предсказания по элементам. Индексы
+рассчитаны на запросы по тысячам запусков:
+
+* лучший промпт для каждого сабсета (``best-prompt``);
+* элементы, которые были верны в запуске A и стали неверны в B (``regressions``).
+
+Пример::
+
+    python results_db.py runs --model Qwen2.5-VL-7B-Instruct
+    python results_db.py best-prompt --metric accuracy --task classification
+    python results_db.py regressions <run_a> <run_b> --subset clean
+"""
+
+import hashlib
+import json
+import numbers
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import click
+import pandas as pd
+
+DEFAULT_DB_PATH = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    task        TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    prompt_name TEXT,
+    prompt_hash TEXT,
+    config_hash TEXT,
+    subsets     TEXT,
+    created_at  TEXT NOT NULL,
+    artifacts   TEXT
+);
+CREATE TABLE IF NOT EXISTS prompts (
+    prompt_hash TEXT PRIMARY KEY,
+    prompt_text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    subset TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value  REAL,
+    PRIMARY KEY (run_id, subset, metric)
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    run_id  TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    subset  TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    y_true  TEXT,
+    y_pred  TEXT,
+    correct INTEGER NOT NULL,
+    score   REAL,
+    PRIMARY KEY (run_id, subset, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_runs_task_model ON runs(task, model, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_prompt ON runs(prompt_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_config ON runs(config_hash);
+CREATE INDEX IF NOT EXISTS idx_metrics_lookup ON metrics(metric, subset, value);
+CREATE INDEX IF NOT EXISTS idx_predictions_item ON predictions(subset, item_id, run_id, correct);
+"""
+
+# Одна строка predictions: (item_id, y_true, y_pred, correct, score)
+PredictionRow = Tuple[str, str, str, bool, Optional[float]]
+
+
+def hash_text(text: str) -> str:
+    """Короткий стабильный хеш текста (промпта)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def hash_config(config: Dict[str, Any]) -> str:
+    """Хеш конфига, не зависящий от порядка ключей."""
+    return hash_text(json.dumps(config, sort_keys=True, ensure_ascii=False, default=str))
+
+
+class ResultsDB:
+    """Реестр запусков поверх SQLite.
+
+    Args:
+        path (str): Путь к файлу базы (создаётся при первом обращении).
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL позволяет читать базу из CLI, пока идёт запись из запуска
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._drop_outdated_indexes()
+        self.conn.executescript(SCHEMA)
+
+    def _drop_outdated_indexes(self) -> None:
+        """Удаляет индексы со старым порядком колонок, чтобы ``SCHEMA`` создала их заново."""
+        index_info = self.conn.execute("PRAGMA index_info(idx_metrics_lookup)")
+        columns = [row["name"] for row in index_info]
+        # Запросы фильтруют по метрике, а сабсетов и метрик в базе мало, поэтому metric идёт первой
+        if columns and columns[0] != "metric":
+            self.conn.execute("DROP INDEX idx_metrics_lookup")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def register_run(
+        self,
+        run_id: str,
+        task: str,
+        model: str,
+        prompt_text: Optional[str] = None,
+        prompt_name: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        subsets: Optional[List[str]] = None,
+        artifacts: Optional[str] = None,
+    ) -> None:
+        """Регистрирует запуск (повторная регистрация обновляет запись).
+
+        Метрики и предсказания запуска при повторной регистрации сохраняются,
+        ``created_at`` остаётся временем первой регистрации.
+
+        Args:
+            run_id (str): Идентификатор запуска.
+            task (str): Задача: ``classification``, ``page_sorting``,
+                ``entity_extraction``, ``prompt_optimization``.
+            model (str): Имя модели.
+            prompt_text (Optional[str]): Текст промпта; хранится один раз на хеш.
+            prompt_name (Optional[str]): Человекочитаемое имя промпта (имя файла).
+            config (Optional[Dict[str, Any]]): Конфиг запуска, сохраняется его хеш.
+            subsets (Optional[List[str]]): Обрабатываемые сабсеты.
+            artifacts (Optional[str]): Путь к каталогу артефактов запуска.
+        """
+        prompt_hash = hash_text(prompt_text) if prompt_text is not None else None
+        with self.conn:
+            if prompt_hash is not None:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO prompts(prompt_hash, prompt_text) VALUES (?, ?)",
+                    (prompt_hash, prompt_text),
+                )
+            # Не INSERT OR REPLACE: замена удаляет строку, и ON DELETE CASCADE стирает
+            # уже записанные метрики и предсказания запуска
+            self.conn.execute(
+                """
+                INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    task = excluded.task,
+                    model = excluded.model,
+                    prompt_name = excluded.prompt_name,
+                    prompt_hash = excluded.prompt_hash,
+                    config_hash = excluded.config_hash,
+                    subsets = excluded.subsets,
+                    artifacts = excluded.artifacts
+                """,
+                (
+                    run_id,
+                    task,
+                    model,
+                    prompt_name,
+                    prompt_hash,
+                    hash_config(config) if config is not None else None,
+                    json.dumps(subsets or [], ensure_ascii=False),
+                    datetime.now().isoformat(timespec="seconds"),
+                    artifacts,
+                ),
+            )
+
+    def set_subsets(self, run_id: str, subsets: List[str]) -> None:
+        """Заменяет список сабсетов запуска фактическими (с пометкой ``+derived``)."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE runs SET subsets = ? WHERE run_id = ?",
+                (json.dumps(subsets, ensure_ascii=False), run_id),
+            )
+
+    def add_metrics(self, run_id: str, subset: str, metrics: Dict[str, Any]) -> None:
+        """Сохраняет числовые метрики запуска для сабсета (``ALL`` — итоговые)."""
+        rows = [
+            (run_id, subset, name, float(value))
+            for name, value in metrics.items()
+            if isinstance(value, numbers.Real)
+        ]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)", rows)
+
+    def add_predictions(self, run_id: str, subset: str, rows: Iterable[PredictionRow]) -> None:
+        """Сохраняет предсказания по элементам одной транзакцией."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (run_id, subset, item_id, y_true, y_pred, int(bool(correct)), score)
+                    for item_id, y_true, y_pred, correct, score in rows
+                ),
+            )
+
+    def runs(self, task: Optional[str] = None, model: Optional[str] = None) -> pd.DataFrame:
+        """Список запусков, новые первыми."""
+        query = "SELECT * FROM runs WHERE 1=1"
+        params: List[Any] = []
+        if task:
+            query += " AND task = ?"
+            params.append(task)
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        return pd.read_sql_query(query + " ORDER BY created_at DESC", self.conn, params=params)
+
+    def best_prompt_per_subset(
+        self, metric: str = "accuracy", task: Optional[str] = None, model: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Лучший промпт (по максимуму ``metric``) для каждого сабсета.
+
+        Args:
+            metric (str): Метрика для сравнения (больше — лучше).
+            task (Optional[str]): Ограничить задачей.
+            model (Optional[str]): Ограничить моделью.
+
+        Returns:
+            pd.DataFrame: subset, prompt_name, prompt_hash, model, run_id, value.
+        """
+        filters = ""
+        params: List[Any] = [metric]
+        if task:
+            filters += " AND r.task = ?"
+            params.append(task)
+        if model:
+            filters += " AND r.model = ?"
+            params.append(model)
+        query = f"""
+            SELECT subset, prompt_name, prompt_hash, model, run_id, value FROM (
+                SELECT m.subset, r.prompt_name, r.prompt_hash, r.model, r.run_id, m.value,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY m.subset ORDER BY m.value DESC, r.created_at DESC
+                       ) AS rank
+                FROM metrics m JOIN runs r ON r.run_id = m.run_id
+                WHERE m.metric = ? AND r.prompt_hash IS NOT NULL{filters}
+            )
+            WHERE rank = 1
+            ORDER BY subset
+        """
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def regressions(self, run_a: str, run_b: str, subset: Optional[str] = None) -> pd.DataFrame:
+        """Элементы, верные в запуске ``run_a`` и неверные в ``run_b``."""
+        query = """
+            SELECT a.subset, a.item_id, a.y_true, a.y_pred AS pred_a, b.y_pred AS pred_b,
+                   a.score AS score_a, b.score AS score_b
+            FROM predictions a
+            JOIN predictions b
+              ON b.run_id = ? AND b.subset = a.subset AND b.item_id = a.item_id
+            WHERE a.run_id = ? AND a.correct = 1 AND b.correct = 0
+        """
+        params: List[Any] = [run_b, run_a]
+        if subset:
+            query += " AND a.subset = ?"
+            params.append(subset)
+        return pd.read_sql_query(query + " ORDER BY a.subset, a.item_id", self.conn, params=params)
+
+    def compare_metrics(self, run_a: str, run_b: str) -> pd.DataFrame:
+        """Метрики двух запусков бок о бок с разницей ``b - a``."""
+        query = """
+            SELECT a.subset, a.metric, a.value AS value_a, b.value AS value_b,
+                   b.value - a.value AS delta
+            FROM metrics a
+            JOIN metrics b ON b.run_id = ? AND b.subset = a.subset AND b.metric = a.metric
+            WHERE a.run_id = ?
+            ORDER BY a.subset, a.metric
+        """
+        return pd.read_sql_query(query, self.conn, params=[run_b, run_a])
+
+
+def results_db_from_config(config: Dict[str, Any]) -> Optional[ResultsDB]:
+    """Открывает реестр по секции ``results_db`` конфига (``enabled``, ``path``).
+
+    Реестр включён по умолчанию; ``"enabled": false`` отключает регистрацию.
+    """
+    db_config = config.get("results_db", {})
+    if not db_config.get("enabled", True):
+        return None
+    return ResultsDB(db_config.get("path", DEFAULT_DB_PATH))
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+
+def _print_df(df: pd.DataFrame) -> None:
+    if df.empty:
+        print("Нет данных.")
+    else:
+        print(df.to_string(index=False))
+
+
+@click.group()
+@click.option("--db", "db_path", default=DEFAULT_DB_PATH, show_default=True, help="Файл реестра.")
+@click.pass_context
+def cli(ctx: click.Context, db_path: str) -> None:
+    """Запросы к реестру результатов запусков."""
+    if not Path(db_path).exists():
+        raise click.ClickException(f"Реестр {db_path} не найден")
+    ctx.obj = ResultsDB(db_path)
+
+
+@cli.command("runs")
+@click.option("--task", default=None, help="Фильтр по задаче.")
+@click.option("--model", default=None, help="Фильтр по модели.")
+@click.pass_obj
+def runs_cmd(db: ResultsDB, task: Optional[str], model: Optional[str]) -> None:
+    """Список зарегистрированных запусков."""
+    _print_df(db.runs(task, model))
+
+
+@cli.command("best-prompt")
+@click.option("--metric", default="accuracy", show_default=True)
+@click.option("--task", default=None, help="Фильтр по задаче.")
+@click.option("--model", default=None, help="Фильтр по модели.")
+@click.pass_obj
+def best_prompt_cmd(db: ResultsDB, metric: str, task: Optional[str], model: Optional[str]) -> None:
+    """Лучший промпт для каждого сабсета."""
+    _print_df(db.best_prompt_per_subset(metric, task, model))
+
+
+@cli.command("regressions")
+@click.argument("run_a")
+@click.argument("run_b")
+@click.option("--subset", default=None, help="Ограничить одним сабсетом.")
+@click.pass_obj
+def regressions_cmd(db: ResultsDB, run_a: str, run_b: str, subset: Optional[str]) -> None:
+    """Элементы, верные в RUN_A и ошибочные в RUN_B."""
+    _print_df(db.regressions(run_a, run_b, subset))
+
+
+@cli.command("compare")
+@click.argument("run_a")
+@click.argument("run_b")
+@click.pass_obj
+def compare_cmd(db: ResultsDB, run_a: str, run_b: str) -> None:
+    """Метрики двух запусков бок о бок."""
+    _print_df(db.compare_metrics(run_a, run_b))
+
+
+if __name__ == "__main__":
+    cli()
@@ -3,17 +3,30 @@ import re
 import subprocess
 
 from model_interface.model_factory import ModelFactory
+from pydantic import BaseModel, Field
+
+from json_stream import JsonObjectScanner
+from qwen_runtime import predict_json, supports_direct_generation
+
+
+class PassportData(BaseModel):
+    """Схема ответа для ограниченного декодирования."""
+
+    number: str = Field(description="серия и номер документа")
+    name: str = Field(description="фамилия владельца")
 
 
 def extract_json_from_response(response: str) -> dict:
-    """Извлекает JSON из текстового ответа модели."""
-    try:
-        # Ищем JSON-подобную структуру в ответе
-        json_match = re.search(r"\{.*?\}", response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group()
-            return json.loads(json_str)
+    """Извлекает JSON из текстового ответа модели.
+
+    Используется, когда ограниченное декодирование недоступно. В отличие от
+    регулярного выражения, сканер корректно находит вложенные объекты.
+    """
+    objects = JsonObjectScanner().feed(response)
+    if not objects:
         return {"error": "JSON not found in response"}
+    try:
+        return json.loads(objects[0])
     except json.JSONDecodeError:
         return {"error": "Invalid JSON format"}
 
@@ -79,11 +92,16 @@ if __name__ == "__main__":
     Пример корректного ответа: {"number": "4512345678", "name": "ИВАНОВ"}
     """
 
-    # Выполнение запроса к модели
-    response = model.predict_on_image(image=image_path, prompt=prompt)
+    # Выполнение запроса к модели: при доступе к HF-модели ответ ограничен схемой
+    # и сразу разбирается, иначе — свободная генерация и поиск JSON в тексте
+    if supports_direct_generation(model):
+        raw_data = predict_json(model, [image_path], prompt, PassportData.model_json_schema())
+        response = json.dumps(raw_data, ensure_ascii=False)
+    else:
+        response = model.predict_on_image(image=image_path, prompt=prompt)
+        raw_data = extract_json_from_response(response)
 
     # Извлечение и обработка данных
-    raw_data = extract_json_from_response(response)
     processed_data = postprocess_passport_data(raw_data)
 
     # Вывод результата
@@ -0,0 +1,275 @@
+"""Сетка сравнения моделей × промптов × сабсетов для классификации.
+
+Вместо правки ``config_classification.json`` и отдельного запуска на каждую
+комбинацию (с перезагрузкой модели) команда принимает сетку и планирует
+работу так, чтобы перезагрузок было как можно меньше:
+
+* модели — внешний цикл: каждая загружается один раз, после неё память
+  освобождается перед загрузкой следующей;
+* изображения — средний цикл: каждое декодируется один раз на модель и
+  сразу прогоняется со всеми промптами;
+* промпты — внутренний цикл.
+
+Каждый ответ дописывается в журнал ``predictions.jsonl`` в каталоге
+сетки, поэтому прерванная сетка продолжается с того же места при
+повторном запуске с тем же ``--output`` (комбинации, уже записанные в
+журнал, пропускаются). По журналу строится общая таблица метрик
+``summary.csv`` по модели, промпту и сабсету::
+
+    python sweep.py --models Qwen2.5-VL-3B-Instruct,Qwen2.5-VL-7B-Instruct \\
+        --prompts prompts/a.txt,prompts/b.txt --subsets clean,blur --output ./sweeps/grid
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import click
+import pandas as pd
+from bench_utils.metrics import calculate_classification_metrics
+from bench_utils.model_utils import load_prompt, prepare_prompt
+from bench_utils.utils import load_config
+from tqdm import tqdm
+
+from augment import configure_augmentation, subset_label
+from check_classifiication import get_image_paths, load_classification_model, parse_class_prediction
+from dataset_io import DatasetPath, load_image_for_model, open_dataset
+from execution_guard import OOMExhaustedError, configure_execution_guard, free_memory
+from results_db import hash_text
+from tracing import configure_tracing
+
+JOURNAL_NAME = "predictions.jsonl"
+SUMMARY_NAME = "summary.csv"
+
+# Ключ выполненной комбинации: модель, хеш промпта, сабсет, путь изображения
+DoneKey = Tuple[str, str, str, str]
+
+
+def read_journal(journal_path: Path) -> Iterator[Dict[str, Any]]:
+    """Строки журнала; недописанная последняя строка (прерванный запуск) пропускается."""
+    if not journal_path.exists():
+        return
+    with journal_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def completed_keys(journal_path: Path) -> Set[DoneKey]:
+    """Комбинации, уже записанные в журнал."""
+    return {
+        (row["model"], row["prompt_hash"], row["subset"], row["path"])
+        for row in read_journal(journal_path)
+    }
+
+
+def class_from_path(path: Any, dataset_path: Any) -> str:
+    """Имя класса — первый сегмент пути относительно корня датасета."""
+    try:
+        return path.relative_to(dataset_path).parts[0]
+    except ValueError:
+        return path.parts[-5] if len(path.parts) >= 5 else "Unknown"
+
+
+def predict_class(
+    model: Any, image: Any, prompt: str, document_classes: Dict[str, str], guard: Any
+) -> str:
+    """Классифицирует уже декодированное изображение (как ``get_prediction``)."""
+    try:
+        result = guard.run(
+            lambda images: model.predict_on_image(image=images[0], prompt=prompt), [image]
+        )
+    except OOMExhaustedError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Ошибка классификации: {e}")
+        return "None"
+    return parse_class_prediction(result, document_classes)
+
+
+def summarize(journal_path: Path, document_classes: Dict[str, str]) -> pd.DataFrame:
+    """Метрики по модели, промпту и сабсету плюс среднее по сабсетам (``subset = ALL``)."""
+    journal = pd.DataFrame(list(read_journal(journal_path)))
+    if journal.empty:
+        return journal
+    rows = []
+    for (model_name, prompt_name, prompt_hash, subset), group in journal.groupby(
+        ["model", "prompt", "prompt_hash", "subset"], sort=False
+    ):
+        metrics = calculate_classification_metrics(
+            group["y_true"].tolist(), group["y_pred"].tolist(), document_classes
+        )
+        rows.append(
+            {
+                "model": model_name,
+                "prompt": prompt_name,
+                "prompt_hash": prompt_hash,
+                "subset": subset,
+                "items": len(group),
+                **(metrics or {}),
+            }
+        )
+    summary = pd.DataFrame(rows)
+    metric_columns = [
+        column
+        for column in summary.columns
+        if column not in ("model", "prompt", "prompt_hash", "subset", "items")
+    ]
+    overall = (
+        summary.groupby(["model", "prompt", "prompt_hash"], sort=False)
+        .agg({"items": "sum", **{column: "mean" for column in metric_columns}})
+        .reset_index()
+        .assign(subset="ALL")
+    )
+    return pd.concat([summary, overall], ignore_index=True)
+
+
+def run_sweep(
+    config: Dict[str, Any],
+    models: List[str],
+    prompt_paths: List[Path],
+    subsets: List[str],
+    output_dir: Path,
+) -> pd.DataFrame:
+    """Прогоняет сетку и возвращает сводную таблицу метрик.
+
+    Args:
+        config (Dict[str, Any]): Конфиг классификации (секции ``task``, ``model``,
+            ``document_classes`` и надстройки модели).
+        models (List[str]): Имена моделей (подставляются в ``model.model_name``).
+        prompt_paths (List[Path]): Файлы промптов.
+        subsets (List[str]): Сабсеты.
+        output_dir (Path): Каталог сетки с журналом и сводкой.
+
+    Returns:
+        pd.DataFrame: Метрики по модели, промпту и сабсету.
+    """
+    task_config = config["task"]
+    document_classes = config["document_classes"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    journal_path = output_dir / JOURNAL_NAME
+    done = completed_keys(journal_path)
+    if done:
+        print(f"🔁 Продолжение сетки: в журнале уже {len(done)} ответов")
+
+    dataset_path = open_dataset(task_config["dataset_path"])
+    sample_size = task_config.get("sample_size")
+    tracer = configure_tracing(config.get("tracing"))
+    guard = configure_execution_guard(config.get("execution_guard"))
+    configure_augmentation(config.get("augmentation"))
+
+    classes_str = ", ".join(f"{idx}: {name}" for idx, name in enumerate(document_classes.values()))
+    prompts = []
+    for prompt_path in prompt_paths:
+        template = load_prompt(prompt_path)
+        prompts.append(
+            (prompt_path.stem, hash_text(template), prepare_prompt(template, classes=classes_str))
+        )
+    image_paths: Dict[str, List[DatasetPath]] = {}
+    for subset in subsets:
+        paths = get_image_paths(dataset_path, list(document_classes.keys()), subset, sample_size)
+        # Вычисленный из clean сабсет пишется в журнал как <subset>+derived
+        image_paths[subset_label(subset, paths)] = paths
+
+    with journal_path.open("a", encoding="utf-8") as journal:
+        for model_name in models:
+            pending = [
+                (subset, path)
+                for subset, subset_paths in image_paths.items()
+                for path in subset_paths
+                if any((model_name, h, subset, str(path)) not in done for _, h, _ in prompts)
+            ]
+            if not pending:
+                print(f"✅ {model_name}: все комбинации уже посчитаны")
+                continue
+
+            print(f"\n🧠 Модель {model_name}: изображений {len(pending)}, промптов {len(prompts)}")
+            model = load_classification_model(
+                config, {**config["model"], "model_name": model_name}, tracer
+            )
+            try:
+                for subset, path in tqdm(pending, desc=model_name):
+                    # Изображение декодируется один раз и прогоняется со всеми промптами
+                    image = load_image_for_model(path)
+                    class_name = class_from_path(path, dataset_path)
+                    for prompt_name, prompt_hash, prompt in prompts:
+                        if (model_name, prompt_hash, subset, str(path)) in done:
+                            continue
+                        try:
+                            prediction = predict_class(
+                                model, image, prompt, document_classes, guard
+                            )
+                        except OOMExhaustedError as e:
+                            print(f"⚠️  Пропуск {path.name}: {e}")
+                            continue
+                        row = {
+                            "model": model_name,
+                            "prompt": prompt_name,
+                            "prompt_hash": prompt_hash,
+                            "subset": subset,
+                            "path": str(path),
+                            "y_true": class_name,
+                            "y_pred": prediction,
+                        }
+                        journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    # Журнал сбрасывается на диск после каждого изображения
+                    journal.flush()
+            finally:
+                del model
+                free_memory()
+
+    summary = summarize(journal_path, document_classes)
+    summary.to_csv(output_dir / SUMMARY_NAME, index=False)
+    return summary
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+@click.command()
+@click.option(
+    "--config",
+    "config_path",
+    default="config_classification.json",
+    show_default=True,
+    help="Конфиг классификации: датасет, классы и надстройки модели.",
+)
+@click.option("--models", default=None, help="Модели через запятую (по умолчанию из конфига).")
+@click.option(
+    "--prompts", default=None, help="Файлы промптов через запятую (по умолчанию из конфига)."
+)
+@click.option("--subsets", default=None, help="Сабсеты через запятую (по умолчанию из конфига).")
+@click.option(
+    "--output",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Каталог сетки; повторный запуск с тем же каталогом продолжает сетку.",
+)
+def main(
+    config_path: str,
+    models: Optional[str],
+    prompts: Optional[str],
+    subsets: Optional[str],
+    output: Optional[Path],
+) -> None:
+    """Сравнивает модели и промпты классификации на сабсетах одной командой."""
+    config = load_config(config_path)
+    model_names = _split(models) or [config["model"]["model_name"]]
+    prompt_paths = [Path(p) for p in _split(prompts)] or [Path(config["task"]["prompt_path"])]
+    subset_names = _split(subsets) or list(config["task"]["subsets"])
+    output_dir = output or Path("sweeps") / datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    summary = run_sweep(config, model_names, prompt_paths, subset_names, output_dir)
+    if summary.empty:
+        print("Нет результатов.")
+        return
+    print(summary.to_string(index=False))
+    print(f"✅ Сводка: {output_dir / SUMMARY_NAME}, журнал: {output_dir / JOURNAL_NAME}")
+
+
+if __name__ == "__main__":
+    main()
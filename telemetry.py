@@ -0,0 +1,248 @@
+"""Фоновый сбор метрик ресурсов процесса во время запуска.
+
+``ResourceSampler`` в отдельном потоке с фиксированным интервалом
+записывает:
+
+* ``rss_mb`` — резидентную память процесса (``/proc/self/statm``; вне
+  Linux — пиковое значение из ``resource.getrusage``);
+* ``cpu_percent`` — загрузку CPU процессом (100 = одно ядро целиком);
+* ``gpu<N>_memory_mb`` и ``gpu<N>_util_percent`` — занятую память и
+  загрузку каждой видеокарты через NVML (пакет ``nvidia-ml-py``). Без NVML,
+  но с CUDA в torch пишется только память, зарезервированная аллокатором
+  torch; на машине без GPU колонки видеокарт не появляются.
+
+Каждая точка помечается текущей меткой (обычно сабсетом), поэтому на
+таймлайне видно, какой этап сколько потребовал. Таймлайн и пики
+сохраняются в хранилище артефактов запуска рядом с метриками::
+
+    sampler = configure_telemetry(config.get("telemetry"))
+    sampler.set_label(subset)
+    ...
+    finish_telemetry(store)
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+DEFAULT_INTERVAL_S = 1.0
+
+
+def _read_rss_mb() -> Optional[float]:
+    """Текущая резидентная память процесса в МБ."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss в КБ на Linux и в байтах на macOS
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    except (ImportError, OSError):
+        return None
+
+
+class _GpuProbe:
+    """Опрос видеокарт: NVML, иначе аллокатор torch, иначе ничего."""
+
+    def __init__(self) -> None:
+        self.source = "none"
+        self._nvml: Any = None
+        self._handles: List[Any] = []
+        self._torch: Any = None
+        try:
+            import pynvml  # type: ignore
+
+            pynvml.nvmlInit()
+            self._handles = [
+                pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())
+            ]
+            self._nvml = pynvml
+            self.source = "nvml"
+            return
+        except Exception:
+            # Нет пакета, драйвера или видеокарт — пробуем torch
+            self._handles = []
+        try:
+            import torch  # type: ignore
+
+            if torch.cuda.is_available():
+                self._torch = torch
+                self.source = "torch"
+        except ImportError:
+            pass
+
+    def sample(self) -> Dict[str, float]:
+        values: Dict[str, float] = {}
+        if self._nvml is not None:
+            for index, handle in enumerate(self._handles):
+                try:
+                    memory = self._nvml.nvmlDeviceGetMemoryInfo(handle)
+                    util = self._nvml.nvmlDeviceGetUtilizationRates(handle)
+                except Exception:
+                    continue
+                values[f"gpu{index}_memory_mb"] = memory.used / 2**20
+                values[f"gpu{index}_util_percent"] = float(util.gpu)
+        elif self._torch is not None:
+            for index in range(self._torch.cuda.device_count()):
+                values[f"gpu{index}_memory_mb"] = self._torch.cuda.memory_reserved(index) / 2**20
+        return values
+
+    def close(self) -> None:
+        if self._nvml is not None:
+            try:
+                self._nvml.nvmlShutdown()
+            except Exception:
+                pass
+            self._nvml = None
+
+
+class ResourceSampler:
+    """Поток, снимающий метрики ресурсов с фиксированным интервалом.
+
+    Args:
+        interval_s (float): Интервал между замерами в секундах.
+        enabled (bool): При ``False`` ``start``/``stop`` ничего не делают.
+    """
+
+    def __init__(self, interval_s: float = DEFAULT_INTERVAL_S, enabled: bool = True) -> None:
+        self.interval_s = max(0.05, interval_s)
+        self.enabled = enabled
+        self.gpu_source = "none"
+        self._samples: List[Dict[str, Any]] = []
+        self._label = ""
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._probe: Optional[_GpuProbe] = None
+        self._origin = 0.0
+        self._last_wall = 0.0
+        self._last_cpu = 0.0
+
+    def set_label(self, label: str) -> None:
+        """Метка для следующих замеров (например, имя сабсета)."""
+        self._label = label
+
+    def start(self) -> "ResourceSampler":
+        """Запускает фоновый поток; повторный вызов ничего не делает."""
+        if not self.enabled or self._thread is not None:
+            return self
+        self._probe = _GpuProbe()
+        self.gpu_source = self._probe.source
+        self._origin = self._last_wall = time.perf_counter()
+        self._last_cpu = time.process_time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        wall, cpu = time.perf_counter(), time.process_time()
+        elapsed = wall - self._last_wall
+        row: Dict[str, Any] = {
+            "t_s": round(wall - self._origin, 3),
+            "label": self._label,
+            "rss_mb": _read_rss_mb(),
+            "cpu_percent": 100 * (cpu - self._last_cpu) / elapsed if elapsed > 0 else 0.0,
+        }
+        if self._probe is not None:
+            row.update(self._probe.sample())
+        self._last_wall, self._last_cpu = wall, cpu
+        self._samples.append(row)
+
+    def _run(self) -> None:
+        self._sample()
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def stop(self) -> None:
+        """Останавливает поток и делает последний замер."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._sample()
+        if self._probe is not None:
+            self._probe.close()
+
+    def timeline(self) -> pd.DataFrame:
+        """Все замеры: ``t_s``, ``label``, ``rss_mb``, ``cpu_percent`` и колонки GPU."""
+        return pd.DataFrame(self._samples).round(2)
+
+    def peaks(self) -> pd.DataFrame:
+        """Пики и средние по каждой метке и по всему запуску (``label = ALL``)."""
+        timeline = self.timeline()
+        if timeline.empty:
+            return timeline
+        metrics = [c for c in timeline.columns if c not in ("t_s", "label")]
+        labelled = pd.concat([timeline[timeline["label"] != ""], timeline.assign(label="ALL")])
+        grouped = labelled.groupby("label", sort=False)
+        peaks = grouped[metrics].max().add_prefix("peak_")
+        means = grouped[metrics].mean().add_prefix("mean_")
+        peaks.insert(0, "seconds", grouped["t_s"].max() - grouped["t_s"].min())
+        return peaks.join(means).reset_index().round(2)
+
+
+_SAMPLER = ResourceSampler(enabled=False)
+
+
+def get_telemetry() -> ResourceSampler:
+    """Возвращает текущий сборщик метрик ресурсов (по умолчанию выключен)."""
+    return _SAMPLER
+
+
+def configure_telemetry(telemetry_config: Optional[Dict[str, Any]]) -> ResourceSampler:
+    """Создаёт и запускает сборщик по секции ``telemetry`` конфига.
+
+    Поддерживаемые ключи: ``enabled`` (по умолчанию ``true``) и
+    ``interval_s`` (по умолчанию 1 секунда). Отсутствие секции включает
+    сбор с настройками по умолчанию.
+    """
+    global _SAMPLER
+    telemetry_config = telemetry_config or {}
+    _SAMPLER.stop()
+    _SAMPLER = ResourceSampler(
+        interval_s=float(telemetry_config.get("interval_s", DEFAULT_INTERVAL_S)),
+        enabled=bool(telemetry_config.get("enabled", True)),
+    )
+    return _SAMPLER.start()
+
+
+def finish_telemetry(store: Any = None) -> Optional[pd.DataFrame]:
+    """Останавливает сбор, печатает пики и сохраняет таблицы в хранилище запуска.
+
+    Args:
+        store (Any): ``RunArtifactStore`` запуска; таблицы ``telemetry``
+            (таймлайн) и ``telemetry_peaks`` пишутся в партицию ``ALL``.
+
+    Returns:
+        Optional[pd.DataFrame]: Пики по меткам или ``None``, если сбор выключен.
+    """
+    if not _SAMPLER.enabled:
+        return None
+    _SAMPLER.stop()
+    peaks = _SAMPLER.peaks()
+    if peaks.empty:
+        return None
+
+    overall = peaks[peaks["label"] == "ALL"].iloc[0]
+    parts = [f"CPU {overall['peak_cpu_percent']:.0f}%"]
+    if pd.notna(overall.get("peak_rss_mb")):
+        parts.insert(0, f"RSS {overall['peak_rss_mb']:.0f} МБ")
+    for column in peaks.columns:
+        if column.startswith("peak_gpu") and column.endswith("_memory_mb"):
+            parts.append(f"{column[len('peak_') : -len('_memory_mb')]} {overall[column]:.0f} МБ")
+    print(f"📈 Пики ресурсов ({_SAMPLER.gpu_source}): " + ", ".join(parts))
+
+    if store is not None:
+        store.write_table("telemetry", _SAMPLER.timeline(), "ALL")
+        store.write_table("telemetry_peaks", peaks, "ALL")
+    return peaks
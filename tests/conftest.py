@@ -0,0 +1,9 @@
+"""Общие настройки тестов: скрипты проекта лежат в корне репозитория, а не в пакете."""
+
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+sys.path.insert(0, str(REPO_ROOT / "downloaders"))
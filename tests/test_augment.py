@@ -0,0 +1,77 @@
+"""Производные сабсеты: воспроизводимость по зерну и пометка ``+derived``."""
+
+import io
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import augment
+from augment import (
+    TRANSFORMS,
+    AugmentedPath,
+    configure_augmentation,
+    get_augmentation,
+    subset_dir,
+    subset_label,
+)
+
+
+@pytest.fixture
+def images_dir(tmp_path: Path) -> Path:
+    rng = np.random.default_rng(0)
+    clean = tmp_path / "images" / "clean"
+    clean.mkdir(parents=True)
+    for name in ("0.jpg", "1.png"):
+        pixels = rng.integers(0, 256, (40, 56, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(clean / name)
+    return tmp_path / "images"
+
+
+@pytest.fixture(autouse=True)
+def restore_config() -> Iterator[None]:
+    config = get_augmentation()
+    yield
+    augment._CONFIG = config
+
+
+def test_disabled_by_default(images_dir: Path) -> None:
+    assert not get_augmentation().enabled
+    assert not configure_augmentation(None).enabled
+    assert subset_dir(images_dir, "blur") == images_dir / "blur"
+
+
+@pytest.mark.parametrize("subset", list(TRANSFORMS))
+@pytest.mark.parametrize("name", ["0.jpg", "1.png"])
+def test_same_seed_gives_identical_bytes(images_dir: Path, subset: str, name: str) -> None:
+    configure_augmentation({"enabled": True, "seed": 7})
+    first = subset_dir(images_dir, subset) / name
+    second = subset_dir(images_dir, subset) / name
+    assert isinstance(first, AugmentedPath)
+
+    assert first.read_bytes() == second.read_bytes()
+    np.testing.assert_array_equal(first.load_array(), second.load_array())
+    with Image.open(io.BytesIO(first.read_bytes())) as decoded:
+        assert decoded.size == (56, 40)
+
+
+def test_other_seed_changes_noise(images_dir: Path) -> None:
+    configure_augmentation({"enabled": True, "seed": 0})
+    seed_0 = (subset_dir(images_dir, "noise") / "1.png").load_array()
+    configure_augmentation({"enabled": True, "seed": 1})
+    seed_1 = (subset_dir(images_dir, "noise") / "1.png").load_array()
+    assert not np.array_equal(seed_0, seed_1)
+
+
+def test_derived_subset_is_marked(images_dir: Path) -> None:
+    configure_augmentation({"enabled": True})
+    (images_dir / "gray").mkdir()
+    derived = subset_dir(images_dir, "blur")
+    materialized = subset_dir(images_dir, "gray")
+
+    assert str(derived / "0.jpg") == str(images_dir / "blur+derived" / "0.jpg")
+    assert (derived / "0.jpg").relative_to(images_dir).parts[0] == "blur+derived"
+    assert subset_label("blur", [derived]) == "blur+derived"
+    assert subset_label("gray", [materialized]) == "gray"
@@ -0,0 +1,54 @@
+"""Ошибки пакета и отменённые запросы в ``MicroBatcher``."""
+
+import threading
+from typing import List
+
+import pytest
+
+from batcher import MicroBatcher
+
+
+def test_wrong_result_count_fails_every_request_and_worker_survives() -> None:
+    calls: List[List[int]] = []
+
+    def run_batch(items: List[int]) -> List[int]:
+        calls.append(items)
+        return items[:1] if len(calls) == 1 else [item * 2 for item in items]
+
+    batcher: MicroBatcher[int, int] = MicroBatcher(run_batch, max_batch=2, max_wait_ms=1000)
+    try:
+        futures = [batcher.submit(1), batcher.submit(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="результатов"):
+                future.result(timeout=5)
+        assert batcher.stats.failed_batches == 1
+        assert batcher.submit(3).result(timeout=5) == 6
+    finally:
+        batcher.close()
+
+
+def test_cancelled_request_is_skipped() -> None:
+    started = threading.Event()
+    release = threading.Event()
+    seen: List[List[str]] = []
+
+    def run_batch(items: List[str]) -> List[str]:
+        seen.append(items)
+        started.set()
+        release.wait(5)
+        return [item.upper() for item in items]
+
+    batcher: MicroBatcher[str, str] = MicroBatcher(run_batch, max_batch=1, max_wait_ms=0)
+    try:
+        first = batcher.submit("a")
+        assert started.wait(5)
+        # Пока первый пакет занят, второй запрос ждёт в очереди и отменяется вызывающим
+        cancelled = batcher.submit("b")
+        assert cancelled.cancel()
+        release.set()
+        assert first.result(timeout=5) == "A"
+        assert batcher.submit("c").result(timeout=5) == "C"
+    finally:
+        batcher.close()
+    assert seen == [["a"], ["c"]]
+    assert batcher.stats.requests == 2
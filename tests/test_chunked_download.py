@@ -0,0 +1,96 @@
+"""Загрузчик ``chunked_download`` против локального Range-сервера."""
+
+import hashlib
+import os
+import socket
+import threading
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pytest
+
+from chunked_download import DownloadError, download, make_range_server
+
+FILE_SIZE = 3 * 2**20 + 12345
+
+
+@pytest.fixture
+def served(tmp_path: Path) -> Path:
+    directory = tmp_path / "served"
+    directory.mkdir()
+    (directory / "blob.bin").write_bytes(os.urandom(FILE_SIZE))
+    with zipfile.ZipFile(directory / "data.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("images/clean/0.txt", "страница" * 1000)
+        zf.writestr("jsons/0.json", '{"pages": [1, 2]}')
+    return directory
+
+
+@pytest.fixture
+def start_server(served: Path) -> Iterator[Callable[[float], str]]:
+    servers = []
+
+    def start(drop_rate: float) -> str:
+        server = make_range_server(served, port=0, drop_rate=drop_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_parallel_download_matches_source(
+    served: Path, start_server: Callable[[float], str], tmp_path: Path
+) -> None:
+    output = tmp_path / "out" / "blob.bin"
+    expected = _sha256(served / "blob.bin")
+
+    digest = download(f"{start_server(0.0)}/blob.bin", output, chunk_mb=1, sha256=expected)
+
+    assert digest == expected
+    assert output.read_bytes() == (served / "blob.bin").read_bytes()
+    assert not output.with_name("blob.bin.part.state.json").exists()
+
+
+def test_dropped_connections_are_resumed(
+    served: Path, start_server: Callable[[float], str], tmp_path: Path
+) -> None:
+    output = tmp_path / "out" / "blob.bin"
+
+    digest = download(f"{start_server(0.3)}/blob.bin", output, chunk_mb=1, workers=1, retries=20)
+
+    assert digest == _sha256(served / "blob.bin")
+
+
+def test_zip_is_unpacked_while_downloading(
+    served: Path, start_server: Callable[[float], str], tmp_path: Path
+) -> None:
+    unpack_to = tmp_path / "dataset"
+
+    download(f"{start_server(0.0)}/data.zip", tmp_path / "data.zip", unpack_to=unpack_to)
+
+    assert (unpack_to / "images/clean/0.txt").read_text() == "страница" * 1000
+    assert (unpack_to / "jsons/0.json").exists()
+
+
+def test_http_error_becomes_download_error(
+    start_server: Callable[[float], str], tmp_path: Path
+) -> None:
+    with pytest.raises(DownloadError, match="404"):
+        download(f"{start_server(0.0)}/missing.bin", tmp_path / "missing.bin")
+
+
+def test_unreachable_server_becomes_download_error(tmp_path: Path) -> None:
+    # Свободный порт: сокет закрыт до запроса, подключение будет отклонено
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(DownloadError):
+        download(f"http://127.0.0.1:{port}/blob.bin", tmp_path / "blob.bin", timeout=2)
@@ -0,0 +1,178 @@
+"""Компиляция схемы, автомат и маски допустимых токенов на игрушечном словаре."""
+
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from constrained_decoding import (
+    JsonSchemaLogitsProcessor,
+    SchemaAutomaton,
+    SchemaGuide,
+    TokenVocabulary,
+    UnsupportedSchemaError,
+    ValueSlot,
+    compile_schema,
+)
+
+SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "pages": {"type": "integer"},
+        "total": {"type": "number"},
+        "signed": {"type": "boolean"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "address": {"$ref": "#/$defs/Address"},
+    },
+    "$defs": {
+        "Address": {
+            "type": "object",
+            "properties": {"city": {"type": "string"}, "zip": {"type": "integer"}},
+        }
+    },
+}
+ANSWER = (
+    '{"name": "Иван \\"Пётр\\"", "pages": 12, "total": -1.5e3, "signed": true, '
+    '"tags": ["счёт", "акт"], "address": {"city": "Москва", "zip": 101000}}'
+)
+EOS = 0
+# У EOS есть текст: он всё равно разрешается только после корневой скобки.
+# Многосимвольные токены-фрагменты — как в BPE-словаре
+MULTI_CHAR = ['{"', '": ', '", "', ", ", '"}', "}}", "true", "fal", "se", "Моск", "ва", "12"]
+CHARS = sorted(set(ANSWER + '0123456789-+.eE[]{}":, abcnulfsИ\\'))
+VOCABULARY = TokenVocabulary(["<eos>"] + CHARS + MULTI_CHAR + ["�"], eos_ids=[EOS])
+
+
+def _tokenize(text: str) -> List[int]:
+    """Жадная токенизация самым длинным подходящим токеном."""
+    strings = VOCABULARY.token_strings
+    tokens = []
+    while text:
+        token_id = max(
+            (i for i, s in enumerate(strings) if s and text.startswith(s)),
+            key=lambda i: len(strings[i]),
+        )
+        tokens.append(token_id)
+        text = text[len(strings[token_id]) :]
+    return tokens
+
+
+def _accepts(schema: Dict[str, Any], text: str) -> bool:
+    automaton = SchemaAutomaton(compile_schema(schema))
+    state = automaton.advance_text(automaton.initial, text)
+    return state is not None and automaton.is_final(state)
+
+
+def test_compile_nested_object_merges_literals() -> None:
+    segments = compile_schema(SCHEMA)
+
+    assert segments[0] == '{"name": '
+    assert segments[1] == ValueSlot(kinds=frozenset({"string"}))
+    assert ValueSlot(kinds=frozenset({"string"}), array=True) in segments
+    assert ', "address": {"city": ' in segments
+    assert segments[-1] == "}}"
+
+
+def test_automaton_accepts_answer() -> None:
+    assert _accepts(SCHEMA, ANSWER)
+
+
+@pytest.mark.parametrize(
+    ("kind", "text", "accepted"),
+    [
+        ("integer", "-42", True),
+        ("integer", "1.5", False),
+        ("integer", "012", False),
+        ("number", "0.25", True),
+        ("number", "1e-3", True),
+        ("number", "1.", False),
+        ("boolean", "false", True),
+        ("boolean", "tru", False),
+        ("boolean", '"true"', False),
+        ("string", '"Ёлка\\u0401"', True),
+        ("string", '"a\\x"', False),
+    ],
+)
+def test_primitive_values(kind: str, text: str, accepted: bool) -> None:
+    schema = {"type": "object", "properties": {"value": {"type": kind}}}
+
+    assert _accepts(schema, '{"value": ' + text + "}") is accepted
+
+
+@pytest.mark.parametrize(
+    ("text", "accepted"),
+    [("[]", True), ("[1]", True), ("[1, 2, 3]", True), ("[1,2]", False), ("[1, ]", False)],
+)
+def test_integer_arrays(text: str, accepted: bool) -> None:
+    schema = {
+        "type": "object",
+        "properties": {"ids": {"type": "array", "items": {"type": "integer"}}},
+    }
+
+    assert _accepts(schema, '{"ids": ' + text + "}") is accepted
+
+
+def test_unsupported_schema() -> None:
+    schema = {
+        "type": "object",
+        "properties": {"rows": {"type": "array", "items": {"type": "object", "properties": {}}}},
+    }
+    with pytest.raises(UnsupportedSchemaError):
+        compile_schema(schema)
+
+
+def test_mask_follows_answer_and_allows_eos_only_after_root_closes() -> None:
+    guide = SchemaGuide(SCHEMA, VOCABULARY)
+    state = guide.initial_state
+    tokens = _tokenize(ANSWER)
+
+    for token_id in tokens:
+        allowed = guide.allowed_tokens(state)
+        assert token_id in allowed
+        assert EOS not in allowed
+        state = guide.advance_token(state, token_id)
+
+    np.testing.assert_array_equal(guide.allowed_tokens(state), [EOS])
+
+
+def test_mask_inside_cyrillic_string_allows_partial_characters() -> None:
+    guide = SchemaGuide(SCHEMA, VOCABULARY)
+    state = guide.automaton.advance_text(guide.initial_state, '{"name": "Ив')
+    allowed = guide.allowed_tokens(state)
+    strings = VOCABULARY.token_strings
+
+    assert strings.index("Моск") in allowed
+    assert strings.index("�") in allowed
+    assert strings.index('"') in allowed
+    assert strings.index('{"') in allowed
+    assert strings.index("\\") in allowed
+    # Закрыть корень внутри строки нельзя: "} закрыл бы строку и оставил лишнюю скобку
+    assert strings.index('"}') not in allowed
+    assert EOS not in allowed
+
+
+def test_mask_for_boolean_slot() -> None:
+    guide = SchemaGuide(SCHEMA, VOCABULARY)
+    prefix = ANSWER[: ANSWER.index("true")]
+    state = guide.automaton.advance_text(guide.initial_state, prefix)
+    allowed = {VOCABULARY.token_strings[i] for i in guide.allowed_tokens(state)}
+
+    assert allowed == {"t", "f", "true", "fal"}
+
+
+def test_logits_processor_masks_scores() -> None:
+    torch = pytest.importorskip("torch")
+    guide = SchemaGuide(SCHEMA, VOCABULARY)
+    prompt = [EOS, EOS]
+    processor = JsonSchemaLogitsProcessor(guide, prompt_length=len(prompt))
+    size = len(VOCABULARY.token_strings)
+
+    scores = processor(torch.tensor([prompt]), torch.zeros(1, size))
+    assert torch.isfinite(scores[0]).nonzero().flatten().tolist() == [
+        VOCABULARY.token_strings.index("{"),
+        VOCABULARY.token_strings.index('{"'),
+    ]
+
+    scores = processor(torch.tensor([prompt + _tokenize(ANSWER)]), torch.zeros(1, size))
+    assert torch.isfinite(scores[0]).nonzero().flatten().tolist() == [EOS]
@@ -0,0 +1,84 @@
+"""Кеш int8-весов CPU-режима: сохранение, загрузка и ключ по исходным весам."""
+
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import cpu_backend  # noqa: E402
+from cpu_backend import enable_cpu_backend  # noqa: E402
+
+
+class Wrapper:
+    def __init__(self, seed: int) -> None:
+        torch.manual_seed(seed)
+        self.model = torch.nn.Sequential(
+            torch.nn.Embedding(16, 8),
+            torch.nn.Linear(8, 32),
+            torch.nn.GELU(),
+            torch.nn.LayerNorm(32),
+            torch.nn.Linear(32, 8, bias=False),
+        )
+
+
+def _config(tmp_path: Path) -> Dict[str, Any]:
+    return {
+        "model_name": "org/tiny model",
+        "device_map": "cpu",
+        "cache_dir": str(tmp_path),
+        "cpu": {"threads": 1, "quantization": "int8"},
+    }
+
+
+def _cached_files(tmp_path: Path) -> list:
+    return sorted((tmp_path / cpu_backend.CACHE_SUBDIR).glob("*.pt"))
+
+
+def _run(wrapper: Wrapper) -> Any:
+    with torch.no_grad():
+        return wrapper.model(torch.arange(12).reshape(3, 4))
+
+
+def test_cache_round_trip(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    expected = _run(enable_cpu_backend(Wrapper(0), _config(tmp_path)))
+    (cache_file,) = _cached_files(tmp_path)
+    assert "org_tiny_model-" in cache_file.name
+    # В файле только тензоры: он читается без распаковки модулей
+    assert isinstance(torch.load(cache_file, weights_only=True), dict)
+
+    def fail(*args: Any) -> None:
+        raise AssertionError("при наличии кеша модель не квантуется заново")
+
+    monkeypatch.setattr(cpu_backend, "quantize_model", fail)
+    cached = enable_cpu_backend(Wrapper(0), _config(tmp_path))
+    assert torch.equal(_run(cached), expected)
+
+
+def test_changed_weights_get_new_cache_entry(tmp_path: Path) -> None:
+    enable_cpu_backend(Wrapper(0), _config(tmp_path))
+    updated = enable_cpu_backend(Wrapper(1), _config(tmp_path))
+
+    assert len(_cached_files(tmp_path)) == 2
+    reference = cpu_backend.quantize_model(Wrapper(1).model, "int8")
+    with torch.no_grad():
+        assert torch.equal(_run(updated), reference(torch.arange(12).reshape(3, 4)))
+
+
+def test_revision_is_part_of_key(tmp_path: Path) -> None:
+    enable_cpu_backend(Wrapper(0), {**_config(tmp_path), "revision": "a"})
+    enable_cpu_backend(Wrapper(0), {**_config(tmp_path), "revision": "b"})
+
+    assert len(_cached_files(tmp_path)) == 2
+
+
+def test_broken_cache_is_rebuilt(tmp_path: Path) -> None:
+    expected = _run(enable_cpu_backend(Wrapper(0), _config(tmp_path)))
+    (cache_file,) = _cached_files(tmp_path)
+    cache_file.write_bytes(b"not a checkpoint")
+
+    rebuilt = enable_cpu_backend(Wrapper(0), _config(tmp_path))
+
+    assert torch.equal(_run(rebuilt), expected)
+    assert isinstance(torch.load(cache_file, weights_only=True), dict)
@@ -0,0 +1,78 @@
+"""Деградация настроек ``ExecutionGuard`` при OOM, который бросает ``StubModel``."""
+
+from typing import List
+
+import pytest
+from PIL import Image
+
+from execution_guard import ExecutionGuard, OOMExhaustedError
+from synthetic import StubModel
+
+
+def _images(count: int, side: int) -> List[Image.Image]:
+    return [Image.new("RGB", (side, side)) for _ in range(count)]
+
+
+def test_image_count_steps_down() -> None:
+    model = StubModel(["ok"], oom_when=lambda images: len(images) > 2)
+    guard = ExecutionGuard()
+
+    result = guard.run(
+        lambda images: model.predict_on_images(images, "prompt"), _images(5, 16), min_images=1
+    )
+
+    assert result == "ok"
+    assert guard.settings.max_images == 2
+    assert guard.settings.max_pixels is None
+    assert guard.oom_count == 1
+    assert model.calls == 2
+
+
+def test_resolution_steps_down() -> None:
+    model = StubModel(
+        ["ok"], oom_when=lambda images: any(img.width * img.height > 300_000 for img in images)
+    )
+    guard = ExecutionGuard(min_pixels=100_000)
+    seen: List[int] = []
+
+    def predict(images: List[Image.Image]) -> str:
+        seen.append(images[0].width * images[0].height)
+        return model.predict_on_images(images, "prompt")
+
+    assert guard.run(predict, _images(2, 1000)) == "ok"
+
+    # 1 000 000 → 500 000 → 250 000 пикселей; число изображений не сокращается
+    assert guard.settings.max_pixels == 250_000
+    assert guard.settings.max_images is None
+    assert guard.oom_count == 2
+    assert seen[0] == 1_000_000 and seen[-1] <= 250_000
+
+
+def test_batch_size_steps_down() -> None:
+    model = StubModel(["ok"], oom_when=lambda images: len(images) > 3)
+    guard = ExecutionGuard(batch_size=8)
+    batch_sizes: List[int] = []
+
+    def run(batch: List[int]) -> List[int]:
+        batch_sizes.append(len(batch))
+        model.predict_on_images(batch, "prompt")
+        return [item * 10 for item in batch]
+
+    results = guard.map_batches(run, list(range(10)))
+
+    assert results == [item * 10 for item in range(10)]
+    assert guard.settings.batch_size == 2
+    assert guard.oom_count == 2
+    # 8 и 4 — OOM, дальше пакеты по 2 до конца
+    assert batch_sizes == [8, 4, 2, 2, 2, 2, 2]
+
+
+def test_exhausted_settings_raise() -> None:
+    model = StubModel(["ok"], oom_when=lambda images: True)
+    guard = ExecutionGuard(min_pixels=100_000)
+
+    with pytest.raises(OOMExhaustedError):
+        guard.run(lambda images: model.predict_on_images(images, "prompt"), _images(1, 300))
+    with pytest.raises(OOMExhaustedError):
+        guard.map_batches(lambda batch: [model.predict_on_images(batch, "prompt")], [1])
+    assert guard.exhausted_count == 2
@@ -0,0 +1,120 @@
+"""Потоковый разбор JSON: сканер, распознаватель страниц и критерий остановки."""
+
+from typing import Any, List
+
+import pytest
+
+from json_stream import (
+    IncrementalDecoder,
+    JsonObjectScanner,
+    JsonStoppingCriteria,
+    OrderedPagesRecognizer,
+)
+
+
+class ByteTokenizer:
+    """Токен — один байт UTF-8; оборванный символ декодируется в U+FFFD, как у BPE."""
+
+    def __init__(self) -> None:
+        self.decoded_tokens = 0
+
+    def encode(self, text: str) -> List[int]:
+        return list(text.encode("utf-8"))
+
+    def decode(self, token_ids: Any, skip_special_tokens: bool = True) -> str:
+        self.decoded_tokens += len(token_ids)
+        return bytes(token_ids).decode("utf-8", errors="replace")
+
+
+def _feed_split(scanner: JsonObjectScanner, text: str, size: int) -> List[str]:
+    completed = []
+    for start in range(0, len(text), size):
+        completed += scanner.feed(text[start : start + size])
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_scanner_objects_split_across_chunks(size: int) -> None:
+    text = 'Ответ:\n```json\n{"a": {"b": [1, 2]}}\n``` и ещё {"c": 3}'
+
+    assert _feed_split(JsonObjectScanner(), text, size) == ['{"a": {"b": [1, 2]}}', '{"c": 3}']
+
+
+def test_scanner_ignores_brackets_inside_strings() -> None:
+    text = '{"note": "скобки } ] { и кавычка \\" внутри", "pages": [1]}'
+
+    assert _feed_split(JsonObjectScanner(), text, 1) == [text]
+
+
+def test_scanner_keeps_unclosed_object_pending() -> None:
+    scanner = JsonObjectScanner()
+
+    assert scanner.feed('{"a": "не закрыт') == []
+    assert scanner.feed('а"}') == ['{"a": "не закрыта"}']
+
+
+def test_recognizer_skips_wrong_page_count_and_invalid_objects() -> None:
+    recognizer = OrderedPagesRecognizer(expected_pages=3)
+    chunks = [
+        '{"ordered_pages": [1, 2]}',
+        '{"ordered_pages": [1, true, 3]}',
+        '{"ordered_pages": [1, 2,',
+        " 3,]}",
+        '{"ordered_pages": [3, 1, 2]}',
+    ]
+
+    assert [recognizer.feed(chunk) for chunk in chunks] == [False, False, False, False, True]
+    assert recognizer.result == [3, 1, 2]
+    # После результата следующие фрагменты не меняют его
+    assert recognizer.feed('{"ordered_pages": [1, 2, 3]}')
+    assert recognizer.result == [3, 1, 2]
+
+
+def test_recognizer_without_expected_count_accepts_any_nonempty_list() -> None:
+    recognizer = OrderedPagesRecognizer()
+
+    assert not recognizer.feed('{"ordered_pages": []}')
+    assert recognizer.feed('{"ordered_pages": [2, 1, 4, 3, 5]}')
+    assert recognizer.result == [2, 1, 4, 3, 5]
+
+
+def test_decoder_holds_back_incomplete_multibyte_characters() -> None:
+    tokenizer = ByteTokenizer()
+    decoder = IncrementalDecoder(tokenizer)
+    text = 'Порядок: {"ordered_pages": [2, 1]} ✓'
+
+    deltas = [decoder.push([token]) for token in tokenizer.encode(text)]
+
+    assert "".join(deltas) == text
+    assert all("�" not in delta for delta in deltas)
+
+
+def test_stopping_criteria_tracks_each_row_incrementally() -> None:
+    torch = pytest.importorskip("torch")
+    tokenizer = ByteTokenizer()
+    prompt = [0, 0]
+    answers = [
+        'Да: {"ordered_pages": [2, 1, 3]} хвост',
+        'Сначала {"ordered_pages": [1, 2]}, потом {"ordered_pages": [3, 2, 1]}',
+    ]
+    encoded = [tokenizer.encode(answer) for answer in answers]
+    length = max(len(tokens) for tokens in encoded)
+    recognizers = [OrderedPagesRecognizer(3), OrderedPagesRecognizer(3)]
+    criteria = JsonStoppingCriteria(tokenizer, recognizers, prompt_length=len(prompt))
+
+    stopped_at = [None, None]
+    for step in range(1, length + 1):
+        input_ids = torch.tensor([prompt + (tokens + [32] * length)[:step] for tokens in encoded])
+        done = criteria(input_ids, None).tolist()
+        for row, flag in enumerate(done):
+            if flag and stopped_at[row] is None:
+                stopped_at[row] = step
+        if all(done):
+            break
+
+    assert [recognizer.result for recognizer in recognizers] == [[2, 1, 3], [3, 2, 1]]
+    for row, answer in enumerate(answers):
+        closing = len(answer[: answer.rindex("}") + 1].encode("utf-8"))
+        assert stopped_at[row] == closing
+    # Каждый шаг декодирует окно из нескольких токенов, а не весь ответ заново
+    assert tokenizer.decoded_tokens < 8 * sum(len(tokens) for tokens in encoded)
@@ -0,0 +1,67 @@
+"""Ступень открытой нагрузки против локального мок-сервера, без сети и GPU."""
+
+import asyncio
+import random
+import threading
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+import pytest
+from openai import AsyncOpenAI
+
+from load_test import LoadRequest, MockLatency, make_mock_server, run_step, summarize_steps
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "total": {"type": "integer"}},
+}
+
+
+@pytest.fixture
+def base_url() -> Iterator[str]:
+    server = make_mock_server("127.0.0.1", 0, MockLatency(base_ms=5, jitter_ms=1, slots=2))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _run(base_url: str, rate: float, duration_s: float) -> List[Dict[str, Any]]:
+    requests = [LoadRequest(image="0.jpg", schema=SCHEMA, base64_image="", prompt="extract")]
+
+    async def main() -> List[Dict[str, Any]]:
+        client = AsyncOpenAI(base_url=base_url, api_key="token-test", max_retries=0)
+        try:
+            return await run_step(requests, rate, duration_s, "mock", client, 5.0, random.Random(0))
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+def test_step_against_mock_server(base_url: str) -> None:
+    rows = _run(base_url, rate=20.0, duration_s=0.5)
+
+    assert rows
+    assert {row["status"] for row in rows} == {"ok"}
+    step = summarize_steps(pd.DataFrame(rows), 0.5, slo_ms=10_000.0, rates=[20.0]).iloc[0]
+    assert step["requests"] == len(rows)
+    assert step["error_rate"] == 0.0
+    assert step["goodput_rps"] == step["throughput_rps"] == len(rows) / 0.5
+    assert step["p50_ms"] >= 5.0
+
+
+def test_step_without_arrivals_gives_zero_row(base_url: str) -> None:
+    rows = _run(base_url, rate=0.01, duration_s=0.1)
+
+    assert rows == []
+    steps = summarize_steps(pd.DataFrame(rows), 0.1, slo_ms=10_000.0, rates=[0.01])
+    step = steps.iloc[0]
+    assert len(steps) == 1
+    assert step["rate"] == 0.01
+    assert step["requests"] == 0 and step["goodput_rps"] == 0.0 and step["error_rate"] == 0.0
+    assert np.isnan(step["p99_ms"])
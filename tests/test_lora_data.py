@@ -0,0 +1,78 @@
+"""Детерминированность, возобновление и бюджет упаковки ``PackedBatchLoader``."""
+
+from typing import List
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lora_data import MERGE_SIZE, PackedBatchLoader, TrainingSample, collect_training_samples
+
+SIZES = [(120, 90), (300, 220), (640, 420), (900, 700), (200, 560), (1400, 1000)]
+TOKEN_BUDGET = 900
+TEXT_TOKENS = 16
+
+
+@pytest.fixture(scope="module")
+def samples(tmp_path_factory: pytest.TempPathFactory) -> List[TrainingSample]:
+    root = tmp_path_factory.mktemp("dataset")
+    rng = np.random.default_rng(0)
+    for class_name in ("passport", "invoice"):
+        images = root / class_name / "images" / "clean"
+        images.mkdir(parents=True)
+        for i in range(12):
+            height, width = SIZES[(i + len(class_name)) % len(SIZES)]
+            pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(images / f"{i}.jpg")
+    return collect_training_samples(root, ["passport", "invoice"], ["clean"])
+
+
+def _loader(samples: List[TrainingSample], seed: int = 0) -> PackedBatchLoader:
+    return PackedBatchLoader(
+        samples,
+        token_budget=TOKEN_BUDGET,
+        text_tokens=TEXT_TOKENS,
+        bucket_boundaries=(64, 256, 1024),
+        seed=seed,
+    )
+
+
+def _order(loader: PackedBatchLoader) -> List[List[int]]:
+    return [batch["sample_ids"] for batch in loader]
+
+
+def test_same_seed_gives_same_order(samples: List[TrainingSample]) -> None:
+    first = _order(_loader(samples, seed=3))
+
+    assert first == _order(_loader(samples, seed=3))
+    assert first != _order(_loader(samples, seed=4))
+    assert sorted(i for pack in first for i in pack) == list(range(len(samples)))
+
+
+def test_resume_continues_the_same_sequence(samples: List[TrainingSample]) -> None:
+    full = _loader(samples)
+    expected = _order(full) + _order(full)  # две эпохи
+
+    interrupted = _loader(samples)
+    batches = iter(interrupted)
+    head = [next(batches)["sample_ids"] for _ in range(3)]
+    state = interrupted.state_dict()
+
+    resumed = _loader(samples, seed=99)
+    resumed.load_state_dict(state)
+    tail = _order(resumed) + _order(resumed)
+
+    assert state["position"] == 3
+    assert head + tail == expected
+
+
+def test_packs_stay_within_token_budget(samples: List[TrainingSample]) -> None:
+    loader = _loader(samples)
+    for batch in loader:
+        lengths = batch["seq_lengths"]
+        used = sum(lengths) + TEXT_TOKENS * len(lengths)
+        # Только пример длиннее бюджета получает отдельную переполненную последовательность
+        assert used <= TOKEN_BUDGET or len(lengths) == 1
+        # Каждый визуальный токен — MERGE_SIZE² патчей
+        assert batch["pixel_values"].shape[0] == sum(lengths) * MERGE_SIZE**2
+    assert 0.0 <= loader.stats.padding_ratio < 1.0
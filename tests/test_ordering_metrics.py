@@ -0,0 +1,59 @@
+"""Метрики порядка страниц для сабсетов с документами разной длины."""
+
+import numpy as np
+
+from ordering_metrics import compute_ordering_metrics
+
+TRUE_ORDERS = [[1, 2, 3], [1, 2, 3, 4], [3, 1, 2], [4, 3, 2, 1], [1, 2]]
+PREDICTED_ORDERS = [[1, 3, 2], [1, 2, 3, 4], [3, 1, 2], [3, 4, 2, 1], [1, 2, 3]]
+
+
+def test_mixed_page_counts_match_per_length_groups() -> None:
+    ordering = compute_ordering_metrics(TRUE_ORDERS, PREDICTED_ORDERS)
+    three = compute_ordering_metrics(
+        [TRUE_ORDERS[0], TRUE_ORDERS[2]], [PREDICTED_ORDERS[0], PREDICTED_ORDERS[2]]
+    )
+    four = compute_ordering_metrics(
+        [TRUE_ORDERS[1], TRUE_ORDERS[3]], [PREDICTED_ORDERS[1], PREDICTED_ORDERS[3]]
+    )
+
+    np.testing.assert_allclose(ordering.kendall_tau[[0, 2]], three.kendall_tau)
+    np.testing.assert_allclose(ordering.kendall_tau[[1, 3]], four.kendall_tau)
+    np.testing.assert_allclose(ordering.spearman_rho[[0, 2]], three.spearman_rho)
+    np.testing.assert_allclose(ordering.spearman_rho[[1, 3]], four.spearman_rho)
+    assert ordering.accuracy.tolist() == [0.0, 1.0, 1.0, 0.0, 0.0]
+    # Предсказание другой длины неверно и не входит в tau и rho
+    assert ordering.valid.tolist() == [True, True, True, True, False]
+    assert np.isnan(ordering.kendall_tau[4]) and np.isnan(ordering.spearman_rho[4])
+
+
+def test_invalid_predictions_count_as_zero_in_summary() -> None:
+    ordering = compute_ordering_metrics(TRUE_ORDERS, PREDICTED_ORDERS)
+    valid_only = compute_ordering_metrics(TRUE_ORDERS[:4], PREDICTED_ORDERS[:4])
+
+    summary = ordering.summary()
+    assert summary["valid_share"] == 0.8
+    assert summary["kendall_tau"] == round(float(valid_only.kendall_tau.sum()) / 5, 4)
+    assert summary["spearman_rho"] == round(float(valid_only.spearman_rho.sum()) / 5, 4)
+    assert summary["kendall_tau"] < valid_only.summary()["kendall_tau"]
+
+
+def test_mixed_page_counts_breakdowns_cover_longest_document() -> None:
+    ordering = compute_ordering_metrics(TRUE_ORDERS, PREDICTED_ORDERS)
+
+    # Позиции 1–3 есть у четырёх документов, позиция 4 — только у двух четырёхстраничных
+    np.testing.assert_allclose(ordering.position_error_rate, [0.25, 0.5, 0.25, 0.0])
+    assert ordering.swap_rate.shape == (4, 4)
+    assert ordering.swap_rate[0, 1] == 0.25
+    assert ordering.swap_rate[1, 2] == 0.25
+    assert ordering.swap_rate[2, 3] == 0.0
+    assert len(ordering.position_frame()) == 4
+    assert len(ordering.swap_frame()) == 6
+    assert ordering.summary()["accuracy"] == 0.4
+
+
+def test_empty_subset() -> None:
+    ordering = compute_ordering_metrics([], [])
+
+    assert ordering.summary() == {}
+    assert ordering.position_error_rate.size == 0
@@ -0,0 +1,29 @@
+"""Упакованный датасет через ``open_dataset`` и закрытие кеша открытых архивов."""
+
+from pathlib import Path
+
+import dataset_io
+from dataset_io import close_datasets, open_dataset
+from pack_dataset import pack_dataset
+
+
+def test_packed_dataset_is_cached_and_closed(tmp_path: Path) -> None:
+    source = tmp_path / "dataset"
+    for i in range(3):
+        page = source / "passport" / "images" / "clean" / f"{i}.jpg"
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_bytes(bytes([i]) * (i + 1))
+    pack_dataset(source, tmp_path / "dataset.vlmpack", shard_size_mb=1)
+
+    root = open_dataset(tmp_path / "dataset.vlmpack" / "passport")
+    assert bytes((root / "images/clean/2.jpg").read_bytes()) == b"\x02\x02\x02"
+    open_dataset(tmp_path / "dataset.vlmpack")
+    (packed,) = dataset_io._OPEN_ARCHIVES.values()
+
+    close_datasets()
+
+    assert not dataset_io._OPEN_ARCHIVES
+    assert packed._mmaps == [None]
+    reopened = open_dataset(tmp_path / "dataset.vlmpack" / "passport")
+    assert bytes((reopened / "images/clean/0.jpg").read_bytes()) == b"\x00"
+    close_datasets()
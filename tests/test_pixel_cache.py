@@ -0,0 +1,69 @@
+"""Ключи ``pixel_cache`` для изображений из архива и производных сабсетов."""
+
+import io
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from augment import AugmentedPath
+from dataset_io import SOURCE_KEY_INFO, ZipDataset, load_image_for_model
+from execution_guard import downscale_image
+from pixel_cache import image_key
+
+
+def _png(color: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((32, 48, 3), color, dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _archive(tmp_path: Path) -> ZipDataset:
+    archive = tmp_path / "dataset.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("images/clean/a.png", _png(10))
+        zf.writestr("images/clean/b.png", _png(200))
+    return ZipDataset(archive)
+
+
+def test_archive_key_does_not_read_pixels(tmp_path: Path) -> None:
+    dataset = _archive(tmp_path)
+    try:
+        image = load_image_for_model(dataset.root / "images/clean/a.png")
+        assert "dataset.zip:images/clean/a.png" in image.info[SOURCE_KEY_INFO]
+
+        # tobytes() декодировал бы изображение; ключ по источнику без него обходится
+        image.tobytes = None
+        key = image_key(image)
+        assert key == image_key(load_image_for_model(dataset.root / "images/clean/a.png"))
+        assert key != image_key(load_image_for_model(dataset.root / "images/clean/b.png"))
+    finally:
+        dataset.close()
+
+
+def test_augmented_key_depends_on_subset_and_seed(tmp_path: Path) -> None:
+    dataset = _archive(tmp_path)
+    try:
+        source = dataset.root / "images/clean/a.png"
+        virtual = dataset.root / "images/blur/a.png"
+        keys = {
+            AugmentedPath(source, virtual, "blur", "a.png", seed=0).source_key(),
+            AugmentedPath(source, virtual, "blur", "a.png", seed=1).source_key(),
+            AugmentedPath(source, virtual, "noise", "a.png", seed=0).source_key(),
+        }
+        assert len(keys) == 3
+        assert all(key.startswith(source.source_key()) for key in keys)
+    finally:
+        dataset.close()
+
+
+def test_downscaled_copy_gets_its_own_key(tmp_path: Path) -> None:
+    dataset = _archive(tmp_path)
+    try:
+        image = load_image_for_model(dataset.root / "images/clean/a.png")
+        smaller = downscale_image(image, max_pixels=16 * 24)
+        assert smaller.info.get(SOURCE_KEY_INFO) == image.info[SOURCE_KEY_INFO]
+        assert image_key(smaller) != image_key(image)
+    finally:
+        dataset.close()
@@ -0,0 +1,127 @@
+"""Переиспользование KV-кеша префикса: ``crop`` между вызовами и ключ по токенам префикса."""
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Sequence
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import prefix_cache  # noqa: E402
+from prefix_cache import PrefixCache  # noqa: E402
+
+VISION_START = 1
+EOS = 2
+IMAGE_PAD = 3
+VOCAB = 64
+ANSWER = [40, 41, 42]
+
+
+class FakeCache:
+    """Как ``DynamicCache``: длина растёт с каждым прогоном, ``crop`` её обрезает."""
+
+    def __init__(self) -> None:
+        self.length = 0
+
+    def crop(self, length: int) -> None:
+        self.length = length
+
+
+class FakeHFModel:
+    """Модель отвечает токенами ``ANSWER`` и EOS и проверяет позицию в кеше."""
+
+    config = SimpleNamespace(vision_start_token_id=VISION_START)
+    generation_config = SimpleNamespace(eos_token_id=EOS)
+
+    def __init__(self) -> None:
+        self.prefill_lengths: List[int] = []
+        self._step = 0
+
+    def get_rope_index(self, input_ids: Any, **kwargs: Any) -> Any:
+        length = input_ids.shape[1]
+        return torch.arange(length).view(1, 1, length).expand(3, 1, length), None
+
+    def __call__(
+        self,
+        input_ids: Any,
+        past_key_values: Any = None,
+        cache_position: Any = None,
+        pixel_values: Any = None,
+        **kwargs: Any,
+    ) -> Any:
+        cache = past_key_values if past_key_values is not None else FakeCache()
+        if past_key_values is None:
+            self.prefill_lengths.append(input_ids.shape[1])
+        else:
+            # Хвост и новые токены дописываются ровно за префиксом
+            assert cache.length == int(cache_position[0])
+        if pixel_values is not None:
+            self._step = 0
+        cache.length += input_ids.shape[1]
+        logits = torch.zeros(1, input_ids.shape[1], VOCAB)
+        logits[0, -1, (ANSWER + [EOS])[min(self._step, len(ANSWER))]] = 1.0
+        self._step += 1
+        return SimpleNamespace(past_key_values=cache, logits=logits)
+
+
+class FakeTokenizer:
+    eos_token_id = EOS
+
+    def decode(self, token_ids: Sequence[int], skip_special_tokens: bool = True) -> str:
+        return " ".join(str(token) for token in token_ids if token != EOS)
+
+
+def _prepare_inputs(model: Any, images: Sequence[Any], prompt: str, text_first: bool) -> Dict:
+    assert text_first
+    text = [10 + ord(char) % 20 for char in prompt]
+    vision = [VISION_START] + [IMAGE_PAD] * len(images) * 4 if images else []
+    ids = [5, 6] + text + vision + [7]
+    input_ids = torch.tensor([ids])
+    return {
+        "input_ids": input_ids,
+        "attention_mask": torch.ones_like(input_ids),
+        "pixel_values": torch.zeros(len(images) * 16, 8),
+        "image_grid_thw": torch.tensor([[1, 4, 4]] * len(images)),
+    }
+
+
+@pytest.fixture
+def model(monkeypatch: pytest.MonkeyPatch) -> Any:
+    monkeypatch.setattr(prefix_cache, "prepare_inputs", _prepare_inputs)
+    return SimpleNamespace(
+        model=FakeHFModel(), processor=SimpleNamespace(tokenizer=FakeTokenizer())
+    )
+
+
+def test_prefix_is_built_once_and_cropped_back(model: Any) -> None:
+    cache = PrefixCache(model)
+
+    answers = [cache.generate(["a.jpg"], "класс?"), cache.generate(["b.jpg"], "класс?")]
+
+    assert answers == ["40 41 42", "40 41 42"]
+    prefix_length = 2 + len("класс?")
+    assert model.model.prefill_lengths == [prefix_length]
+    (entry,) = cache._entries.values()
+    assert entry.length == prefix_length
+    assert entry.cache.length == prefix_length
+    assert cache.stats.as_dict()["prefix_builds"] == 1
+    assert cache.stats.cached_tokens == 2 * prefix_length
+
+
+def test_prefix_key_changes_with_prompt_text(model: Any) -> None:
+    cache = PrefixCache(model, max_entries=1)
+
+    cache.generate(["a.jpg"], "первый")
+    cache.generate(["a.jpg"], "второй")
+    cache.generate(["a.jpg"], "первый")
+
+    # Другой текст до изображения — новый префикс; при max_entries=1 старый вытесняется
+    assert cache.stats.prefix_builds == 3
+    assert len(cache._entries) == 1
+
+
+def test_request_without_image_falls_back(model: Any) -> None:
+    cache = PrefixCache(model)
+
+    assert cache.generate([], "без изображения") is None
+    assert cache.stats.calls == 0
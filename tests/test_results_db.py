@@ -0,0 +1,63 @@
+"""Реестр запусков: повторная регистрация, лучшие промпты и регрессии."""
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from results_db import ResultsDB
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> Iterator[ResultsDB]:
+    registry = ResultsDB(str(tmp_path / "results.db"))
+    yield registry
+    registry.close()
+
+
+def _count(db: ResultsDB, table: str, run_id: str) -> int:
+    row = db.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE run_id = ?", (run_id,)).fetchone()
+    return int(row[0])
+
+
+def test_reregistration_keeps_metrics_and_predictions(db: ResultsDB) -> None:
+    db.register_run("run", "classification", "model-a", prompt_text="p1", subsets=["clean"])
+    db.add_metrics("run", "clean", {"accuracy": 0.5, "f1": 0.4, "note": "text"})
+    db.add_predictions(
+        "run", "clean", [("a.png", "1", "1", True, None), ("b.png", "1", "2", False, None)]
+    )
+    created_at = db.runs()["created_at"].iloc[0]
+
+    db.register_run("run", "classification", "model-b", prompt_text="p2", subsets=["clean", "blur"])
+
+    assert _count(db, "metrics", "run") == 2
+    assert _count(db, "predictions", "run") == 2
+    runs = db.runs()
+    assert len(runs) == 1
+    assert runs["model"].iloc[0] == "model-b"
+    assert runs["subsets"].iloc[0] == '["clean", "blur"]'
+    assert runs["created_at"].iloc[0] == created_at
+
+
+def test_best_prompt_and_regressions(db: ResultsDB) -> None:
+    db.register_run("a", "classification", "m", prompt_text="first", prompt_name="first.txt")
+    db.register_run("b", "classification", "m", prompt_text="second", prompt_name="second.txt")
+    db.add_metrics("a", "clean", {"accuracy": 0.9})
+    db.add_metrics("b", "clean", {"accuracy": 0.7})
+    db.add_predictions("a", "clean", [("x", "1", "1", True, None)])
+    db.add_predictions("b", "clean", [("x", "1", "2", False, None)])
+
+    best = db.best_prompt_per_subset("accuracy")
+    assert best[["subset", "prompt_name", "run_id"]].values.tolist() == [
+        ["clean", "first.txt", "a"]
+    ]
+    assert db.regressions("a", "b")["item_id"].tolist() == ["x"]
+    assert db.compare_metrics("a", "b")["delta"].round(4).tolist() == [-0.2]
+
+
+def test_deleting_run_cascades(db: ResultsDB) -> None:
+    db.register_run("run", "classification", "m")
+    db.add_metrics("run", "clean", {"accuracy": 1.0})
+    with db.conn:
+        db.conn.execute("DELETE FROM runs WHERE run_id = 'run'")
+    assert _count(db, "metrics", "run") == 0
@@ -0,0 +1,278 @@
+"""Лёгкая трассировка этапов инференса с экспортом в Chrome Trace / Perfetto.
+
+Использование::
+
+    tracer = configure_tracing(config.get("tracing"))
+    with get_tracer().span("image_load"):
+        ...
+    finish_tracing(run_id)
+
+Когда трассировка выключена, ``span`` возвращает один и тот же пустой
+контекстный менеджер, поэтому накладные расходы сводятся к вызову функции.
+Готовый файл открывается в ``chrome://tracing`` или https://ui.perfetto.dev.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+
+class _NullSpan:
+    """Пустой span для выключенной трассировки."""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._tracer.add_complete(self._name, self._start, time.perf_counter(), self._args)
+
+
+class Tracer:
+    """Сборщик span-ов в формате Chrome Trace Event («complete» события ``ph=X``).
+
+    Args:
+        enabled (bool): Собирать ли события.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def span(self, name: str, **args: Any) -> Any:
+        """Контекстный менеджер, измеряющий блок кода как этап ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add_complete(
+        self, name: str, start: float, end: float, args: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Добавляет готовое событие по отметкам ``time.perf_counter()``."""
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def export_chrome_trace(self, output_path: Path) -> Path:
+        """Сохраняет события в JSON, понятный Chrome Tracing и Perfetto."""
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with output_path.open("w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": self.events, "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+            )
+        return output_path
+
+    def summary(self) -> pd.DataFrame:
+        """Сводка по этапам: число вызовов, суммарное/среднее/p95 время и доля от трассы."""
+        events = self.events
+        durations: Dict[str, List[float]] = defaultdict(list)
+        for event in events:
+            durations[event["name"]].append(event["dur"] / 1e3)
+
+        rows = []
+        for name, values in durations.items():
+            series = pd.Series(values)
+            rows.append(
+                {
+                    "stage": name,
+                    "count": len(values),
+                    "total_ms": series.sum(),
+                    "mean_ms": series.mean(),
+                    "p95_ms": series.quantile(0.95),
+                }
+            )
+        if not rows:
+            return pd.DataFrame(
+                columns=["stage", "count", "total_ms", "mean_ms", "p95_ms", "share"]
+            )
+
+        df = pd.DataFrame(rows).sort_values("total_ms", ascending=False)
+        # Доля от общего времени трассы; вложенные этапы (например, prefill
+        # внутри predict) входят и в долю родителя
+        wall_ms = (
+            max(e["ts"] + e["dur"] for e in events) - min(e["ts"] for e in events)
+        ) / 1e3
+        df["share"] = df["total_ms"] / wall_ms if wall_ms > 0 else 0.0
+        return df.reset_index(drop=True).round(4)
+
+
+_TRACER = Tracer(enabled=False)
+_OUTPUT_DIR = Path("traces")
+
+
+def get_tracer() -> Tracer:
+    """Возвращает текущий глобальный трассировщик (по умолчанию выключен)."""
+    return _TRACER
+
+
+def configure_tracing(tracing_config: Optional[Dict[str, Any]]) -> Tracer:
+    """Включает трассировку по секции ``tracing`` конфига.
+
+    Поддерживаемые ключи: ``enabled`` (bool) и ``output_dir`` (по умолчанию
+    ``./traces``). Отсутствие секции эквивалентно ``enabled: false``.
+    """
+    global _TRACER, _OUTPUT_DIR
+    tracing_config = tracing_config or {}
+    _TRACER = Tracer(enabled=bool(tracing_config.get("enabled", False)))
+    _OUTPUT_DIR = Path(tracing_config.get("output_dir", "traces"))
+    return _TRACER
+
+
+def finish_tracing(run_id: str) -> Optional[Path]:
+    """Экспортирует трассу запуска и печатает сводную таблицу по этапам."""
+    if not _TRACER.enabled:
+        return None
+
+    trace_path = _TRACER.export_chrome_trace(_OUTPUT_DIR / f"{run_id}_trace.json")
+    summary = _TRACER.summary()
+    print(f"\n⏱️  Время по этапам ({run_id}):")
+    print(summary.to_string(index=False))
+    summary.to_csv(_OUTPUT_DIR / f"{run_id}_trace_summary.csv", index=False)
+    print(f"Трасса сохранена в {trace_path} (открывается в ui.perfetto.dev)")
+    return trace_path
+
+
+@contextmanager
+def _model_call_span(name: str, tracer: Tracer, state: Dict[str, Any]) -> Iterator[None]:
+    """Span вызова модели с разбивкой на preprocess → prefill → decode → postprocess."""
+    state.update(forwards=0, prefill_start=None, decode_start=None, last_end=None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        tracer.add_complete(name, start, end)
+        if state["prefill_start"] is not None:
+            tracer.add_complete("model.preprocess", start, state["prefill_start"])
+        if state["decode_start"] is not None:
+            tracer.add_complete(
+                "model.decode",
+                state["decode_start"],
+                state["last_end"],
+                {"steps": state["forwards"] - 1},
+            )
+        if state["last_end"] is not None:
+            tracer.add_complete("model.postprocess", state["last_end"], end)
+
+
+def model_call(model: Any, name: str) -> ContextManager[None]:
+    """Span для вызова модели в обход predict-методов (например, прямого ``generate``).
+
+    Для модели без ``trace_model`` (или при выключенной трассировке) ничего не делает.
+    """
+    hooks = getattr(model, "_trace_hooks", None)
+    if hooks is None:
+        return nullcontext()
+    tracer, state = hooks
+    return _model_call_span(name, tracer, state)
+
+
+def _wrap_predict(
+    method: Callable[..., Any], name: str, tracer: Tracer, state: Dict[str, Any]
+) -> Callable[..., Any]:
+    """Оборачивает predict-метод модели: этапы preprocess → prefill → decode → postprocess."""
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with _model_call_span(name, tracer, state):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def _wrap_forward(
+    forward: Callable[..., Any], tracer: Tracer, state: Dict[str, Any]
+) -> Callable[..., Any]:
+    """Первый forward внутри predict — prefill, остальные — шаги decode."""
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        output = forward(*args, **kwargs)
+        end = time.perf_counter()
+        if state.get("forwards", 0) == 0:
+            state["prefill_start"] = start
+            tracer.add_complete("model.prefill", start, end)
+        elif state["decode_start"] is None:
+            state["decode_start"] = start
+        state["forwards"] = state.get("forwards", 0) + 1
+        state["last_end"] = end
+        return output
+
+    return wrapper
+
+
+def trace_model(model: Any, tracer: Optional[Tracer] = None) -> Any:
+    """Добавляет span-ы в predict-методы обёртки модели.
+
+    Если обёртка хранит HF-модель в атрибуте ``model`` (как ``Qwen2_5_VLModel``),
+    дополнительно перехватывается её ``forward``, чтобы разделить время на
+    препроцессинг, prefill и decode. При выключенной трассировке модель
+    возвращается без изменений.
+    """
+    tracer = tracer or get_tracer()
+    if not tracer.enabled:
+        return model
+
+    state: Dict[str, Any] = {
+        "forwards": 0,
+        "prefill_start": None,
+        "decode_start": None,
+        "last_end": None,
+    }
+    for method_name in ("predict_on_image", "predict_on_images"):
+        method = getattr(model, method_name, None)
+        if method is not None:
+            wrapped = _wrap_predict(method, f"model.{method_name}", tracer, state)
+            setattr(model, method_name, wrapped)
+
+    hf_model = getattr(model, "model", None)
+    if hf_model is not None and callable(getattr(hf_model, "forward", None)):
+        hf_model.forward = _wrap_forward(hf_model.forward, tracer, state)
+    model._trace_hooks = (tracer, state)
+    return model
+